@@ -1,4 +1,5 @@
 import os
+import shutil
 from dotenv import load_dotenv
 from pathlib import Path
 from typing import List
@@ -9,23 +10,130 @@ class Config:
         load_dotenv()
 
         # Read configurations with defaults
+        # Classifier backend: "gemini", or "stub" (deterministic, offline) for load tests and profiling
+        self.classifier_backend: str = os.getenv("CLASSIFIER_BACKEND", "gemini").strip().lower()
         self.gemini_api_key: str = os.getenv("GEMINI_API_KEY", "").strip()
-        self.tesseract_path: str = os.getenv("TESSERACT_PATH", r"C:\Program Files\Tesseract-OCR\tesseract.exe").strip()
+        self.gemini_model: str = os.getenv("GEMINI_MODEL", "gemini-2.0-flash").strip()
+        self.stub_latency_ms: float = float(os.getenv("STUB_LATENCY_MS", "50"))
+        default_tesseract = shutil.which("tesseract") or r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+        self.tesseract_path: str = os.getenv("TESSERACT_PATH", default_tesseract).strip()
         self.upload_dir: Path = Path(os.getenv("UPLOAD_DIR", "uploads"))
         self.max_file_size: int = int(os.getenv("MAX_FILE_SIZE", str(25 * 1024 * 1024)))  # Default to 25MB
+        # Whole-request cap for /process/batch, whose archives hold many emails
+        self.max_batch_upload_size: int = int(os.getenv("MAX_BATCH_UPLOAD_SIZE", str(500 * 1024 * 1024)))
 
         # Handle allowed file types safely
         allowed_types = os.getenv("ALLOWED_FILE_TYPES", ".eml,.msg,.pdf,.txt,.csv,.xls,.xlsx")
         self.allowed_file_types: List[str] = [ext.strip().lower() for ext in allowed_types.split(",")]
 
+        # Number of emails a /process/batch request works on concurrently
+        self.batch_max_workers: int = int(os.getenv("BATCH_MAX_WORKERS", "8"))
+
+        # Execution layer: threads for blocking I/O, processes for OCR/PDF rasterization
+        self.io_workers: int = int(os.getenv("IO_WORKERS", "32"))
+        self.cpu_workers: int = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 1)))
+        self.ocr_use_processes: bool = os.getenv("OCR_USE_PROCESSES", "true").strip().lower() == "true"
+
+        # Scanned PDFs: pages are rasterized one at a time at this resolution and OCR'd in parallel
+        self.ocr_dpi: int = int(os.getenv("OCR_DPI", "200"))
+        # Pages whose text layer has fewer characters than this are treated as scanned
+        self.ocr_min_page_chars: int = int(os.getenv("OCR_MIN_PAGE_CHARS", "20"))
+        # Attachments are handled in memory; above this size they go to OCR workers via a temp file
+        self.spool_threshold_bytes: int = int(os.getenv("SPOOL_THRESHOLD_BYTES", str(8 * 1024 * 1024)))
+
+        # "staged" classifies on headers + body first and only reads attachments when the result
+        # is below the confidence threshold or field extraction needs them; "eager" reads them all up front
+        self.attachment_extraction_mode: str = os.getenv("ATTACHMENT_EXTRACTION_MODE", "staged").strip().lower()
+        self.attachment_confidence_threshold: float = float(os.getenv("ATTACHMENT_CONFIDENCE_THRESHOLD", "0.8"))
+
+        # Classifier prompt size: token budget for the whole prompt, attachment chunk size and top-k chunks
+        self.prompt_token_budget: int = int(os.getenv("PROMPT_TOKEN_BUDGET", "8000"))
+        self.prompt_chunk_tokens: int = int(os.getenv("PROMPT_CHUNK_TOKENS", "400"))
+        self.prompt_max_attachment_chunks: int = int(os.getenv("PROMPT_MAX_ATTACHMENT_CHUNKS", "8"))
+
+        # LLM client: concurrency cap, request quota, per-attempt timeout, retries and optional hedging
+        self.llm_max_concurrency: int = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+        self.llm_requests_per_minute: float = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "1000"))
+        self.llm_timeout: float = float(os.getenv("LLM_TIMEOUT", "30"))  # seconds
+        self.llm_max_retries: int = int(os.getenv("LLM_MAX_RETRIES", "3"))
+        self.llm_backoff_base: float = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))  # seconds, doubled per retry
+        self.llm_backoff_max: float = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+        self.llm_hedge_after: float = float(os.getenv("LLM_HEDGE_AFTER", "0"))  # seconds; 0 disables hedging
+        # Circuit breaker: consecutive failures before failing fast, and how long to stay open
+        self.llm_breaker_failures: int = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+        self.llm_breaker_reset: float = float(os.getenv("LLM_BREAKER_RESET", "30"))
+        # While the breaker is open: "rules" answers with the rule-based best guess, "fail" returns an error
+        self.llm_degraded_mode: str = os.getenv("LLM_DEGRADED_MODE", "rules").strip().lower()
+
+        # Rule-based fast path: templated emails scored at or above the threshold skip the LLM
+        self.fast_path_enabled: bool = os.getenv("FAST_PATH_ENABLED", "false").strip().lower() == "true"
+        self.fast_path_threshold: float = float(os.getenv("FAST_PATH_THRESHOLD", "0.75"))
+        self.fast_path_min_score: float = float(os.getenv("FAST_PATH_MIN_SCORE", "2.0"))
+
+        # Micro-batching: emails classified within CLASSIFIER_BATCH_WAIT_MS of each other share one model call
+        self.classifier_batching: bool = os.getenv("CLASSIFIER_BATCHING", "false").strip().lower() == "true"
+        self.classifier_batch_size: int = int(os.getenv("CLASSIFIER_BATCH_SIZE", "8"))
+        self.classifier_batch_wait_ms: float = float(os.getenv("CLASSIFIER_BATCH_WAIT_MS", "50"))
+        self.classifier_batch_max_tokens: int = int(os.getenv("CLASSIFIER_BATCH_MAX_TOKENS", "24000"))
+
+        # Attachment text cache: in-memory LRU plus an optional sqlite file (empty path disables it)
+        self.extraction_cache_entries: int = int(os.getenv("EXTRACTION_CACHE_ENTRIES", "512"))
+        self.extraction_cache_path: str = os.getenv("EXTRACTION_CACHE_PATH", "").strip()
+        self.extraction_cache_max_bytes: int = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+        # Classification result cache: "memory", "sqlite" (shared by workers via the file) or "none"
+        self.classification_cache_backend: str = os.getenv("CLASSIFICATION_CACHE_BACKEND", "memory").strip().lower()
+        self.classification_cache_path: str = os.getenv("CLASSIFICATION_CACHE_PATH", "cache/classification.db").strip()
+        self.classification_cache_entries: int = int(os.getenv("CLASSIFICATION_CACHE_ENTRIES", "10000"))
+        self.classification_cache_ttl: int = int(os.getenv("CLASSIFICATION_CACHE_TTL", "3600"))  # seconds
+
+        # Processed-email hashes for duplicate detection: "memory" or "sqlite" (durable, shared by workers)
+        self.dedup_store_backend: str = os.getenv("DEDUP_STORE_BACKEND", "memory").strip().lower()
+        self.dedup_store_path: str = os.getenv("DEDUP_STORE_PATH", "cache/dedup.db").strip()
+        self.dedup_retention_days: float = float(os.getenv("DEDUP_RETENTION_DAYS", "30"))  # 0 keeps hashes forever
+
+        # MinHash/LSH near-duplicate index: "memory", "sqlite" or "none"
+        self.near_duplicate_backend: str = os.getenv("NEAR_DUPLICATE_BACKEND", "memory").strip().lower()
+        self.near_duplicate_path: str = os.getenv("NEAR_DUPLICATE_PATH", "cache/near_duplicates.db").strip()
+        self.near_duplicate_bands: int = int(os.getenv("NEAR_DUPLICATE_BANDS", "16"))  # of 128 MinHash values
+        self.near_duplicate_threshold: float = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.95"))  # templated notices differing in one amount score ~0.9
+
+        # Priority scheduling: emails allowed into attachment extraction/OCR/LLM at once (0 = unlimited, FIFO),
+        # and how many seconds of waiting raise an email by one priority level
+        self.scheduler_max_concurrent: int = int(os.getenv("SCHEDULER_MAX_CONCURRENT", "16"))
+        self.scheduler_aging_seconds: float = float(os.getenv("SCHEDULER_AGING_SECONDS", "30"))
+        # Emails allowed to wait for a slot; more are refused with 429 (0 = no limit)
+        self.scheduler_max_queue: int = int(os.getenv("SCHEDULER_MAX_QUEUE", "256"))
+
+        # Admission control: requests in flight on /process and /process/batch before new ones get 503 (0 = no limit),
+        # OCR jobs (tesseract/poppler subprocesses) at once, and the estimated memory budget of emails in progress
+        self.admission_max_requests: int = int(os.getenv("ADMISSION_MAX_REQUESTS", "64"))
+        self.admission_retry_after: float = float(os.getenv("ADMISSION_RETRY_AFTER", "5"))  # seconds
+        self.ocr_max_concurrent: int = int(os.getenv("OCR_MAX_CONCURRENT", str(self.cpu_workers)))
+        self.memory_budget_mb: float = float(os.getenv("MEMORY_BUDGET_MB", "2048"))  # 0 disables the budget
+
+        # Asynchronous jobs (POST /jobs): sqlite queue shared by the API and `python -m backend.worker` processes
+        self.job_queue_path: str = os.getenv("JOB_QUEUE_PATH", "cache/jobs.db").strip()
+        self.job_visibility_timeout: float = float(os.getenv("JOB_VISIBILITY_TIMEOUT", "300"))  # lease, seconds
+        self.job_max_attempts: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+        self.job_retry_delay: float = float(os.getenv("JOB_RETRY_DELAY", "30"))  # seconds before a failed job is retried
+        self.job_retention_days: float = float(os.getenv("JOB_RETENTION_DAYS", "7"))  # 0 keeps finished jobs forever
+        self.job_worker_concurrency: int = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))  # jobs in flight per worker
+        self.job_poll_interval: float = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+        self.webhook_timeout: float = float(os.getenv("WEBHOOK_TIMEOUT", "10"))
+        # Hosts a callback_url may point at (comma-separated); empty allows any http(s) host
+        allowed_hosts = os.getenv("WEBHOOK_ALLOWED_HOSTS", "")
+        self.webhook_allowed_hosts: List[str] = [h.strip().lower() for h in allowed_hosts.split(",") if h.strip()]
+
     def validate(self):
         """ Validates the necessary configurations """
-        if not self.gemini_api_key:
+        if self.classifier_backend == "gemini" and not self.gemini_api_key:
             raise ValueError("Error: Gemini API key is required and missing.")
 
+        # Only images and scanned PDFs need Tesseract, so a missing binary is not fatal
         tesseract_path = Path(self.tesseract_path)
         if not tesseract_path.exists():
-            raise FileNotFoundError(f"Error: Tesseract not found at {tesseract_path}")
+            print(f"Warning: Tesseract not found at {tesseract_path}; OCR of images and scanned PDFs will fail")
 
         # Ensure upload directory exists
         self.upload_dir.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
@@ -1,21 +1,35 @@
-from pathlib import Path
-
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from backend.services.email_parser import EmailParser
-from backend.services.attachment_processor import AttachmentProcessor
-from backend.services.classification import Classifier
+from fastapi.responses import StreamingResponse
+from backend.services.admission import AdmissionMiddleware, InFlightLimit, Overloaded
+from backend.services.execution import ExecutionLayer
+from backend.services.batch_processor import ARCHIVE_SUFFIXES, BatchProcessor, iter_batch_items
+from backend.services.pipeline import EmailPipeline
+from backend.services.dedup_store import create_duplicate_store
+from backend.services.job_queue import JobQueue
 from backend.services.routing import RequestRouter
+from backend.services.upload_validation import (
+    MULTIPART_OVERHEAD, UploadLimitMiddleware, UploadRejected, check_callback_url, check_upload, read_upload
+)
 from backend.config import Config
-from backend.models.multi_request_data import MultiRequestData
-import tempfile
-import os
-from typing import Dict, List
+import json
+from contextlib import asynccontextmanager
+from typing import List, Optional
 
-app = FastAPI()
 config = Config()
 config.validate()
 
+execution = ExecutionLayer(config.io_workers, config.cpu_workers, config.ocr_use_processes)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    execution.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+
 # Sample available teams and skills (replace with your actual data)
 available_teams = {
     "Payments Processing": ["payment_verification", "fraud_detection", "compliance_check"],
@@ -24,8 +38,20 @@ available_teams = {
 }
 router = RequestRouter(available_teams)
 
-# In-memory store for demo (replace with DB in production)
-processed_hashes = set()
+processed_hashes = create_duplicate_store(
+    config.dedup_store_backend,
+    config.dedup_store_path,
+    config.dedup_retention_days * 24 * 3600
+)
+
+pipeline = EmailPipeline(config, router, processed_hashes, execution)
+batch_processor = BatchProcessor(pipeline, config.batch_max_workers)
+job_queue = JobQueue(
+    config.job_queue_path,
+    config.job_visibility_timeout,
+    config.job_max_attempts,
+    config.job_retention_days * 24 * 3600
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -33,128 +59,97 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Oversized bodies are refused from Content-Length or cut off mid-stream, before parsing
+app.add_middleware(
+    UploadLimitMiddleware,
+    limits={
+        "/process": config.max_file_size + MULTIPART_OVERHEAD,
+        "/process/batch": config.max_batch_upload_size + MULTIPART_OVERHEAD,
+        "/jobs": config.max_file_size + MULTIPART_OVERHEAD,
+    }
+)
+# Outermost: over the in-flight limit, requests are refused before their upload is read
+request_limit = InFlightLimit(config.admission_max_requests, config.admission_retry_after)
+app.add_middleware(AdmissionMiddleware, paths=["/process", "/process/batch"], limit=request_limit)
 
 
 @app.post("/process")
 async def process_email(file: UploadFile = File(...)):
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(file.filename).suffix) as tmp:
-            tmp.write(await file.read())
-            tmp_path = tmp.name
-
-        # Process email using the universal parser
-        email_data = EmailParser.parse_email(tmp_path)  # Changed to use parse_email
-        processor = AttachmentProcessor(config.tesseract_path)
-
-        # Process attachments and extract text
-        attachments_data = []
-        for attachment in email_data['attachments']:
-            text = processor.extract_text(attachment['path'])
-            attachments_data.append({
-                'filename': attachment['filename'],
-                'content_type': attachment['content_type'],
-                'text': text
-            })
-
-        # Build full content with structured attachment data
-        content_str = f"""
-        EMAIL HEADERS:
-        From: {email_data['headers']['from']}
-        To: {email_data['headers']['to']}
-        CC: {email_data['headers']['cc']}
-        Subject: {email_data['headers']['subject']}
-        Date: {email_data['headers']['date']}
-
-        BODY:
-        {email_data['body']}
-
-        ATTACHMENTS:
-        {'\n\n'.join(f"{a['filename']}:\n{a['text']}" for a in attachments_data)}
-        """
-        print(f"Parsed headers: {email_data['headers']}")  # Debug print
-        # Classify content
-        classifier = Classifier(config.gemini_api_key)
-        print(email_data['headers']['subject'])
-
-        # Detect duplicates with the new signature
-        duplicate_info = classifier.detect_duplicates(
-            subject=email_data['headers']['subject'],
-            sender=email_data['headers']['from'],
-            sent_date=email_data['headers']['date'],
-            email_body=email_data['body'],
-            previous_hashes=list(processed_hashes)
+        data = await execution.run_io(
+            read_upload, file.file, file.filename, config.max_file_size, config.allowed_file_types
         )
-        processed_hashes.add(duplicate_info['hash'])
-
-        if duplicate_info['is_duplicate']:
-            return {
-                "status": "duplicate",
-                "reason": duplicate_info['reason'],
-                "hash": duplicate_info['hash']
-            }
-
-        # Perform classification
-        result = classifier.classify(content_str)
-        result.raw_content = {
-            'headers': email_data['headers'],
-            'body': email_data['body'],
-            'attachments': attachments_data
-        }
-
-        # Enhanced field extraction
-        _enhance_with_field_extraction(result, email_data['body'], attachments_data)
-
-        # Route requests
-        routing_decisions = {
-            "primary": router.route_request(result.primary_request),
-            "secondary": [router.route_request(req) for req in result.secondary_requests]
-        }
-
-        return {
-            "classification": result.dict(),
-            "routing": routing_decisions
-        }
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    try:
+        return await pipeline.process_bytes(file.filename, data)
+    except Overloaded as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
-
-
-def _enhance_with_field_extraction(result: MultiRequestData, body: str, attachments: List[Dict]):
-    """Enhance results with rule-based field extraction"""
-    from backend.services.field_extraction_rules import FieldExtractor
-
-    # Process primary request
-    primary_extractor = FieldExtractor(result.primary_request.request_type)
-    body_fields = primary_extractor.extract_from_text(body)
-
-    # Process attachments for primary request
-    attachment_fields = {}
-    for attachment in attachments:
-        if attachment['text']:
-            fields = primary_extractor.extract_from_attachment(
-                attachment['filename'],
-                attachment['text']
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(file: UploadFile = File(...), callback_url: Optional[str] = Form(None)):
+    """
+    Queue an email for asynchronous processing and return its job id right away.
+    A worker (python -m backend.worker) processes it; poll GET /jobs/{job_id} or pass
+    callback_url to receive the outcome as a POST.
+    """
+    try:
+        if callback_url:
+            check_callback_url(callback_url, config.webhook_allowed_hosts)
+        data = await execution.run_io(
+            read_upload, file.file, file.filename, config.max_file_size, config.allowed_file_types
+        )
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    job_id = await execution.run_io(job_queue.submit, file.filename, data, callback_url)
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await execution.run_io(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/stats")
+async def get_stats():
+    stats = pipeline.stats()
+    stats["jobs"] = await execution.run_io(job_queue.stats)
+    stats["requests"] = request_limit.stats()
+    return stats
+
+
+@app.post("/process/batch")
+async def process_email_batch(files: List[UploadFile] = File(...)):
+    """
+    Process many .eml/.msg files (or .zip/.mbox archives of them) concurrently.
+    Results are streamed back as NDJSON, one line per email in completion order.
+    """
+    # Reject the whole request up front, before any result has been streamed
+    try:
+        for upload in files:
+            await execution.run_io(
+                check_upload, upload.file, upload.filename, config.allowed_file_types + list(ARCHIVE_SUFFIXES)
             )
-            for k, v in fields.items():
-                attachment_fields.setdefault(k, []).extend(v)
-
-    # Update extracted fields
-    result.primary_request.extracted_fields.update({
-        **body_fields,
-        **attachment_fields
-    })
-
-    # Process secondary requests
-    for req in result.secondary_requests:
-        extractor = FieldExtractor(req.request_type)
-        req.extracted_fields.update(extractor.extract_from_text(body))
-        for attachment in attachments:
-            if attachment['text']:
-                req.extracted_fields.update(
-                    extractor.extract_from_attachment(attachment['filename'], attachment['text'])
-                )
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    def items():
+        for upload in files:
+            yield from iter_batch_items(upload.filename, upload.file, config.max_file_size)
+
+    async def stream():
+        async for result in batch_processor.process(items()):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 
 if __name__ == "__main__":
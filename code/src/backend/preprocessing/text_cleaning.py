@@ -1,28 +1,39 @@
 import re
 from typing import Optional
 
+# Markers after which everything up to the end of the text is dropped. They are matched
+# with search() and the text is sliced at the match, instead of substituting a trailing
+# "[\s\S]*$" / "(?s).*$", so the cost stays linear on long OCR'd text.
+SIGNATURE_MARKERS = [
+    re.compile(r'--[^\S\r\n]*[\r\n]|__[\r\n]'),  # Signature after -- or __
+    re.compile(r'(?i)best regards|kind regards|thanks|cheers'),
+]
+MOBILE_SIGNATURE = re.compile(r'(?m)^sent from my (iphone|android).*$')
+DISCLAIMER_MARKERS = [
+    re.compile(r'confidentiality notice', re.IGNORECASE),
+    re.compile(r'this message is confidential', re.IGNORECASE),
+]
+
+
+def _truncate_at(text: str, marker) -> str:
+    match = marker.search(text)
+    return text[:match.start()] if match else text
+
+
 class EmailCleaner:
     @staticmethod
     def remove_signatures(text: str) -> str:
         # Remove common email signature patterns
-        patterns = [
-            r'(?s)(--\s*[\r\n]|__[\r\n]).*$',  # Signature after -- or __
-            r'(?i)(best regards|kind regards|thanks|cheers)[\s\S]*$',
-            r'(?m)^sent from my (iphone|android).*$'
-        ]
-        for pattern in patterns:
-            text = re.sub(pattern, '', text)
+        for marker in SIGNATURE_MARKERS:
+            text = _truncate_at(text, marker)
+        text = MOBILE_SIGNATURE.sub('', text)
         return text.strip()
 
     @staticmethod
     def remove_disclaimers(text: str) -> str:
         # Remove legal disclaimers
-        disclaimer_patterns = [
-            r'(?s)confidentiality notice.*$',
-            r'(?s)this message is confidential.*$'
-        ]
-        for pattern in disclaimer_patterns:
-            text = re.sub(pattern, '', text, flags=re.IGNORECASE)
+        for marker in DISCLAIMER_MARKERS:
+            text = _truncate_at(text, marker)
         return text
 
     def clean_email_content(self, email_body: str) -> str:
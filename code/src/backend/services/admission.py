@@ -0,0 +1,164 @@
+import io
+import json
+import math
+import re
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator
+
+from PIL import Image
+
+# Page objects in a PDF, counted without parsing it
+PDF_PAGE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+
+
+class Overloaded(Exception):
+    """Work refused to protect the service; the client should retry after retry_after seconds"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+def ocr_raster_bytes(ocr_dpi: int = 200) -> int:
+    """Memory of one PDF page rasterized for OCR: a letter-size RGB image at ocr_dpi"""
+    return int(8.5 * ocr_dpi) * int(11 * ocr_dpi) * 3
+
+
+def payload_memory(attachments: Iterable[Dict]) -> int:
+    """Memory an email holds just by waiting: its attachment payloads plus their extracted text"""
+    return sum(2 * len(attachment['data']) for attachment in attachments)
+
+
+def estimate_memory(attachments: Iterable[Dict], ocr_dpi: int = 200, ocr_max_concurrent: int = 4) -> int:
+    """
+    Rough peak memory, in bytes, of extracting an email's attachments, payloads included.
+    PDFs are assumed scanned (worst case). With ocr_max_concurrent > 0 their page rasters are
+    not charged here: the OCR slots are shared by every email, so the MemoryBudget sets aside
+    ocr_max_concurrent rasters once. With no limit (0) every page is charged.
+    Images cost their decoded size; spreadsheets expand several times in pandas.
+    """
+    total = payload_memory(attachments)
+    for attachment in attachments:
+        data = attachment['data']
+        ext = Path(attachment['filename'] or "").suffix.lower()
+        if ext == '.pdf':
+            if ocr_max_concurrent <= 0:
+                total += (len(PDF_PAGE.findall(data)) or 1) * ocr_raster_bytes(ocr_dpi)
+        elif ext in ('.png', '.jpg', '.jpeg'):
+            try:
+                # Only the header is read to get the dimensions
+                width, height = Image.open(io.BytesIO(data)).size
+                total += width * height * 4
+            except Exception:
+                total += 10 * len(data)
+        elif ext in ('.csv', '.xls', '.xlsx'):
+            total += 10 * len(data)
+    return total
+
+
+class MemoryBudget:
+    """
+    Caps the estimated memory of the emails being processed at once. An email that does
+    not fit next to the ones already admitted is refused with 503 (retry later); one that
+    could never fit is refused with 413, so a single huge email cannot occupy the whole
+    budget and starve the rest. reserved_bytes is set aside up front for memory shared by
+    all emails (the OCR rasters). The stats count reservations, and an email makes two: its
+    payload while it waits, the rest once it runs. Used from the event loop only.
+    """
+
+    def __init__(self, max_bytes: int, retry_after: float = 5, reserved_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.retry_after = retry_after
+        self.reserved_bytes = reserved_bytes
+        self._in_use = 0
+        self._stats = {"admitted": 0, "rejected": 0, "too_large": 0, "peak_bytes": 0}
+
+    def check(self, nbytes: int):
+        """Refuse (413) an email that could never fit, however idle the service"""
+        if nbytes > self.max_bytes - self.reserved_bytes:
+            self._stats["too_large"] += 1
+            raise Overloaded(413, f"Email needs about {math.ceil(nbytes / 2 ** 20)} MB to process, over the "
+                                  f"{(self.max_bytes - self.reserved_bytes) // 2 ** 20} MB limit", self.retry_after)
+
+    @contextmanager
+    def reserve(self, nbytes: int) -> Iterator[None]:
+        self.check(nbytes)
+        if self.reserved_bytes + self._in_use + nbytes > self.max_bytes:
+            self._stats["rejected"] += 1
+            raise Overloaded(503, "Server is at its memory limit, retry later", self.retry_after)
+        self._in_use += nbytes
+        self._stats["admitted"] += 1
+        self._stats["peak_bytes"] = max(self._stats["peak_bytes"], self._in_use)
+        try:
+            yield
+        finally:
+            self._in_use -= nbytes
+
+    def stats(self) -> Dict:
+        return {**self._stats, "in_use_bytes": self._in_use, "reserved_bytes": self.reserved_bytes,
+                "max_bytes": self.max_bytes}
+
+
+class InFlightLimit:
+    """Counter of requests in progress with a cap; shared by AdmissionMiddleware and /stats"""
+
+    def __init__(self, max_in_flight: int, retry_after: float = 5):
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.rejected = 0
+
+    def stats(self) -> Dict:
+        return {"in_flight": self.in_flight, "max_in_flight": self.max_in_flight, "rejected": self.rejected}
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware capping the requests in flight on the expensive endpoints. Requests
+    over the limit get an immediate 503 with Retry-After, before their body is read.
+    """
+
+    def __init__(self, app, paths: Iterable[str], limit: InFlightLimit):
+        self.app = app
+        self.paths = set(paths)
+        self.limit = limit
+
+    async def __call__(self, scope, receive, send):
+        if not self._guarded(scope):
+            await self.app(scope, receive, send)
+            return
+        limit = self.limit
+        if limit.in_flight >= limit.max_in_flight:
+            limit.rejected += 1
+            await send_overloaded(send, Overloaded(503, "Too many requests in progress, retry later", limit.retry_after))
+            return
+        limit.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit.in_flight -= 1
+
+    def _guarded(self, scope) -> bool:
+        return (self.limit.max_in_flight > 0 and scope["type"] == "http" and scope.get("method") == "POST"
+                and scope.get("path", "").rstrip("/") in self.paths)
+
+
+async def send_overloaded(send, error: Overloaded):
+    body = json.dumps({"detail": error.detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": error.status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", error.headers["Retry-After"].encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
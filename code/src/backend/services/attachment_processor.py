@@ -1,69 +1,195 @@
+import asyncio
+import io
 import tempfile
+from contextlib import contextmanager, nullcontext
 
 import pytesseract
-from pdf2image import convert_from_path
 from PyPDF2 import PdfReader
 import pandas as pd
 import os
 import extract_msg
 from pathlib import Path
-from typing import Optional, Dict, List
-import email
-from email import policy
+from typing import Iterator, Optional, Dict, List, Tuple, Union
+from .email_parser import msg_attachment_data
+from .execution import ExecutionLayer
+from .ocr import ocr_image, ocr_pdf_page
+from .extraction_cache import ExtractionCache, hash_bytes
 
 
 class AttachmentProcessor:
-    def __init__(self, tesseract_path: str):
+    def __init__(self, tesseract_path: str, execution: Optional[ExecutionLayer] = None,
+                 cache: Optional[ExtractionCache] = None, ocr_dpi: int = 200, ocr_min_page_chars: int = 20,
+                 spool_threshold: int = 8 * 1024 * 1024, ocr_max_concurrent: int = 0):
         pytesseract.pytesseract.tesseract_cmd = tesseract_path
+        self.tesseract_path = tesseract_path
+        # Needed by extract_text_async: parsing runs on its I/O pool and OCR on its CPU pool
+        self.execution = execution
+        self.cache = cache
+        self.ocr_dpi = ocr_dpi
+        self.ocr_min_page_chars = ocr_min_page_chars
+        # Payloads larger than this are handed to OCR workers as a temp file instead of pickled bytes
+        self.spool_threshold = spool_threshold
+        # Caps OCR jobs (a rasterized page plus a tesseract subprocess each) running or queued
+        # at once across all emails; 0 leaves it to the CPU pool's size
+        self._ocr_slots = asyncio.Semaphore(ocr_max_concurrent) if ocr_max_concurrent > 0 else None
 
-    def extract_text(self, file_path: str) -> Optional[str]:
-        """Extracts text from various file types including MSG files."""
+    def extract_text(self, filename: str, data: bytes) -> Optional[str]:
+        """Extracts text from an in-memory attachment of various file types including MSG files."""
         try:
-            if not os.path.exists(file_path):
-                return None
-
-            file_ext = Path(file_path).suffix.lower()
-
-            if file_ext in ('.png', '.jpg', '.jpeg'):
-                return pytesseract.image_to_string(file_path)
-            elif file_ext == '.pdf':
-                return self._extract_from_pdf(file_path)
-            elif file_ext == '.msg':
-                return self._extract_from_msg(file_path)
-            elif file_ext == '.csv':
-                return self._extract_from_csv(file_path)
-            elif file_ext in ('.xls', '.xlsx'):
-                return self._extract_from_excel(file_path)
-            elif file_ext in ('.eml', '.txt'):
-                return self._extract_from_text_file(file_path)
-            else:
-                # Fallback for unknown file types
-                return self._try_generic_extraction(file_path)
+            file_ext = Path(filename).suffix.lower()
+
+            if self.cache is None:
+                return self._extract_by_type(data, file_ext)
+
+            # Identical attachments (same bytes) are only parsed/OCR'd once
+            cache_key = self.cache.make_key(hash_bytes(data), file_ext)
+            text = self.cache.get(cache_key)
+            if text is None:
+                text = self._extract_by_type(data, file_ext)
+                if text is not None:
+                    self.cache.put(cache_key, text)
+            return text
+
+        except Exception as e:
+            print(f"Error processing attachment: {str(e)}")
+            return None
+
+    async def extract_text_async(self, filename: str, data: bytes) -> Optional[str]:
+        """
+        extract_text for the event loop. Parsing runs on the I/O pool, and OCR jobs are awaited
+        here rather than from an I/O thread, so a burst of scanned documents only occupies
+        CPU workers and does not hold up other requests' parsing.
+        """
+        run_io = self.execution.run_io
+        try:
+            file_ext = Path(filename).suffix.lower()
+
+            if self.cache is None:
+                return await self._extract_by_type_async(data, file_ext)
+
+            cache_key = self.cache.make_key(hash_bytes(data), file_ext)
+            text = await run_io(self.cache.get, cache_key)
+            if text is None:
+                text = await self._extract_by_type_async(data, file_ext)
+                if text is not None:
+                    await run_io(self.cache.put, cache_key, text)
+            return text
 
         except Exception as e:
             print(f"Error processing attachment: {str(e)}")
             return None
+
+    def _extract_by_type(self, data: bytes, file_ext: str) -> Optional[str]:
+        """Dispatch to the extractor for the file type"""
+        if file_ext in ('.png', '.jpg', '.jpeg'):
+            return ocr_image(data, self.tesseract_path)
+        elif file_ext == '.pdf':
+            return self._extract_from_pdf(data)
+        elif file_ext == '.msg':
+            return self._extract_from_msg(data)
+        elif file_ext == '.csv':
+            return self._extract_from_csv(data)
+        elif file_ext in ('.xls', '.xlsx'):
+            return self._extract_from_excel(data)
+        elif file_ext in ('.eml', '.txt'):
+            return self._extract_from_text_file(data)
+        else:
+            # Fallback for unknown file types
+            return self._try_generic_extraction(data, file_ext)
+
+    async def _extract_by_type_async(self, data: bytes, file_ext: str) -> Optional[str]:
+        """_extract_by_type with the OCR-bearing types (images, scanned PDFs, nested MSG) awaited"""
+        if file_ext in ('.png', '.jpg', '.jpeg'):
+            return await self._extract_from_image_async(data, file_ext)
+        elif file_ext == '.pdf':
+            return await self._extract_from_pdf_async(data)
+        elif file_ext == '.msg':
+            return await self._extract_from_msg_async(data)
+        return await self.execution.run_io(self._extract_by_type, data, file_ext)
+
+    async def _extract_from_image_async(self, data: bytes, file_ext: str) -> str:
+        """OCR an image, passing small images to the worker by value"""
+        if len(data) <= self.spool_threshold:
+            return await self._ocr(ocr_image, data, self.tesseract_path)
+        path = await self.execution.run_io(spill, data, file_ext)
+        try:
+            return await self._ocr(ocr_image, path, self.tesseract_path)
+        finally:
+            await self.execution.run_io(os.unlink, path)
+
+    def _extract_from_pdf(self, data: bytes) -> Optional[str]:
+        """Extract text from PDF files, OCR'ing only the pages without a usable text layer"""
+        pages, scanned = self._pdf_text_layer(data)
+        if not scanned:
+            return "\n".join(pages)
+        ocr_text = []
+        with spilled(data, '.pdf') as path:
+            for i in scanned:
+                # A page that fails keeps its text layer; the rest of the PDF is still read
+                try:
+                    ocr_text.append(ocr_pdf_page(path, i + 1, self.tesseract_path, self.ocr_dpi))
+                except Exception as e:
+                    ocr_text.append(e)
+        return merge_ocr_pages(pages, scanned, ocr_text)
+
+    async def _extract_from_pdf_async(self, data: bytes) -> Optional[str]:
+        pages, scanned = await self.execution.run_io(self._pdf_text_layer, data)
+        if not scanned:
+            return "\n".join(pages)
+
+        # pdftoppm only reads files, so a scanned PDF is spilled to disk once and every
+        # page job reads it from there; each page is rasterized and OCR'd in parallel
+        path = await self.execution.run_io(spill, data, '.pdf')
+        try:
+            ocr_text = await asyncio.gather(*[
+                self._ocr(ocr_pdf_page, path, i + 1, self.tesseract_path, self.ocr_dpi) for i in scanned
+            ], return_exceptions=True)
         finally:
-            if os.path.exists(file_path):
-                os.unlink(file_path)
-
-    def _extract_from_pdf(self, file_path: str) -> Optional[str]:
-        """Extract text from PDF files with OCR fallback"""
-        # First try direct text extraction
-        with open(file_path, 'rb') as f:
-            reader = PdfReader(f)
-            text = "\n".join([page.extract_text() or "" for page in reader.pages])
-            if text.strip():
-                return text
-
-        # Fallback to OCR if no text found
-        images = convert_from_path(file_path)
-        return "\n".join([pytesseract.image_to_string(img) for img in images])
-
-    def _extract_from_msg(self, file_path: str) -> Optional[str]:
+            await self.execution.run_io(os.unlink, path)
+        return merge_ocr_pages(pages, scanned, ocr_text)
+
+    def _pdf_text_layer(self, data: bytes) -> Tuple[List[str], List[int]]:
+        """Text layer of every page and the indexes of the pages too empty to trust (scanned)"""
+        reader = PdfReader(io.BytesIO(data))
+        pages = [page.extract_text() or "" for page in reader.pages]
+        return pages, [i for i, text in enumerate(pages) if len(text.strip()) < self.ocr_min_page_chars]
+
+    async def _ocr(self, func, *args) -> str:
+        """Run an OCR job in the CPU pool once an OCR slot is free"""
+        async with self._ocr_slots or nullcontext():
+            return await self.execution.run_cpu(func, *args)
+
+    def _extract_from_msg(self, data: bytes) -> Optional[str]:
         """Extract text content from Outlook MSG files"""
         try:
-            msg = extract_msg.Message(file_path)
+            content, attachments = self._msg_parts(data)
+            return content + "".join(
+                # Recursively process attachment content
+                format_msg_attachment(name, self.extract_text(name, attachment_data))
+                for name, attachment_data in attachments
+            )
+        except Exception as e:
+            print(f"Error processing MSG file: {str(e)}")
+            return None
+
+    async def _extract_from_msg_async(self, data: bytes) -> Optional[str]:
+        try:
+            content, attachments = await self.execution.run_io(self._msg_parts, data)
+            texts = await asyncio.gather(*[self.extract_text_async(name, attachment_data)
+                                           for name, attachment_data in attachments])
+            return content + "".join(
+                format_msg_attachment(name, text) for (name, _), text in zip(attachments, texts)
+            )
+        except Exception as e:
+            print(f"Error processing MSG file: {str(e)}")
+            return None
+
+    @staticmethod
+    def _msg_parts(data: bytes) -> Tuple[str, List[Tuple[str, bytes]]]:
+        """Headers and body of an MSG file as text, and its attachments as (filename, bytes)"""
+        # A file object, never bytes, so an attachment cannot name a local file to open
+        msg = extract_msg.Message(io.BytesIO(data))
+        try:
             content = f"""
             Subject: {msg.subject or 'N/A'}
             From: {msg.sender or 'N/A'}
@@ -74,75 +200,48 @@ class AttachmentProcessor:
             Body:
             {msg.body or 'No body content'}
             """
-
-            # Process attachments recursively
-            if msg.attachments:
+            attachments = [(attachment.longFilename, msg_attachment_data(attachment)) for attachment in msg.attachments]
+            if attachments:
                 content += "\n\n--- ATTACHMENTS ---\n"
-                for attachment in msg.attachments:
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=Path(attachment.longFilename).suffix) as tmp:
-                        if hasattr(attachment, 'data'):
-                            tmp.write(attachment.data)
-                        else:
-                            tmp.write(attachment._getStream('__substg1.0_37010102'))
-                        tmp_path = tmp.name
-
-                    # Recursively process attachment content
-                    attachment_content = self.extract_text(tmp_path)
-                    if attachment_content:
-                        content += f"\nAttachment: {attachment.longFilename}\n{attachment_content}\n"
-
-                    if os.path.exists(tmp_path):
-                        os.unlink(tmp_path)
-
+            return content, attachments
+        finally:
             msg.close()
-            return content
-        except Exception as e:
-            print(f"Error processing MSG file: {str(e)}")
-            return None
 
-    def _extract_from_csv(self, file_path: str) -> Optional[str]:
+    def _extract_from_csv(self, data: bytes) -> Optional[str]:
         """Extract text from CSV files"""
         try:
-            df = pd.read_csv(file_path)
+            df = pd.read_csv(io.BytesIO(data))
             return df.to_string(index=False)
         except Exception:
             # Fallback to raw text if CSV parsing fails
-            return self._extract_from_text_file(file_path)
+            return self._extract_from_text_file(data)
 
-    def _extract_from_excel(self, file_path: str) -> Optional[str]:
+    def _extract_from_excel(self, data: bytes) -> Optional[str]:
         """Extract text from Excel files"""
         try:
-            df = pd.read_excel(file_path)
+            df = pd.read_excel(io.BytesIO(data))
             return df.to_string(index=False)
         except Exception:
             # Fallback to raw text if Excel parsing fails
-            return self._extract_from_text_file(file_path)
+            return self._extract_from_text_file(data)
 
-    def _extract_from_text_file(self, file_path: str) -> Optional[str]:
+    def _extract_from_text_file(self, data: bytes) -> Optional[str]:
         """Extract text from plain text files"""
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                return f.read()
-        except UnicodeDecodeError:
-            # Try binary read as last resort
-            with open(file_path, 'rb') as f:
-                return str(f.read())
-
-    def _try_generic_extraction(self, file_path: str) -> Optional[str]:
+        return data.decode('utf-8', errors='ignore')
+
+    def _try_generic_extraction(self, data: bytes, file_ext: str) -> Optional[str]:
         """Fallback method for unknown file types"""
         try:
             # First try as text file
-            result = self._extract_from_text_file(file_path)
+            result = self._extract_from_text_file(data)
             if result and len(result) > 10:  # Simple validity check
                 return result
 
             # Then try as binary
-            with open(file_path, 'rb') as f:
-                binary_content = f.read()
-                if b'\x00' not in binary_content:  # Basic binary check
-                    return binary_content.decode('utf-8', errors='ignore')
+            if b'\x00' not in data:  # Basic binary check
+                return data.decode('utf-8', errors='ignore')
 
-            return f"Binary file: {Path(file_path).name}"
+            return f"Binary file: {file_ext or 'no extension'}"
         except Exception:
             return None
 
@@ -151,12 +250,12 @@ class AttachmentProcessor:
         processed = []
         for attachment in attachments:
             try:
-                content = self.extract_text(attachment['path'])
+                content = self.extract_text(attachment['filename'], attachment['data'])
                 processed.append({
                     'filename': attachment['filename'],
                     'content_type': attachment['content_type'],
                     'content': content,
-                    'size': os.path.getsize(attachment['path']) if os.path.exists(attachment['path']) else 0
+                    'size': len(attachment['data'])
                 })
             except Exception as e:
                 print(f"Error processing attachment {attachment['filename']}: {str(e)}")
@@ -165,4 +264,38 @@ class AttachmentProcessor:
                     'content_type': attachment['content_type'],
                     'error': str(e)
                 })
-        return processed
\ No newline at end of file
+        return processed
+
+def format_msg_attachment(filename: str, text: Optional[str]) -> str:
+    return f"\nAttachment: {filename}\n{text}\n" if text else ""
+
+
+def merge_ocr_pages(pages: List[str], scanned: List[int], ocr_text: List[Union[str, BaseException]]) -> str:
+    """Put the OCR text of the scanned pages in place; a page whose OCR raised keeps its text layer"""
+    for i, text in zip(scanned, ocr_text):
+        if isinstance(text, BaseException):
+            if not isinstance(text, Exception):
+                raise text
+            print(f"OCR failed on PDF page {i + 1}: {str(text)}")
+            continue
+        # Keep whatever little the text layer had if OCR finds nothing better
+        if len(text.strip()) > len(pages[i].strip()):
+            pages[i] = text
+    return "\n".join(pages)
+
+
+def spill(data: bytes, suffix: str) -> str:
+    """Write a payload to a temp file for tools that only read from disk; the caller removes it"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        tmp.write(data)
+    return tmp.name
+
+
+@contextmanager
+def spilled(data: bytes, suffix: str) -> Iterator[str]:
+    """spill() as a context manager: the temp file is removed on exit"""
+    path = spill(data, suffix)
+    try:
+        yield path
+    finally:
+        os.unlink(path)
@@ -0,0 +1,157 @@
+import asyncio
+import zipfile
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Dict, Iterable, Iterator, List, Tuple, Union
+
+from .admission import Overloaded
+from .pipeline import EmailPipeline
+from .upload_validation import UploadRejected
+
+EMAIL_SUFFIXES = ('.eml', '.msg')
+ARCHIVE_SUFFIXES = ('.zip', '.mbox')
+
+# An email's raw bytes, or why it was refused before processing
+BatchItem = Union[bytes, UploadRejected]
+
+
+def iter_batch_items(filename: str, fileobj: BinaryIO, max_item_size: int = 0) -> Iterator[Tuple[str, BatchItem]]:
+    """
+    Yield (filename, raw bytes) for every email in an upload, expanding zip/mbox archives.
+    An email larger than max_item_size (0 = no limit) is yielded as an UploadRejected instead
+    of its bytes, and no more than max_item_size + 1 bytes of it are ever held in memory.
+    """
+    suffix = Path(filename).suffix.lower()
+    if suffix == '.zip':
+        yield from _iter_zip(filename, fileobj, max_item_size)
+    elif suffix == '.mbox':
+        yield from _iter_mbox(filename, fileobj, max_item_size)
+    else:
+        yield filename, _read_limited(fileobj, max_item_size)
+
+
+def iter_path_items(paths: Iterable[str], max_item_size: int = 0) -> Iterator[Tuple[str, BatchItem]]:
+    """Yield batch items for email/archive files on disk (Python API counterpart of /process/batch)"""
+    for path in paths:
+        with open(path, 'rb') as f:
+            yield from iter_batch_items(Path(path).name, f, max_item_size)
+
+
+def _too_large(max_item_size: int) -> UploadRejected:
+    return UploadRejected(413, f"Email exceeds the {max_item_size} byte limit")
+
+
+def _read_limited(fileobj: BinaryIO, max_item_size: int) -> BatchItem:
+    if not max_item_size:
+        return fileobj.read()
+    data = fileobj.read(max_item_size + 1)
+    return _too_large(max_item_size) if len(data) > max_item_size else data
+
+
+def _iter_zip(filename: str, fileobj: BinaryIO, max_item_size: int) -> Iterator[Tuple[str, BatchItem]]:
+    """Read .eml/.msg members of a zip archive one at a time"""
+    with zipfile.ZipFile(fileobj) as archive:
+        for member in archive.infolist():
+            if member.is_dir() or not member.filename.lower().endswith(EMAIL_SUFFIXES):
+                continue
+            name = f"{filename}/{member.filename}"
+            if max_item_size and member.file_size > max_item_size:
+                yield name, _too_large(max_item_size)
+                continue
+            # The declared size can lie (zip bombs): cap what is actually decompressed too
+            with archive.open(member) as f:
+                yield name, _read_limited(f, max_item_size)
+
+
+def _iter_mbox(filename: str, fileobj: BinaryIO, max_item_size: int) -> Iterator[Tuple[str, BatchItem]]:
+    """Split an mbox stream on 'From ' separator lines without loading the whole file"""
+    lines = []
+    size = 0
+    index = 0
+    previous_blank = True
+    line_start = True
+    # Bounded reads, so a huge line without newlines is not read in one piece
+    for piece in iter(lambda: fileobj.readline(max_item_size + 1 if max_item_size else -1), b''):
+        if line_start and piece.startswith(b'From ') and previous_blank:
+            if size:
+                yield f"{filename}#{index}.eml", _mbox_message(lines, size, max_item_size)
+                index += 1
+            lines = []
+            size = 0
+        else:
+            if line_start and piece.startswith(b'>From '):
+                piece = piece[1:]
+            size += len(piece)
+            # An oversized message is only measured from here on, not buffered
+            if not max_item_size or size <= max_item_size:
+                lines.append(piece)
+        previous_blank = line_start and not piece.strip()
+        line_start = piece.endswith(b'\n')
+
+    if size:
+        yield f"{filename}#{index}.eml", _mbox_message(lines, size, max_item_size)
+
+
+def _mbox_message(lines: List[bytes], size: int, max_item_size: int) -> BatchItem:
+    return _too_large(max_item_size) if max_item_size and size > max_item_size else b''.join(lines)
+
+
+class BatchProcessor:
+    """Fans the email pipeline out over a bounded number of concurrent tasks"""
+
+    def __init__(self, pipeline: EmailPipeline, max_workers: int):
+        self.pipeline = pipeline
+        self.max_workers = max_workers
+
+    async def process(self, items: Iterable[Tuple[str, BatchItem]]) -> AsyncIterator[Dict]:
+        """
+        Process (filename, bytes) items and yield per-email results in completion order.
+        At most max_workers emails are held in memory at once; a failing or refused email
+        yields an error result instead of aborting the batch.
+        """
+        pending = {}
+        items = iter(items)
+        index = 0
+        exhausted = False
+
+        while pending or not exhausted:
+            while not exhausted and len(pending) < self.max_workers:
+                try:
+                    # Reading the next item decompresses archive members and reads the spooled upload
+                    item = await self.pipeline.execution.run_io(next, items, None)
+                except Exception as e:
+                    # A broken archive must not discard results already streamed
+                    yield {"index": index, "filename": None, "status": "error", "error": str(e)}
+                    exhausted = True
+                    break
+                if item is None:
+                    exhausted = True
+                    break
+                filename, data = item
+                if isinstance(data, UploadRejected):
+                    yield {"index": index, "filename": filename, "status": "error", "error": data.detail}
+                    index += 1
+                    continue
+                future = asyncio.ensure_future(self.pipeline.process_bytes(filename, data))
+                pending[future] = (index, filename)
+                index += 1
+
+            if not pending:
+                break
+
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                item_index, filename = pending.pop(future)
+                yield self._to_result(item_index, filename, future)
+
+    @staticmethod
+    def _to_result(index: int, filename: str, future: asyncio.Future) -> Dict:
+        try:
+            result = future.result()
+        except Overloaded as e:
+            return {"index": index, "filename": filename, "status": "rejected", "error": e.detail,
+                    "retry_after": e.headers["Retry-After"]}
+        except Exception as e:
+            return {"index": index, "filename": filename, "status": "error", "error": str(e)}
+
+        status = "duplicate" if result.get("status") == "duplicate" else "processed"
+        return {"index": index, "filename": filename, "status": status, "result": result}
@@ -0,0 +1,95 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from .classification import Classifier
+from .prompt_builder import estimate_tokens
+from ..models.multi_request_data import MultiRequestData
+
+
+class BatchingClassifier:
+    """
+    Coalesces classification requests arriving within a short window into one model call.
+
+    The first request opens a batch and waits up to max_wait_ms for others; the batch is
+    sent early once it holds max_batch_size emails or the next one would push it past
+    max_batch_tokens. Results are split back to each waiting caller by email id, and any
+    email the batch response does not cover (or a failed batch) falls back to a single call.
+    Exposes the same classify_async as Classifier so the pipeline can use either.
+    """
+
+    def __init__(self, classifier: Classifier, max_batch_size: int = 8, max_wait_ms: float = 50,
+                 max_batch_tokens: int = 24000):
+        self.classifier = classifier
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_tokens = max_batch_tokens
+        # (content, tokens, future) waiting for the open batch to be sent
+        self._pending: List[Tuple[str, int, asyncio.Future]] = []
+        self._pending_tokens = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._stats = {"batches": 0, "batched_emails": 0, "single_calls": 0, "fallbacks": 0}
+
+    async def classify_async(self, content: str) -> MultiRequestData:
+        tokens = estimate_tokens(content)
+        if self._pending and (len(self._pending) >= self.max_batch_size
+                              or self._pending_tokens + tokens > self.max_batch_tokens):
+            self._flush()
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((content, tokens, future))
+        self._pending_tokens += tokens
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    def stats(self) -> Dict:
+        stats = dict(self._stats)
+        stats["avg_batch_size"] = stats["batched_emails"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_tokens = self._pending, [], 0
+        if batch:
+            asyncio.ensure_future(self._send(batch))
+
+    async def _send(self, batch: List[Tuple[str, int, asyncio.Future]]):
+        if len(batch) == 1:
+            content, _, future = batch[0]
+            self._stats["single_calls"] += 1
+            await self._classify_single(content, future)
+            return
+
+        self._stats["batches"] += 1
+        self._stats["batched_emails"] += len(batch)
+        contents = {str(i): content for i, (content, _, _) in enumerate(batch)}
+        try:
+            results = await self.classifier.classify_batch_async(contents)
+        except Exception as e:
+            print(f"Batch of {len(batch)} emails failed, classifying them one by one: {str(e)}")
+            results = {}
+
+        fallbacks = []
+        for i, (content, _, future) in enumerate(batch):
+            result = results.get(str(i))
+            if result is None:
+                fallbacks.append(self._classify_single(content, future))
+            elif not future.done():
+                future.set_result(result)
+        if fallbacks:
+            self._stats["fallbacks"] += len(fallbacks)
+            await asyncio.gather(*fallbacks)
+
+    async def _classify_single(self, content: str, future: asyncio.Future):
+        try:
+            result = await self.classifier.classify_async(content)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
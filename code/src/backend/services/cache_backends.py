@@ -0,0 +1,117 @@
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+
+class CacheBackend(ABC):
+    """Key/value store with per-entry TTL and a bound on the number of entries"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl_seconds: float):
+        raise NotImplementedError
+
+    @abstractmethod
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Process-local LRU"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl_seconds: float):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SqliteCacheBackend(CacheBackend):
+    """
+    Cache in a local sqlite file, shared by every uvicorn worker on the host.
+    When full, entries closest to expiry are evicted first.
+    """
+
+    def __init__(self, path: str, max_entries: int, table: str = "cache"):
+        self.max_entries = max_entries
+        self.table = table
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._db.execute(f"CREATE INDEX IF NOT EXISTS {table}_expires_at ON {table}(expires_at)")
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT value FROM {self.table} WHERE key = ? AND expires_at >= ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl_seconds: float):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, now + ttl_seconds)
+            )
+            self._db.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (now,))
+            overflow = self._db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._db.execute(
+                    f"DELETE FROM {self.table} WHERE key IN "
+                    f"(SELECT key FROM {self.table} ORDER BY expires_at LIMIT ?)", (overflow,)
+                )
+            self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                f"SELECT COUNT(*) FROM {self.table} WHERE expires_at >= ?", (time.time(),)
+            ).fetchone()[0]
+
+
+def create_cache_backend(kind: str, max_entries: int, path: str = "", table: str = "cache") -> Optional[CacheBackend]:
+    """Build a backend from configuration: 'memory', 'sqlite' or 'none'"""
+    kind = kind.strip().lower()
+    if kind == "memory":
+        return MemoryCacheBackend(max_entries)
+    if kind == "sqlite":
+        if not path:
+            raise ValueError("A sqlite cache backend needs a file path")
+        return SqliteCacheBackend(path, max_entries, table)
+    if kind in ("", "none"):
+        return None
+    raise ValueError(f"Unknown cache backend: {kind}")
@@ -1,62 +1,171 @@
-import google.generativeai as genai
-import json
 import hashlib
 import re
-from typing import List, Dict
+from email import policy
+from email.parser import BytesHeaderParser
+from typing import Container, List, Dict, Optional
 from ..models.extracted_data import ExtractedData
 from ..models.multi_request_data import MultiRequestData
-from ..models.request_type_mapping import REQUEST_TYPES, REQUEST_PRIORITY
+from ..models.request_type_mapping import REQUEST_PRIORITY
+from .classifier_backends import ClassifierBackend
+from .llm_client import LLMUnavailable, ResilientLLMClient
+from .near_duplicate import NearDuplicateIndex
+from .prompt_builder import COMPACT_SCHEMA, estimate_tokens
+from .response_parser import JSONStreamParser
+
+THREAD_PATTERNS = {
+    "forward": r"(?i)^\s*-----Original Message-----",
+    "reply": r"(?i)^\s*On.*wrote:",
+    "quoted": r"(?i)^>"
+}
+
+PROMPT_TASKS = """1. Identify ALL request types present in the email from these options (type: [sub-types]):
+{schema}
+
+2. For each request found:
+   - Determine the request type and sub-type (if applicable)
+   - Sub-type (must be one of the listed sub-types or null/empty)
+   - Extract relevant fields (amount, date, account details, etc.)
+   - Provide a confidence score (0-1)
+
+3. Determine the PRIMARY request (main intent of the sender)
+
+4. Check for duplicate requests by comparing with previous emails
+"""
+
+RESULT_FIELDS = """- primary_request (with type, sub_type [string or null], confidence_score, extracted_fields)
+- secondary_requests (array of other requests found)
+- is_duplicate (boolean)
+- duplicate_reason (if applicable)
+"""
+
+PROMPT_TEMPLATE = (
+    "Analyze this banking service request email and perform the following tasks:\n\n"
+    + PROMPT_TASKS
+    + "\nReturn JSON format with:\n"
+    + RESULT_FIELDS
+    + "\nEmail Content:\n{content}\n"
+)
+
+BATCH_PROMPT_TEMPLATE = (
+    "Analyze each of the following banking service request emails independently and perform, "
+    "for every email, the following tasks:\n\n"
+    + PROMPT_TASKS
+    + "\nReturn a JSON array with one object per email, each with:\n"
+    + "- email_id (the id from the email's === EMAIL <id> === line)\n"
+    + RESULT_FIELDS
+    + "\n{emails}\n"
+)
 
 
 class Classifier:
-    def __init__(self, api_key: str):
-        genai.configure(api_key='')
-        self.model = genai.GenerativeModel("gemini-2.0-flash")
+    def __init__(self, backend: ClassifierBackend, client: Optional[ResilientLLMClient] = None):
+        # Long-lived model backend (Gemini, or the offline stub for load tests)
+        self.backend = backend
+        # Rate limiting, retries, hedging and circuit breaking for the async calls
+        self.client = client
+        self._parse_stats = {"responses": 0, "repaired": 0, "unparseable": 0}
 
     def classify(self, content: str) -> MultiRequestData:
-        prompt = f"""
-        Analyze this banking service request email and perform the following tasks:
+        try:
+            parser = JSONStreamParser()
+            parser.feed(self.backend.generate(self._build_prompt(content)))
+            return self._parse_response(parser)
+        except Exception as e:
+            raise Exception(f"Classification failed: {str(e)}")
 
-        1. Identify ALL request types present in the email from these options:
-        {json.dumps(REQUEST_TYPES, indent=2)}
+    async def classify_async(self, content: str) -> MultiRequestData:
+        """Same as classify, but awaits the Gemini async client instead of blocking the event loop"""
+        try:
+            response = await self._generate_async(self._build_prompt(content))
+            return self._parse_response(response)
+        except LLMUnavailable:
+            raise
+        except Exception as e:
+            raise Exception(f"Classification failed: {str(e)}")
+
+    async def classify_batch_async(self, contents: Dict[str, str]) -> Dict[str, MultiRequestData]:
+        """
+        Classify several emails, keyed by id, with a single model call. Ids missing from
+        the response or whose entry cannot be parsed are left out of the returned dict.
+        """
+        try:
+            response = await self._generate_async(self._build_batch_prompt(contents))
+            entries = self._parse_json(response)
+        except LLMUnavailable:
+            raise
+        except Exception as e:
+            raise Exception(f"Batch classification failed: {str(e)}")
+        if not isinstance(entries, list):
+            raise Exception("Batch classification failed: response is not a JSON array")
 
-        2. For each request found:
-           - Determine the request type and sub-type (if applicable)
-           - Sub-type (must be one of the listed sub-types or null/empty)
-           - Extract relevant fields (amount, date, account details, etc.)
-           - Provide a confidence score (0-1)
+        results = {}
+        for entry in entries:
+            email_id = str(entry.get("email_id")) if isinstance(entry, dict) else None
+            if email_id not in contents or email_id in results:
+                continue
+            try:
+                results[email_id] = self._to_result(entry)
+            except Exception as e:
+                print(f"Skipping unparseable batch entry {email_id}: {str(e)}")
+        return results
 
-        3. Determine the PRIMARY request (main intent of the sender)
+    async def _generate_async(self, prompt: str) -> JSONStreamParser:
+        if self.client is None:
+            return await self._stream_json(prompt)
+        return await self.client.call(self._stream_json, prompt)
 
-        4. Check for duplicate requests by comparing with previous emails
+    async def _stream_json(self, prompt: str) -> JSONStreamParser:
+        """Read the response stream only until the first JSON value is complete"""
+        parser = JSONStreamParser()
+        stream = self.backend.stream_async(prompt)
+        try:
+            async for chunk in stream:
+                if parser.feed(chunk):
+                    break
+        finally:
+            await stream.aclose()
+        return parser
 
-        Return JSON format with:
-        - primary_request (with type, sub_type [string or null], confidence_score, extracted_fields)
-        - secondary_requests (array of other requests found)
-        - is_duplicate (boolean)
-        - duplicate_reason (if applicable)
+    def _build_prompt(self, content: str) -> str:
+        return PROMPT_TEMPLATE.format(schema=COMPACT_SCHEMA, content=content)
 
-        Email Content: {content}
-        """
+    def _build_batch_prompt(self, contents: Dict[str, str]) -> str:
+        emails = "\n\n".join(f"=== EMAIL {email_id} ===\n{content}" for email_id, content in contents.items())
+        return BATCH_PROMPT_TEMPLATE.format(schema=COMPACT_SCHEMA, emails=emails)
 
+    def instruction_tokens(self) -> int:
+        """Estimated tokens the prompt takes besides the email content"""
+        return estimate_tokens(self._build_prompt(""))
+
+    def _parse_response(self, parser: JSONStreamParser) -> MultiRequestData:
+        return self._to_result(self._parse_json(parser))
+
+    def _parse_json(self, parser: JSONStreamParser):
+        self._parse_stats["responses"] += 1
         try:
-            response = self.model.generate_content(prompt)
-            print(response)
-            raw_text = response.text.strip()
-            cleaned_text = re.sub(r"^```json|```$", "", raw_text).strip()
-            result = json.loads(cleaned_text)
+            value = parser.result()
+        except ValueError:
+            self._parse_stats["unparseable"] += 1
+            raise
+        if parser.repaired:
+            self._parse_stats["repaired"] += 1
+            print("Repaired malformed JSON in the model response")
+        return value
 
-            # Ensure sub_request_type is properly formatted
-            if "primary_request" in result:
-                result["primary_request"]["sub_type"] = self._clean_sub_type(result["primary_request"].get("sub_type"))
+    def stats(self) -> Dict:
+        """Model responses parsed, and how many needed repair or could not be recovered"""
+        return dict(self._parse_stats)
 
-            if "secondary_requests" in result:
-                for req in result["secondary_requests"]:
-                    req["sub_type"] = self._clean_sub_type(req.get("sub_type"))
+    def _to_result(self, result: Dict) -> MultiRequestData:
+        # Ensure sub_request_type is properly formatted
+        if "primary_request" in result:
+            result["primary_request"]["sub_type"] = self._clean_sub_type(result["primary_request"].get("sub_type"))
 
-            return MultiRequestData.from_llm_response(result, REQUEST_PRIORITY)
-        except Exception as e:
-            raise Exception(f"Classification failed: {str(e)}")
+        if "secondary_requests" in result:
+            for req in result["secondary_requests"]:
+                req["sub_type"] = self._clean_sub_type(req.get("sub_type"))
+
+        return MultiRequestData.from_llm_response(result, REQUEST_PRIORITY)
 
     def _clean_sub_type(self, sub_type):
         """Ensure sub_type is either a valid string or None"""
@@ -70,6 +179,31 @@ class Classifier:
         unique_string = f"{subject.lower()}|{sender.lower()}|{sent_date}|{key_content.lower()}"
         return hashlib.sha256(unique_string.encode()).hexdigest()
 
+    def raw_fingerprints(self, filename: str, data: bytes) -> List[str]:
+        """
+        Keys identifying an upload before it is parsed: a digest of the raw bytes and, for .eml
+        files, of the Message-ID header, so the same message resent or re-exported is recognised
+        without reading its body or attachments.
+        """
+        keys = ["raw:" + hashlib.sha256(data).hexdigest()]
+        if not filename.lower().endswith('.msg'):
+            # Only the header block is parsed
+            header_end = re.search(rb"\r?\n\r?\n", data)
+            headers = BytesHeaderParser(policy=policy.compat32).parsebytes(data[:header_end.end()] if header_end else data)
+            message_id = str(headers.get('Message-ID') or "").strip().lower()
+            if message_id:
+                keys.append("msgid:" + hashlib.sha256(message_id.encode(errors="ignore")).hexdigest())
+        return keys
+
+    def content_fingerprint(self, subject: str, email_body: str, attachment_texts: List[Optional[str]] = ()) -> str:
+        """
+        Fingerprint of the content the classifier reads, used to cache classification results.
+        Unlike compute_hash it ignores sender and date, so resends and multi-recipient copies match.
+        """
+        parts = [subject, self.extract_key_content(email_body)] + [text or "" for text in attachment_texts]
+        normalized = "|".join(" ".join(part.lower().split()) for part in parts)
+        return hashlib.sha256(normalized.encode()).hexdigest()
+
     def extract_key_content(self, email_body: str) -> str:
         """
         Extract meaningful content from the email body for deduplication.
@@ -87,8 +221,21 @@ class Classifier:
 
         return " ".join(filtered_lines[:500])  # Take only the first 500 characters
 
-    def detect_duplicates(self, subject: str, sender: str, sent_date: str, email_body: str, previous_hashes: List[str]) -> dict:
-        """Improved duplicate detection using refined email hashing."""
+    def detect_duplicates(self, subject: str, sender: str, sent_date: str, email_body: str, previous_hashes: Container[str],
+                          near_duplicates: Optional[NearDuplicateIndex] = None,
+                          attachment_texts: Optional[List[Optional[str]]] = ()) -> dict:
+        """
+        Improved duplicate detection using refined email hashing.
+        previous_hashes should support O(1) membership checks (a set or a DuplicateStore).
+
+        With a near_duplicates index, resends whose subject and content are nearly identical
+        (e.g. only the date line changed) are caught by MinHash similarity, and replies/forwards
+        are only duplicates if their new content matches an earlier email. The returned "signature"
+        should be added to the index once the email is accepted. attachment_texts=None means the
+        attachments have not been read: the similarity check is skipped rather than judged on the
+        body alone, since two emails can share a cover note and differ only in their attachments;
+        sign the email with near_duplicate_signature once they have been read.
+        """
         current_hash = self.compute_hash(subject, sender, sent_date, email_body)
 
         # Basic duplicate check
@@ -99,8 +246,18 @@ class Classifier:
                 "hash": current_hash
             }
 
-        # Thread analysis (kept same)
         thread_info = self._analyze_thread(email_body)
+        if near_duplicates is not None:
+            if attachment_texts is None:
+                result = {"is_duplicate": False, "hash": current_hash, "signature": None}
+                if thread_info.get("is_thread"):
+                    result["thread_data"] = thread_info
+                return result
+            return self._detect_near_duplicate(
+                current_hash, subject, email_body, thread_info, near_duplicates, attachment_texts
+            )
+
+        # Thread analysis (kept same)
         if thread_info.get("is_thread"):
             return {
                 "is_duplicate": True,
@@ -114,15 +271,43 @@ class Classifier:
             "hash": current_hash
         }
 
-    def _analyze_thread(self, content: str) -> dict:
-        """Analyze email for thread characteristics"""
-        patterns = {
-            "forward": r"(?i)^\s*-----Original Message-----",
-            "reply": r"(?i)^\s*On.*wrote:",
-            "quoted": r"(?i)^>"
+    def _detect_near_duplicate(self, current_hash: str, subject: str, email_body: str, thread_info: dict,
+                               near_duplicates: NearDuplicateIndex, attachment_texts: List[Optional[str]]) -> dict:
+        """Similarity-based duplicate check over the subject, key content and attachment text"""
+        signature = self.near_duplicate_signature(subject, email_body, near_duplicates, attachment_texts, thread_info)
+
+        result = {
+            "is_duplicate": False,
+            "hash": current_hash,
+            "signature": signature
         }
+        if thread_info.get("is_thread"):
+            result["thread_data"] = thread_info
 
-        for thread_type, pattern in patterns.items():
+        match = near_duplicates.query(signature) if signature is not None else None
+        if match:
+            duplicate_of, similarity = match
+            result.update({
+                "is_duplicate": True,
+                "reason": f"Near-duplicate of an earlier email (similarity {similarity:.2f})",
+                "duplicate_of": duplicate_of,
+                "similarity": similarity
+            })
+        return result
+
+    def near_duplicate_signature(self, subject: str, email_body: str, near_duplicates: NearDuplicateIndex,
+                                 attachment_texts: List[Optional[str]] = (), thread_info: Optional[dict] = None):
+        """MinHash signature of the subject, key content and attachment text (None if too short)"""
+        if thread_info is None:
+            thread_info = self._analyze_thread(email_body)
+        # For replies/forwards only the new part counts; the quoted part is the earlier email
+        new_content = self._extract_new_content(email_body, thread_info)
+        text = " ".join([subject, self.extract_key_content(new_content)] + [t for t in attachment_texts if t])
+        return near_duplicates.signature(text)
+
+    def _analyze_thread(self, content: str) -> dict:
+        """Analyze email for thread characteristics"""
+        for thread_type, pattern in THREAD_PATTERNS.items():
             if re.search(pattern, content, re.MULTILINE):
                 return {
                     "is_thread": True,
@@ -132,6 +317,14 @@ class Classifier:
 
         return {"is_thread": False}
 
+    def _extract_new_content(self, content: str, thread_info: dict) -> str:
+        """Content written in this email, without the quoted/forwarded original"""
+        if not thread_info.get("is_thread"):
+            return content
+        if thread_info["thread_type"] == "quoted":
+            return "\n".join(line for line in content.split("\n") if not line.startswith(">"))
+        return re.split(THREAD_PATTERNS[thread_info["thread_type"]], content, maxsplit=1, flags=re.MULTILINE)[0]
+
     def _extract_original_content(self, content: str, thread_type: str) -> str:
         """Extract original message from thread"""
         if thread_type == "forward":
@@ -0,0 +1,37 @@
+import threading
+from typing import Dict, Optional
+
+from .cache_backends import CacheBackend
+from ..models.multi_request_data import MultiRequestData
+
+
+class ClassificationCache:
+    """
+    Caches LLM classification results by normalized content fingerprint
+    (see Classifier.content_fingerprint), so resends and multi-recipient copies
+    of an email skip the LLM round trip.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl_seconds: float):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def get(self, fingerprint: str) -> Optional[MultiRequestData]:
+        cached = self.backend.get(fingerprint)
+        with self._lock:
+            self._stats["hits" if cached is not None else "misses"] += 1
+        # A fresh object per hit: callers mutate extracted_fields and raw_content
+        return MultiRequestData.model_validate_json(cached) if cached is not None else None
+
+    def put(self, fingerprint: str, result: MultiRequestData):
+        self.backend.set(fingerprint, result.model_dump_json(exclude={"raw_content"}), self.ttl_seconds)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["entries"] = len(self.backend)
+        return stats
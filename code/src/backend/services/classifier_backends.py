@@ -0,0 +1,107 @@
+import asyncio
+import json
+import re
+import time
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict
+
+import google.generativeai as genai
+
+from .fast_path_classifier import FastPathClassifier
+
+BATCH_SECTION = re.compile(r"^=== EMAIL (\S+) ===$", re.MULTILINE)
+
+
+class ClassifierBackend(ABC):
+    """Text-in, text-out model used by Classifier; returns the raw response text"""
+
+    @abstractmethod
+    def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def generate_async(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    async def stream_async(self, prompt: str) -> AsyncIterator[str]:
+        """Response text in pieces as it is generated; backends without streaming yield it whole"""
+        yield await self.generate_async(prompt)
+
+
+class GeminiBackend(ClassifierBackend):
+    """Google Gemini through google.generativeai"""
+
+    def __init__(self, api_key: str, model_name: str = "gemini-2.0-flash"):
+        # Create once and reuse: the model lazily opens its gRPC channels and keeps them
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt: str) -> str:
+        return self.model.generate_content(prompt).text
+
+    async def generate_async(self, prompt: str) -> str:
+        return (await self.model.generate_content_async(prompt)).text
+
+    async def stream_async(self, prompt: str) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            yield chunk.text
+
+
+class StubBackend(ClassifierBackend):
+    """
+    Deterministic offline backend for load tests and profiling: answers every prompt with the
+    rule-based scorer's best guess after a fixed delay, so the rest of the pipeline can be
+    measured without network access, an API key or quota. Understands batch prompts too.
+    """
+
+    def __init__(self, latency_ms: float = 50):
+        self.latency = latency_ms / 1000
+        self._rules = FastPathClassifier()
+
+    def generate(self, prompt: str) -> str:
+        time.sleep(self.latency)
+        return self._answer(prompt)
+
+    async def generate_async(self, prompt: str) -> str:
+        await asyncio.sleep(self.latency)
+        return self._answer(prompt)
+
+    async def stream_async(self, prompt: str) -> AsyncIterator[str]:
+        answer = await self.generate_async(prompt)
+        for i in range(0, len(answer), 64):
+            yield answer[i:i + 64]
+
+    def _answer(self, prompt: str) -> str:
+        parts = BATCH_SECTION.split(prompt)
+        if len(parts) > 1:
+            # [preamble, id1, email1, id2, email2, ...]
+            return json.dumps([
+                {"email_id": email_id, **self._classify(content)}
+                for email_id, content in zip(parts[1::2], parts[2::2])
+            ])
+        return json.dumps(self._classify(prompt.split("Email Content:", 1)[-1]))
+
+    def _classify(self, content: str) -> Dict:
+        primary = self._rules.best_guess("", content).primary_request
+        return {
+            "primary_request": {
+                "type": primary.request_type,
+                "sub_type": primary.sub_request_type,
+                "confidence_score": primary.confidence_score,
+                "extracted_fields": primary.extracted_fields
+            },
+            "secondary_requests": [],
+            "is_duplicate": False
+        }
+
+
+def create_classifier_backend(kind: str, api_key: str = "", model_name: str = "gemini-2.0-flash",
+                              stub_latency_ms: float = 50) -> ClassifierBackend:
+    """Build a backend from configuration: 'gemini' or 'stub'"""
+    kind = kind.strip().lower()
+    if kind == "gemini":
+        return GeminiBackend(api_key, model_name)
+    if kind == "stub":
+        return StubBackend(stub_latency_ms)
+    raise ValueError(f"Unknown classifier backend: {kind}")
@@ -0,0 +1,115 @@
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+
+
+class DuplicateStore(ABC):
+    """
+    Set of processed email hashes with O(1) membership checks.
+    Hashes older than retention_seconds are forgotten (0 keeps them forever).
+    """
+
+    def __init__(self, retention_seconds: float = 0):
+        self.retention_seconds = retention_seconds
+
+    @abstractmethod
+    def __contains__(self, email_hash: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def add(self, email_hash: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def _cutoff(self) -> float:
+        return time.time() - self.retention_seconds if self.retention_seconds else 0.0
+
+
+class MemoryDuplicateStore(DuplicateStore):
+    """Process-local store; lost on restart and not shared between workers"""
+
+    def __init__(self, retention_seconds: float = 0):
+        super().__init__(retention_seconds)
+        # Insertion-ordered, so expired hashes are always at the front
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, email_hash: str) -> bool:
+        with self._lock:
+            self._expire()
+            return email_hash in self._seen
+
+    def add(self, email_hash: str):
+        with self._lock:
+            self._seen[email_hash] = time.time()
+            self._seen.move_to_end(email_hash)
+            self._expire()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._expire()
+            return len(self._seen)
+
+    def _expire(self):
+        cutoff = self._cutoff()
+        while self._seen and next(iter(self._seen.values())) < cutoff:
+            self._seen.popitem(last=False)
+
+
+class SqliteDuplicateStore(DuplicateStore):
+    """Durable store in a local sqlite file; survives restarts and is shared by all workers on the host"""
+
+    # Expired rows are deleted every this many inserts rather than on each one
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str, retention_seconds: float = 0):
+        super().__init__(retention_seconds)
+        self._lock = threading.Lock()
+        self._inserts = 0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS processed_hashes (hash TEXT PRIMARY KEY, seen_at REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS processed_hashes_seen_at ON processed_hashes(seen_at)")
+        self._db.commit()
+
+    def __contains__(self, email_hash: str) -> bool:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM processed_hashes WHERE hash = ? AND seen_at >= ?", (email_hash, self._cutoff())
+            ).fetchone()
+        return row is not None
+
+    def add(self, email_hash: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO processed_hashes (hash, seen_at) VALUES (?, ?)", (email_hash, time.time())
+            )
+            self._inserts += 1
+            if self.retention_seconds and self._inserts % self.PURGE_EVERY == 0:
+                self._db.execute("DELETE FROM processed_hashes WHERE seen_at < ?", (self._cutoff(),))
+            self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM processed_hashes WHERE seen_at >= ?", (self._cutoff(),)
+            ).fetchone()[0]
+
+
+def create_duplicate_store(kind: str, path: str = "", retention_seconds: float = 0) -> DuplicateStore:
+    """Build a duplicate store from configuration: 'memory' or 'sqlite'"""
+    kind = kind.strip().lower()
+    if kind == "memory":
+        return MemoryDuplicateStore(retention_seconds)
+    if kind == "sqlite":
+        if not path:
+            raise ValueError("A sqlite duplicate store needs a file path")
+        return SqliteDuplicateStore(path, retention_seconds)
+    raise ValueError(f"Unknown duplicate store: {kind}")
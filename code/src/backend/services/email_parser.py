@@ -1,24 +1,30 @@
 import email
+import io
 from email import policy
-import tempfile
-from typing import Dict, List
+from typing import Dict
 import extract_msg  # New import for MSG support
-from pathlib import Path
 from ..preprocessing.text_cleaning import EmailCleaner
 
 
+def msg_attachment_data(attachment) -> bytes:
+    """Raw bytes of an Outlook MSG attachment"""
+    if hasattr(attachment, 'data'):
+        return attachment.data
+    return attachment._getStream('__substg1.0_37010102')
+
+
 class EmailParser:
     @staticmethod
-    def parse_eml(file_path: str) -> Dict:
+    def parse_eml(data: bytes) -> Dict:
         """Parse EML format emails"""
-        with open(file_path, 'rb') as f:
-            msg = email.message_from_binary_file(f, policy=policy.default)
+        msg = email.message_from_bytes(data, policy=policy.default)
         return EmailParser._parse_email_message(msg)
 
     @staticmethod
-    def parse_msg(file_path: str) -> Dict:
+    def parse_msg(data: bytes) -> Dict:
         """Parse Outlook MSG format emails"""
-        msg = extract_msg.Message(file_path)
+        # Always a file object: given bytes, olefile treats short input as a path to open
+        msg = extract_msg.Message(io.BytesIO(data))
         result = {
             'headers': {
                 'subject': msg.subject or "",
@@ -31,18 +37,13 @@ class EmailParser:
             'attachments': []
         }
 
-        # Process MSG attachments
+        # Process MSG attachments; payloads stay in memory
         for attachment in msg.attachments:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=Path(attachment.longFilename).suffix) as tmp:
-                if hasattr(attachment, 'data'):
-                    tmp.write(attachment.data)
-                else:
-                    tmp.write(attachment._getStream('__substg1.0_37010102'))
-                result['attachments'].append({
-                    'filename': attachment.longFilename,
-                    'path': tmp.name,
-                    'content_type': attachment.type or "application/octet-stream"
-                })
+            result['attachments'].append({
+                'filename': attachment.longFilename,
+                'data': msg_attachment_data(attachment),
+                'content_type': attachment.type or "application/octet-stream"
+            })
 
         msg.close()
         return result
@@ -73,23 +74,21 @@ class EmailParser:
                 except Exception:
                     continue
             elif part.get_filename():
-                with tempfile.NamedTemporaryFile(delete=False, suffix=Path(part.get_filename()).suffix) as tmp:
-                    tmp.write(part.get_payload(decode=True))
-                    result['attachments'].append({
-                        'filename': part.get_filename(),
-                        'path': tmp.name,
-                        'content_type': part.get_content_type()
-                    })
+                result['attachments'].append({
+                    'filename': part.get_filename(),
+                    'data': part.get_payload(decode=True) or b"",
+                    'content_type': part.get_content_type()
+                })
 
         return result
 
     @staticmethod
-    def parse_email(file_path: str) -> Dict:
+    def parse_email(filename: str, data: bytes) -> Dict:
         """Main entry point that detects and routes to appropriate parser"""
-        if file_path.lower().endswith('.msg'):
-            result =  EmailParser.parse_msg(file_path)
+        if filename.lower().endswith('.msg'):
+            result = EmailParser.parse_msg(data)
         else:  # Default to EML parser
-            result = EmailParser.parse_eml(file_path)
+            result = EmailParser.parse_eml(data)
 
         # Clean email content before returning it
         cleaner = EmailCleaner()
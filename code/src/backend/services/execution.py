@@ -0,0 +1,39 @@
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class ExecutionLayer:
+    """
+    Keeps blocking work off the asyncio event loop.
+
+    - io_executor: thread pool for parsing, attachment reading and other blocking I/O
+    - cpu_executor: process pool for OCR and PDF rasterization (thread pool if processes are disabled)
+    """
+
+    def __init__(self, io_workers: int, cpu_workers: int, use_processes: bool = True):
+        self.io_executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="io")
+        if use_processes:
+            # spawn avoids forking a parent that already runs gRPC/uvicorn threads
+            self.cpu_executor: Executor = ProcessPoolExecutor(
+                max_workers=cpu_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            self.cpu_executor = ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix="cpu")
+
+    async def run_io(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking call in the I/O thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.io_executor, functools.partial(func, *args, **kwargs))
+
+    async def run_cpu(self, func: Callable, *args) -> Any:
+        """Run a CPU-bound call (must be a picklable module-level function) in the CPU pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.cpu_executor, func, *args)
+
+    def shutdown(self):
+        self.io_executor.shutdown(wait=False, cancel_futures=True)
+        self.cpu_executor.shutdown(wait=False, cancel_futures=True)
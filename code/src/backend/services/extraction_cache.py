@@ -0,0 +1,141 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+# Bump whenever AttachmentProcessor output changes so stale cached text is never served
+EXTRACTOR_VERSION = "3"
+
+
+def hash_bytes(data: bytes) -> str:
+    """SHA-256 of an in-memory payload"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ExtractionCache:
+    """
+    Content-addressed cache for extracted attachment text.
+
+    Keys are the SHA-256 of the attachment bytes plus the file type and EXTRACTOR_VERSION,
+    so the same rate sheet or notice arriving on many emails is only parsed/OCR'd once.
+    Lookups go through an in-memory LRU first and then an optional sqlite file holding
+    zlib-compressed text, which is evicted least-recently-used once it exceeds disk_max_bytes.
+    """
+
+    def __init__(self, max_entries: int = 512, disk_path: Optional[str] = None,
+                 disk_max_bytes: int = 512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        self._db = None
+        if disk_path:
+            Path(disk_path).parent.mkdir(parents=True, exist_ok=True)
+            # Shared by the I/O threads (guarded by _lock) and safe for several worker processes
+            self._db = sqlite3.connect(disk_path, check_same_thread=False, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS extractions ("
+                "key TEXT PRIMARY KEY, text BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS extractions_last_access ON extractions(last_access)")
+            # Running byte total kept by triggers, so it stays right with several processes writing
+            # and a put does not have to SUM the whole table
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS extractions_total (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)"
+            )
+            self._db.execute(
+                "INSERT OR IGNORE INTO extractions_total (id, bytes) SELECT 0, COALESCE(SUM(size), 0) FROM extractions"
+            )
+            self._db.execute(
+                "CREATE TRIGGER IF NOT EXISTS extractions_insert AFTER INSERT ON extractions"
+                " BEGIN UPDATE extractions_total SET bytes = bytes + NEW.size WHERE id = 0; END"
+            )
+            self._db.execute(
+                "CREATE TRIGGER IF NOT EXISTS extractions_update AFTER UPDATE OF size ON extractions"
+                " BEGIN UPDATE extractions_total SET bytes = bytes + NEW.size - OLD.size WHERE id = 0; END"
+            )
+            self._db.execute(
+                "CREATE TRIGGER IF NOT EXISTS extractions_delete AFTER DELETE ON extractions"
+                " BEGIN UPDATE extractions_total SET bytes = bytes - OLD.size WHERE id = 0; END"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(content_hash: str, file_ext: str) -> str:
+        return f"{content_hash}:{file_ext}:{EXTRACTOR_VERSION}"
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT text FROM extractions WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE extractions SET last_access = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                    text = zlib.decompress(row[0]).decode('utf-8')
+                    self._remember(key, text)
+                    self._stats["disk_hits"] += 1
+                    return text
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, text: str):
+        with self._lock:
+            self._remember(key, text)
+            if self._db is not None:
+                blob = zlib.compress(text.encode('utf-8'))
+                # An upsert rather than INSERT OR REPLACE: REPLACE does not fire the delete trigger
+                self._db.execute(
+                    "INSERT INTO extractions (key, text, size, last_access) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(key) DO UPDATE SET text = excluded.text, size = excluded.size,"
+                    " last_access = excluded.last_access",
+                    (key, blob, len(blob), time.time())
+                )
+                self._evict_disk()
+                self._db.commit()
+
+    def _remember(self, key: str, text: str):
+        self._memory[key] = text
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        total = self._disk_bytes()
+        while total > self.disk_max_bytes:
+            # Least recently used first, a batch at a time rather than reading every row
+            rows = self._db.execute("SELECT key, size FROM extractions ORDER BY last_access LIMIT 32").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._db.execute("DELETE FROM extractions WHERE key = ?", (key,))
+                self._stats["evictions"] += 1
+                total -= size
+                if total <= self.disk_max_bytes:
+                    break
+
+    def _disk_bytes(self) -> int:
+        return self._db.execute("SELECT bytes FROM extractions_total WHERE id = 0").fetchone()[0]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            if self._db is not None:
+                stats["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+                stats["disk_bytes"] = self._disk_bytes()
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,116 @@
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from .field_extraction_rules import FIELD_EXTRACTION_RULES, RULE_ENGINE
+from .rule_engine import iter_scan_segments
+from ..models.extracted_data import ExtractedData
+from ..models.multi_request_data import MultiRequestData
+from ..models.request_type_mapping import REQUEST_PRIORITY, REQUEST_TYPES
+
+
+def _words(name: str) -> List[str]:
+    return [w for w in re.split(r"[^a-z]+", name.lower()) if len(w) > 2]
+
+
+class FastPathClassifier:
+    """
+    Deterministic first-stage classifier for templated emails.
+
+    Each request type is scored from two kinds of evidence, both weighted by how
+    specific they are (1 / number of request types sharing them):
+      - words of its name and sub-types in the subject or body (from REQUEST_TYPES)
+      - body patterns from FIELD_EXTRACTION_RULES that match, so a template-specific rule
+        such as "Your share of the USD ... payment is USD ..." counts fully while a generic
+        account-number pattern shared by several types counts little
+    Confidence is the best type's share of the two best scores. Emails with too little
+    evidence or an ambiguous best type return None and go to the LLM.
+    """
+
+    def __init__(self, threshold: float = 0.75, min_score: float = 2.0):
+        self.threshold = threshold
+        self.min_score = min_score
+
+        self._vocabulary = {
+            request_type: set(_words(request_type)) | {w for sub in subs for w in _words(sub)}
+            for request_type, subs in REQUEST_TYPES.items()
+        }
+        word_counts = Counter(w for words in self._vocabulary.values() for w in words)
+        self._word_weights = {w: 1 / n for w, n in word_counts.items()}
+        self._word_pattern = re.compile(r"\b(?:" + "|".join(sorted(word_counts)) + r")\b", re.IGNORECASE)
+
+        # Body patterns per request type, weighted by how many types share the same pattern
+        self._patterns = {
+            request_type: {p for patterns in rules.get("sources", {}).get("body", {}).values() for p in patterns}
+            for request_type, rules in FIELD_EXTRACTION_RULES.items()
+        }
+        pattern_counts = Counter(p for patterns in self._patterns.values() for p in patterns)
+        self._compiled = {p: re.compile(p) for p in pattern_counts}
+        self._pattern_weights = {p: 1 / n for p, n in pattern_counts.items()}
+
+        self._lock = threading.Lock()
+        self._stats = {"attempts": 0, "hits": 0}
+        self._hits_by_type: Counter = Counter()
+
+    def classify(self, subject: str, body: str) -> Optional[MultiRequestData]:
+        """Return a result when confident enough, otherwise None"""
+        best_type, best, confidence = self._rank(subject, body)
+        hit = best >= self.min_score and confidence >= self.threshold
+        with self._lock:
+            self._stats["attempts"] += 1
+            if hit:
+                self._stats["hits"] += 1
+                self._hits_by_type[best_type] += 1
+        return self._result(best_type, confidence, subject, body) if hit else None
+
+    def best_guess(self, subject: str, body: str) -> MultiRequestData:
+        """Highest scoring type regardless of confidence, for degraded mode when the LLM is unavailable"""
+        best_type, best, confidence = self._rank(subject, body)
+        return self._result(best_type if best else "Unknown", confidence, subject, body)
+
+    def _rank(self, subject: str, body: str) -> Tuple[str, float, float]:
+        ranked = sorted(self.score(subject, body).items(), key=lambda item: -item[1])
+        best_type, best = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        confidence = best / (best + runner_up) if best else 0.0
+        return best_type, best, confidence
+
+    def _result(self, request_type: str, confidence: float, subject: str, body: str) -> MultiRequestData:
+        fields = RULE_ENGINE.extract(body, [request_type])[request_type]
+        primary = ExtractedData.from_llm_response({
+            "type": request_type,
+            "sub_type": self._sub_type(request_type, f"{subject}\n{body}"),
+            "confidence_score": round(confidence, 3),
+            "extracted_fields": fields
+        }, REQUEST_PRIORITY)
+        return MultiRequestData(primary_request=primary)
+
+    def score(self, subject: str, body: str) -> Dict[str, float]:
+        text = f"{subject}\n{body}"
+        present = {w.lower() for w in self._word_pattern.findall(text)}
+        # Same bounded segments as field extraction, so lazy patterns stay linear on long bodies
+        windows = [segment for _, segment, _ in iter_scan_segments(body)]
+        matched = {p for p, compiled in self._compiled.items() if any(compiled.search(w) for w in windows)}
+        scores = {}
+        for request_type in REQUEST_TYPES:
+            score = sum(self._word_weights[w] for w in self._vocabulary[request_type] & present)
+            score += sum(self._pattern_weights[p] for p in self._patterns.get(request_type, set()) & matched)
+            scores[request_type] = score
+        return scores
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["hits_by_type"] = dict(self._hits_by_type)
+        stats["hit_rate"] = stats["hits"] / stats["attempts"] if stats["attempts"] else 0.0
+        return stats
+
+    def _sub_type(self, request_type: str, text: str) -> Optional[str]:
+        """The most specific sub-type whose words all appear in the text"""
+        lowered = text.lower()
+        candidates = [
+            sub for sub in REQUEST_TYPES.get(request_type, [])
+            if all(re.search(rf"\b{w}", lowered) for w in _words(sub))
+        ]
+        return max(candidates, key=lambda sub: len(_words(sub)), default=None)
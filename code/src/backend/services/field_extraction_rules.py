@@ -1,6 +1,11 @@
-from typing import Dict, List, Optional
+import io
+import numbers
 import re
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Dict, List, Optional
 import pandas as pd
+from .rule_engine import RuleEngine
 
 FIELD_EXTRACTION_RULES = {
     "Money Movement - Inbound": {
@@ -181,6 +186,12 @@ FIELD_EXTRACTION_RULES = {
     }
 }
 
+# Compiled once at import; shared by every FieldExtractor
+RULE_ENGINE = RuleEngine(FIELD_EXTRACTION_RULES)
+
+# First amount in a text cell of an Excel amount column
+EXCEL_AMOUNT = re.compile(r'([\d,]*\d\.\d{2})')
+
 
 class FieldExtractor:
     def __init__(self, request_type: str):
@@ -189,64 +200,39 @@ class FieldExtractor:
 
     def extract_from_text(self, text: str) -> Dict[str, List[str]]:
         """Extract fields from email body text"""
-        results = {}
-        if not text or not self.rules.get("sources", {}).get("body"):
-            return results
+        return RULE_ENGINE.extract(text, [self.request_type])[self.request_type]
 
-        for field, patterns in self.rules["sources"]["body"].items():
-            if isinstance(patterns, list):
-                for pattern in patterns:
-                    matches = re.findall(pattern, text)
-                    if matches:
-                        # Handle multiple capture groups
-                        if matches and isinstance(matches[0], tuple):
-                            # For patterns with multiple groups, flatten the results
-                            flat_matches = [item for match in matches for item in match if item]
-                            if flat_matches:
-                                results.setdefault(field, []).extend(flat_matches)
-                        else:
-                            results.setdefault(field, []).extend(matches)
-        return results
-
-    def extract_from_attachment(self, file_path: str, text_content: str) -> Dict[str, List[str]]:
-        """Extract fields from attachment content"""
+    def extract_from_attachment(self, filename: str, text_content: str, data: Optional[bytes] = None) -> Dict[str, List[str]]:
+        """
+        Extract fields from attachment content. filename only picks the rules by its extension;
+        Excel columns are read from data, the attachment's bytes (skipped when not given).
+        """
         results = {}
         if not text_content or not self.rules.get("sources", {}).get("attachments"):
             return results
 
-        file_ext = file_path.split('.')[-1].lower()
+        file_ext = filename.split('.')[-1].lower()
 
         if file_ext == 'pdf':
-            for field, patterns in self.rules["sources"]["attachments"].get("pdf", {}).items():
-                for pattern in patterns:
-                    matches = re.findall(pattern, text_content)
-                    if matches:
-                        if matches and isinstance(matches[0], tuple):
-                            flat_matches = [item for match in matches for item in match if item]
-                            if flat_matches:
-                                results.setdefault(field, []).extend(flat_matches)
-                        else:
-                            results.setdefault(field, []).extend(matches)
+            results = RULE_ENGINE.extract(text_content, [self.request_type], source="pdf")[self.request_type]
 
-        elif file_ext in ['xls', 'xlsx']:
+        elif file_ext in ['xls', 'xlsx'] and data is not None:
             try:
-                df = pd.read_excel(file_path)
+                df = pd.read_excel(io.BytesIO(data))
                 excel_rules = self.rules["sources"]["attachments"].get("excel", {})
 
                 # Extract amounts from specified columns
                 for amount_col in excel_rules.get("amount_columns", []):
                     if amount_col in df.columns:
-                        amounts = df[amount_col].dropna()
-                        if not amounts.empty:
-                            # Convert to string and clean
-                            amounts = amounts.astype(str).str.extract(r'(\d+\.\d{2})')[0].dropna().tolist()
-                            if amounts:
-                                results.setdefault("amount", []).extend(amounts)
+                        amounts = [format_excel_amount(value) for value in df[amount_col].dropna()]
+                        amounts = [amount for amount in amounts if amount]
+                        if amounts:
+                            results.setdefault("amount", []).extend(amounts)
 
                 # Extract dates from specified columns
                 for date_col in excel_rules.get("date_columns", []):
                     if date_col in df.columns:
-                        dates = df[date_col].dropna().astype(str).tolist()
+                        dates = [format_excel_date(value) for value in df[date_col].dropna()]
                         if dates:
                             results.setdefault("effective_date", []).extend(dates)
 
@@ -265,4 +251,53 @@ class FieldExtractor:
 
     def get_priority_fields(self) -> List[str]:
         """Get the priority fields for this request type"""
-        return self.rules.get("priority_fields", [])
\ No newline at end of file
+        return self.rules.get("priority_fields", [])
+
+
+def format_excel_amount(value) -> Optional[str]:
+    """An amount cell as the body rules would capture it: numbers to two decimals, text as its first amount"""
+    if isinstance(value, numbers.Number) and not isinstance(value, bool):
+        return f"{value:.2f}"
+    match = EXCEL_AMOUNT.search(str(value))
+    return match.group(1) if match else None
+
+
+def format_excel_date(value) -> str:
+    """A date cell in the MM/DD/YYYY form the body rules capture; other cells as text"""
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%m/%d/%Y")
+    return str(value)
+
+
+# Attachment file extensions and the FIELD_EXTRACTION_RULES attachment source they are read with
+ATTACHMENT_RULE_SOURCES = {'pdf': 'pdf', 'xls': 'excel', 'xlsx': 'excel'}
+
+
+def attachment_has_rules(request_type: str, filename: str) -> bool:
+    """Whether field extraction for request_type reads anything from an attachment like filename"""
+    source = ATTACHMENT_RULE_SOURCES.get(filename.split('.')[-1].lower())
+    attachment_rules = FIELD_EXTRACTION_RULES.get(request_type, {}).get("sources", {}).get("attachments", {})
+    return source is not None and source in attachment_rules
+
+
+@lru_cache(maxsize=None)
+def get_field_extractor(request_type: str) -> FieldExtractor:
+    """Return the shared FieldExtractor for a request type (extractors are stateless)"""
+    return FieldExtractor(request_type)
+
+
+def extract_fields_for_types(request_types: List[str], text: str, filename: Optional[str] = None,
+                             data: Optional[bytes] = None) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Extract fields for several request types at once, scanning the text a single time per
+    distinct pattern. Pass the attachment's filename (and its bytes, for Excel) for attachment
+    text; omit them for the email body.
+    """
+    if filename is None:
+        return RULE_ENGINE.extract(text, request_types)
+    if filename.split('.')[-1].lower() == 'pdf':
+        return RULE_ENGINE.extract(text, request_types, source="pdf")
+    return {
+        request_type: get_field_extractor(request_type).extract_from_attachment(filename, text, data)
+        for request_type in request_types
+    }
@@ -0,0 +1,170 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+class JobQueue:
+    """
+    Durable queue of uploaded emails for asynchronous processing, in a local sqlite file
+    shared by the API and the worker processes on the host.
+
+    A worker claims a job with a lease of visibility_timeout seconds and renews it while
+    working. If the worker crashes, the lease runs out and the job becomes claimable again,
+    up to max_attempts claims in total; after that it is marked failed. Finished jobs keep
+    their result (the upload itself is dropped) for retention_seconds (0 keeps them forever).
+    """
+
+    def __init__(self, path: str, visibility_timeout: float = 300, max_attempts: int = 3,
+                 retention_seconds: float = 7 * 24 * 3600):
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode; claims use explicit BEGIN IMMEDIATE transactions
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, filename TEXT NOT NULL, data BLOB, callback_url TEXT,"
+            " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, worker TEXT,"
+            " visible_at REAL NOT NULL, result TEXT, error TEXT,"
+            " created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_claimable ON jobs(status, visible_at)")
+
+    def submit(self, filename: str, data: bytes, callback_url: Optional[str] = None) -> str:
+        """Queue an upload and return its job id"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, filename, data, callback_url, status, visible_at, created_at)"
+                " VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, filename, data, callback_url, now, now)
+            )
+        return job_id
+
+    def claim(self, worker: str) -> Optional[Dict]:
+        """
+        Lease the oldest claimable job: queued, or running with an expired lease (its worker died).
+        Returns {'id', 'filename', 'data', 'callback_url', 'attempts'} or None when there is nothing to do.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # Abandoned jobs that used up their attempts are not retried again
+                self._db.execute(
+                    "UPDATE jobs SET status = 'failed', data = NULL, finished_at = ?,"
+                    " error = 'Abandoned by its worker ' || attempts || ' times (crash or timeout)'"
+                    " WHERE status = 'running' AND visible_at <= ? AND attempts >= ?",
+                    (now, now, self.max_attempts)
+                )
+                row = self._db.execute(
+                    "SELECT id, filename, data, callback_url, attempts FROM jobs"
+                    " WHERE status IN ('queued', 'running') AND visible_at <= ?"
+                    " ORDER BY created_at LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1,"
+                        " visible_at = ?, started_at = ? WHERE id = ?",
+                        (worker, now + self.visibility_timeout, now, row["id"])
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job = dict(row)
+        job["attempts"] += 1
+        return job
+
+    def extend(self, job_id: str, worker: str) -> bool:
+        """Renew the lease on a job this worker holds; False if it was lost to another worker"""
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET visible_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + self.visibility_timeout, job_id, worker)
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker: str, result: Dict) -> bool:
+        """Store the result; ignored (False) if the lease was lost and another worker took over"""
+        return self._finish(job_id, worker, "done", json.dumps(result), None)
+
+    def fail(self, job_id: str, worker: str, error: str, retry_after: float = 0, final: bool = False) -> Optional[str]:
+        """
+        Record a failed attempt. The job is queued again after retry_after seconds while attempts
+        remain (and the error is not final), otherwise marked failed; returns the new status
+        (None if the lease was lost).
+        """
+        if not final:
+            with self._lock:
+                cursor = self._db.execute(
+                    "UPDATE jobs SET status = 'queued', worker = NULL, error = ?, visible_at = ?"
+                    " WHERE id = ? AND worker = ? AND status = 'running' AND attempts < ?",
+                    (error, time.time() + retry_after, job_id, worker, self.max_attempts)
+                )
+            if cursor.rowcount == 1:
+                return "queued"
+        return "failed" if self._finish(job_id, worker, "failed", None, error) else None
+
+    def release(self, job_id: str, worker: str, delay: float = 0) -> bool:
+        """Put a claimed job back without counting the attempt, e.g. when the worker is overloaded"""
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, attempts = attempts - 1, visible_at = ?"
+                " WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + delay, job_id, worker)
+            )
+        return cursor.rowcount == 1
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Public view of a job: status, attempts, timestamps and the result or error once finished"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, filename, status, attempts, result, error, created_at, started_at, finished_at"
+                " FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def purge(self) -> int:
+        """Delete finished jobs older than the retention period; returns how many were removed"""
+        if not self.retention_seconds:
+            return 0
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (time.time() - self.retention_seconds,)
+            )
+        return cursor.rowcount
+
+    def stats(self) -> Dict:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        stats = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        stats.update({status: count for status, count in rows})
+        return stats
+
+    def _finish(self, job_id: str, worker: str, status: str, result: Optional[str], error: Optional[str]) -> bool:
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, data = NULL, finished_at = ?"
+                " WHERE id = ? AND worker = ? AND status = 'running'",
+                (status, result, error, time.time(), job_id, worker)
+            )
+        return cursor.rowcount == 1
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import os
+import socket
+import time
+import uuid
+from typing import Dict, Iterable, Optional
+
+import requests
+
+from .admission import Overloaded
+from .execution import ExecutionLayer
+from .job_queue import JobQueue
+from .pipeline import EmailPipeline
+from .upload_validation import UploadRejected, check_callback_url
+
+
+class JobWorker:
+    """
+    Pulls jobs from the JobQueue and runs them through the pipeline, up to concurrency at a
+    time. Leases are renewed while a job runs, so only a crashed or hung worker loses its jobs.
+    When a job finishes (or finally fails) its callback URL, if any, receives the outcome.
+    """
+
+    # Finished jobs past their retention are deleted at most this often
+    PURGE_INTERVAL = 600
+
+    def __init__(self, pipeline: EmailPipeline, queue: JobQueue, execution: ExecutionLayer, concurrency: int = 4,
+                 poll_interval: float = 1.0, retry_delay: float = 30, webhook_timeout: float = 10,
+                 webhook_allowed_hosts: Iterable[str] = ()):
+        self.pipeline = pipeline
+        self.queue = queue
+        self.execution = execution
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self.webhook_timeout = webhook_timeout
+        self.webhook_allowed_hosts = list(webhook_allowed_hosts)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._last_purge = 0.0
+
+    async def run(self, stop: Optional[asyncio.Event] = None):
+        """Process jobs until stop is set, then let the running ones finish"""
+        stop = stop or asyncio.Event()
+        slots = asyncio.Semaphore(self.concurrency)
+        running = set()
+        while not stop.is_set():
+            await slots.acquire()
+            job = await self.execution.run_io(self.queue.claim, self.worker_id)
+            if job is None:
+                slots.release()
+                await self._purge_if_due()
+                try:
+                    await asyncio.wait_for(stop.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task = asyncio.ensure_future(self._run_job(job))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            task.add_done_callback(lambda _: slots.release())
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+    async def _run_job(self, job: Dict):
+        lease = asyncio.ensure_future(self._keep_leased(job["id"]))
+        try:
+            result = await self.pipeline.process_bytes(job["filename"], job["data"])
+        except Overloaded as e:
+            if e.status_code != 413:
+                # Shed by admission control: try again later without using up an attempt
+                await self.execution.run_io(self.queue.release, job["id"], self.worker_id, e.retry_after)
+                return
+            # Too large to ever fit the memory budget: retrying cannot help
+            status = await self.execution.run_io(self.queue.fail, job["id"], self.worker_id, e.detail, final=True)
+            if status == "failed":
+                await self._notify(job, {"job_id": job["id"], "status": "failed", "error": e.detail})
+            return
+        except Exception as e:
+            print(f"Job {job['id']} failed on attempt {job['attempts']}: {str(e)}")
+            status = await self.execution.run_io(self.queue.fail, job["id"], self.worker_id, str(e), self.retry_delay)
+            if status == "failed":
+                await self._notify(job, {"job_id": job["id"], "status": "failed", "error": str(e)})
+            return
+        finally:
+            lease.cancel()
+
+        if await self.execution.run_io(self.queue.complete, job["id"], self.worker_id, result):
+            await self._notify(job, {"job_id": job["id"], "status": "done", "result": result})
+
+    async def _keep_leased(self, job_id: str):
+        # Renew well before the lease runs out
+        while True:
+            await asyncio.sleep(self.queue.visibility_timeout / 3)
+            if not await self.execution.run_io(self.queue.extend, job_id, self.worker_id):
+                print(f"Lost the lease on job {job_id}")
+                return
+
+    async def _notify(self, job: Dict, payload: Dict):
+        """POST the outcome to the job's callback URL; a few attempts, then give up (GET /jobs/{id} still works)"""
+        if not job.get("callback_url"):
+            return
+        # Checked again here: the allowlist may have changed since the job was submitted
+        try:
+            check_callback_url(job["callback_url"], self.webhook_allowed_hosts)
+        except UploadRejected as e:
+            print(f"Webhook for job {job['id']} skipped: {e.detail}")
+            return
+        body = json.dumps(payload)
+        for attempt in range(3):
+            try:
+                response = await self.execution.run_io(
+                    requests.post, job["callback_url"], data=body,
+                    headers={"Content-Type": "application/json"}, timeout=self.webhook_timeout,
+                    allow_redirects=False
+                )
+                if response.status_code < 500:
+                    return
+                error = f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                error = str(e)
+            await asyncio.sleep(2 ** attempt)
+        print(f"Webhook for job {job['id']} failed: {error}")
+
+    async def _purge_if_due(self):
+        if time.monotonic() - self._last_purge >= self.PURGE_INTERVAL:
+            self._last_purge = time.monotonic()
+            await self.execution.run_io(self.queue.purge)
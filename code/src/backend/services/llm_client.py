@@ -0,0 +1,195 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class LLMUnavailable(Exception):
+    """The model could not be reached: every retry failed, or the circuit breaker is open"""
+
+
+class TokenBucket:
+    """Request-rate limiter: refills rate_per_second tokens per second up to burst"""
+
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate = rate_per_second
+        self.capacity = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls for reset_seconds.
+    Then a single trial call is let through (half-open): success closes the circuit again,
+    failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self.trips += 1
+            self._trial_in_flight = False
+
+    def release(self):
+        """An allowed call ended without an outcome (cancelled): free the half-open trial for the next caller"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+
+class ResilientLLMClient:
+    """
+    Wraps async model calls with the protections a shared quota needs:
+    - a global semaphore capping concurrent calls
+    - a token bucket matching the requests-per-minute quota
+    - a per-attempt timeout and jittered exponential backoff between retries
+    - optional hedging: if an attempt is still running after hedge_after seconds, a second
+      identical attempt is started and whichever finishes first wins
+    - a circuit breaker that fails fast during sustained outages instead of queueing behind timeouts
+    Both exhausted retries and an open circuit raise LLMUnavailable, so callers can switch to a
+    degraded mode.
+    """
+
+    def __init__(self, max_concurrency: int = 16, requests_per_minute: float = 1000, burst: Optional[int] = None,
+                 timeout: float = 30, max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8,
+                 hedge_after: Optional[float] = None, breaker: Optional[CircuitBreaker] = None):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after or None
+        self.breaker = breaker or CircuitBreaker()
+        self._max_concurrency = max_concurrency
+        self._rate = requests_per_minute / 60
+        self._burst = burst or max_concurrency
+        # Created lazily: asyncio primitives must belong to the loop that uses them
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._bucket: Optional[TokenBucket] = None
+        self._stats = {"calls": 0, "attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0,
+                       "timeouts": 0, "failures": 0, "rejected": 0}
+
+    async def call(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Call func(*args, **kwargs) with rate limiting, retries, hedging and the circuit breaker"""
+        self._stats["calls"] += 1
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                self._stats["rejected"] += 1
+                raise LLMUnavailable(f"Model calls suspended after repeated failures: {last_error}")
+            if attempt:
+                self._stats["retries"] += 1
+            try:
+                result = await self._hedged(func, args, kwargs)
+            except Exception as e:
+                last_error = e
+                self._stats["failures"] += 1
+                self.breaker.record_failure()
+                if attempt < self.max_retries:
+                    # Full jitter spreads out retries from requests that failed together
+                    await asyncio.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+                continue
+            except BaseException:
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            return result
+        raise LLMUnavailable(f"Model call failed after {self.max_retries + 1} attempts: {last_error}") from last_error
+
+    def stats(self) -> Dict:
+        stats = dict(self._stats)
+        stats["breaker_state"] = self.breaker.state
+        stats["breaker_trips"] = self.breaker.trips
+        return stats
+
+    async def _hedged(self, func, args, kwargs) -> Any:
+        primary = asyncio.ensure_future(self._attempt(func, args, kwargs))
+        if self.hedge_after is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+        if done:
+            return primary.result()
+
+        self._stats["hedges"] += 1
+        hedge = asyncio.ensure_future(self._attempt(func, args, kwargs))
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _attempt(self, func, args, kwargs) -> Any:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+            self._bucket = TokenBucket(self._rate, self._burst)
+        async with self._semaphore:
+            await self._bucket.acquire()
+            self._stats["attempts"] += 1
+            try:
+                return await asyncio.wait_for(func(*args, **kwargs), self.timeout)
+            except asyncio.TimeoutError:
+                self._stats["timeouts"] += 1
+                raise TimeoutError(f"Model call timed out after {self.timeout}s")
@@ -0,0 +1,216 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Hash family h(x) = (a * x + b) mod p; with p < 2^31 the products fit in uint64
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+class MinHasher:
+    """MinHash signatures over word shingles"""
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        # Fixed seed: signatures must be comparable across processes and restarts
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        tokens = re.findall(r"\w+", text.lower())
+        # Too little content (e.g. "Thanks, approved") to judge similarity meaningfully
+        if len(tokens) < self.shingle_size:
+            return None
+        k = self.shingle_size
+        shingles = {" ".join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode()) for shingle in shingles), dtype=np.uint64, count=len(shingles)
+        ) % MERSENNE_PRIME
+
+        signature = np.full(self.num_perm, MERSENNE_PRIME, dtype=np.uint64)
+        # Chunked so a huge attachment does not allocate a num_perm x n_shingles matrix at once
+        for start in range(0, len(hashes), 4096):
+            chunk = hashes[start:start + 4096]
+            permuted = (np.outer(self._a, chunk) + self._b[:, None]) % MERSENNE_PRIME
+            signature = np.minimum(signature, permuted.min(axis=1))
+        return signature.astype(np.uint32)
+
+
+class MemoryLSHStorage:
+    """LSH buckets and signatures held in process memory; entries older than retention_seconds are dropped (0 keeps them)"""
+
+    def __init__(self, retention_seconds: float = 0):
+        self.retention_seconds = retention_seconds
+        self._buckets: Dict[int, List[str]] = {}
+        # Insertion-ordered, so expired signatures are always at the front
+        self._signatures: "OrderedDict[str, Tuple[np.ndarray, List[int], float]]" = OrderedDict()
+
+    def candidates(self, band_keys: List[int]) -> Dict[str, np.ndarray]:
+        self._expire()
+        found = {}
+        for key in band_keys:
+            for doc_id in self._buckets.get(key, ()):
+                found[doc_id] = self._signatures[doc_id][0]
+        return found
+
+    def insert(self, doc_id: str, band_keys: List[int], signature: np.ndarray):
+        self._expire()
+        if doc_id in self._signatures:
+            return
+        self._signatures[doc_id] = (signature, band_keys, time.time())
+        for key in band_keys:
+            self._buckets.setdefault(key, []).append(doc_id)
+
+    def __len__(self) -> int:
+        self._expire()
+        return len(self._signatures)
+
+    def _expire(self):
+        if not self.retention_seconds:
+            return
+        cutoff = time.time() - self.retention_seconds
+        while self._signatures and next(iter(self._signatures.values()))[2] < cutoff:
+            doc_id, (_, band_keys, _) = self._signatures.popitem(last=False)
+            for key in band_keys:
+                bucket = self._buckets[key]
+                bucket.remove(doc_id)
+                if not bucket:
+                    del self._buckets[key]
+
+
+class SqliteLSHStorage:
+    """
+    LSH buckets and signatures in a local sqlite file, for large histories shared by workers.
+    Entries older than retention_seconds are ignored and periodically deleted (0 keeps them).
+    """
+
+    # Expired rows are deleted every this many inserts rather than on each one
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str, retention_seconds: float = 0):
+        self.retention_seconds = retention_seconds
+        self._inserts = 0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS signatures (doc_id TEXT PRIMARY KEY, signature BLOB NOT NULL,"
+            " added_at REAL NOT NULL DEFAULT 0)"
+        )
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(signatures)")]
+        if "added_at" not in columns:
+            # Index files from before retention: existing entries count as added now
+            self._db.execute("ALTER TABLE signatures ADD COLUMN added_at REAL NOT NULL DEFAULT 0")
+            self._db.execute("UPDATE signatures SET added_at = ?", (time.time(),))
+        self._db.execute("CREATE INDEX IF NOT EXISTS signatures_added_at ON signatures(added_at)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS bands (band_key INTEGER NOT NULL, doc_id TEXT NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS bands_band_key ON bands(band_key)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS bands_doc_id ON bands(doc_id)")
+        self._db.commit()
+
+    def candidates(self, band_keys: List[int]) -> Dict[str, np.ndarray]:
+        placeholders = ",".join("?" * len(band_keys))
+        rows = self._db.execute(
+            f"SELECT DISTINCT s.doc_id, s.signature FROM bands b JOIN signatures s ON s.doc_id = b.doc_id "
+            f"WHERE b.band_key IN ({placeholders}) AND s.added_at >= ?", [*band_keys, self._cutoff()]
+        ).fetchall()
+        return {doc_id: np.frombuffer(blob, dtype=np.uint32) for doc_id, blob in rows}
+
+    def insert(self, doc_id: str, band_keys: List[int], signature: np.ndarray):
+        cursor = self._db.execute(
+            "INSERT OR IGNORE INTO signatures (doc_id, signature, added_at) VALUES (?, ?, ?)",
+            (doc_id, signature.tobytes(), time.time())
+        )
+        if cursor.rowcount:
+            self._db.executemany("INSERT INTO bands (band_key, doc_id) VALUES (?, ?)", [(key, doc_id) for key in band_keys])
+            self._inserts += 1
+            if self.retention_seconds and self._inserts % self.PURGE_EVERY == 0:
+                self._purge()
+        self._db.commit()
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM signatures WHERE added_at >= ?", (self._cutoff(),)).fetchone()[0]
+
+    def _purge(self):
+        cutoff = self._cutoff()
+        self._db.execute("DELETE FROM bands WHERE doc_id IN (SELECT doc_id FROM signatures WHERE added_at < ?)", (cutoff,))
+        self._db.execute("DELETE FROM signatures WHERE added_at < ?", (cutoff,))
+
+    def _cutoff(self) -> float:
+        return time.time() - self.retention_seconds if self.retention_seconds else 0.0
+
+
+class NearDuplicateIndex:
+    """
+    MinHash + LSH banding index of previously processed emails.
+
+    A signature is split into `bands` bands; two emails become candidates when any band
+    matches exactly, so a lookup only touches the few emails sharing a bucket instead of
+    the whole history. Candidates are then scored by the fraction of equal MinHash values,
+    an estimate of the Jaccard similarity of their shingle sets.
+    """
+
+    def __init__(self, storage, hasher: Optional[MinHasher] = None, bands: int = 16, threshold: float = 0.95):
+        self.storage = storage
+        self.hasher = hasher or MinHasher()
+        if self.hasher.num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.bands = bands
+        self.rows = self.hasher.num_perm // bands
+        self.threshold = threshold
+        self._lock = threading.Lock()
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        return self.hasher.signature(text)
+
+    def query(self, signature: np.ndarray) -> Optional[Tuple[str, float]]:
+        """Return (doc_id, similarity) of the most similar indexed email at or above threshold"""
+        with self._lock:
+            candidates = self.storage.candidates(self._band_keys(signature))
+        best = None
+        for doc_id, candidate in candidates.items():
+            similarity = float(np.mean(candidate == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (doc_id, similarity)
+        return best
+
+    def add(self, doc_id: str, signature: np.ndarray):
+        with self._lock:
+            self.storage.insert(doc_id, self._band_keys(signature), signature)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self.storage)
+
+    def _band_keys(self, signature: np.ndarray) -> List[int]:
+        keys = []
+        for band in range(self.bands):
+            band_bytes = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            # Stable across processes (unlike hash()); signed so it fits a sqlite INTEGER
+            digest = hashlib.blake2b(bytes([band]) + band_bytes, digest_size=8).digest()
+            keys.append(int.from_bytes(digest, "big", signed=True))
+        return keys
+
+
+def create_near_duplicate_index(kind: str, path: str = "", bands: int = 16, threshold: float = 0.95,
+                                retention_seconds: float = 0) -> Optional[NearDuplicateIndex]:
+    """Build an index from configuration: 'memory', 'sqlite' or 'none'"""
+    kind = kind.strip().lower()
+    if kind == "memory":
+        return NearDuplicateIndex(MemoryLSHStorage(retention_seconds), bands=bands, threshold=threshold)
+    if kind == "sqlite":
+        if not path:
+            raise ValueError("A sqlite near-duplicate index needs a file path")
+        return NearDuplicateIndex(SqliteLSHStorage(path, retention_seconds), bands=bands, threshold=threshold)
+    if kind in ("", "none"):
+        return None
+    raise ValueError(f"Unknown near-duplicate index: {kind}")
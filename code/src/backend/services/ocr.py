@@ -0,0 +1,36 @@
+"""
+CPU-bound OCR helpers.
+
+These are plain module-level functions so they can be pickled and executed in a
+process pool worker; each call configures Tesseract itself because worker
+processes do not share the parent's pytesseract settings.
+"""
+import io
+from typing import Union
+
+import pytesseract
+from PIL import Image
+from pdf2image import convert_from_path
+
+
+def ocr_image(source: Union[str, bytes], tesseract_cmd: str) -> str:
+    """Run Tesseract on an image given as a file path or as raw bytes"""
+    try:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+        if isinstance(source, bytes):
+            with Image.open(io.BytesIO(source)) as image:
+                return pytesseract.image_to_string(image)
+        return pytesseract.image_to_string(source)
+    except Exception as e:
+        # pytesseract exceptions do not survive pickling and would break the whole pool
+        raise RuntimeError(f"OCR failed: {str(e)}")
+
+
+def ocr_pdf_page(file_path: str, page_number: int, tesseract_cmd: str, dpi: int = 200) -> str:
+    """Rasterize a single PDF page (1-based) and OCR it, so only one bitmap is held at a time"""
+    try:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+        images = convert_from_path(file_path, dpi=dpi, first_page=page_number, last_page=page_number)
+        return "\n".join([pytesseract.image_to_string(img) for img in images])
+    except Exception as e:
+        raise RuntimeError(f"OCR failed on page {page_number}: {str(e)}")
@@ -0,0 +1,472 @@
+import asyncio
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .email_parser import EmailParser
+from .attachment_processor import AttachmentProcessor
+from .admission import MemoryBudget, estimate_memory, ocr_raster_bytes, payload_memory
+from .classification import Classifier
+from .classifier_backends import create_classifier_backend
+from .batching_classifier import BatchingClassifier
+from .fast_path_classifier import FastPathClassifier
+from .llm_client import CircuitBreaker, LLMUnavailable, ResilientLLMClient
+from .field_extraction_rules import attachment_has_rules, extract_fields_for_types
+from .routing import RequestRouter
+from .execution import ExecutionLayer
+from .extraction_cache import ExtractionCache
+from .cache_backends import create_cache_backend
+from .classification_cache import ClassificationCache
+from .dedup_store import DuplicateStore
+from .near_duplicate import create_near_duplicate_index
+from .prompt_builder import PromptBuilder
+from .scheduler import PriorityEstimator, PriorityScheduler
+from .single_flight import SingleFlight
+from ..config import Config
+from ..models.multi_request_data import MultiRequestData
+
+
+class EmailPipeline:
+    """
+    Runs parse -> attachment extraction -> classification -> routing for a single email.
+    Blocking stages are delegated to the execution layer so the event loop stays free.
+    """
+
+    def __init__(self, config: Config, router: RequestRouter, processed_hashes: DuplicateStore,
+                 execution: ExecutionLayer):
+        self.config = config
+        self.router = router
+        self.processed_hashes = processed_hashes
+        self.execution = execution
+
+        # Long-lived components shared by every request; the classifier keeps its
+        # Gemini client (and its pooled connection) for the lifetime of the app
+        self.llm_client = ResilientLLMClient(
+            max_concurrency=config.llm_max_concurrency,
+            requests_per_minute=config.llm_requests_per_minute,
+            timeout=config.llm_timeout,
+            max_retries=config.llm_max_retries,
+            backoff_base=config.llm_backoff_base,
+            backoff_max=config.llm_backoff_max,
+            hedge_after=config.llm_hedge_after,
+            breaker=CircuitBreaker(config.llm_breaker_failures, config.llm_breaker_reset)
+        )
+        backend = create_classifier_backend(
+            config.classifier_backend,
+            api_key=config.gemini_api_key,
+            model_name=config.gemini_model,
+            stub_latency_ms=config.stub_latency_ms
+        )
+        self.classifier = Classifier(backend, self.llm_client)
+        self.fast_path = None
+        if config.fast_path_enabled or config.llm_degraded_mode == "rules":
+            self.fast_path = FastPathClassifier(config.fast_path_threshold, config.fast_path_min_score)
+
+        # Optionally coalesce concurrent classifications into batched model calls
+        self.batcher = None
+        if config.classifier_batching:
+            self.batcher = BatchingClassifier(
+                self.classifier,
+                max_batch_size=config.classifier_batch_size,
+                max_wait_ms=config.classifier_batch_wait_ms,
+                max_batch_tokens=config.classifier_batch_max_tokens
+            )
+        self.prompt_builder = PromptBuilder(
+            max_tokens=config.prompt_token_budget,
+            chunk_tokens=config.prompt_chunk_tokens,
+            max_chunks=config.prompt_max_attachment_chunks,
+            reserved_tokens=self.classifier.instruction_tokens()
+        )
+        self.extraction_cache = ExtractionCache(
+            max_entries=config.extraction_cache_entries,
+            disk_path=config.extraction_cache_path or None,
+            disk_max_bytes=config.extraction_cache_max_bytes
+        )
+        self.processor = AttachmentProcessor(
+            config.tesseract_path,
+            execution,
+            self.extraction_cache,
+            ocr_dpi=config.ocr_dpi,
+            ocr_min_page_chars=config.ocr_min_page_chars,
+            spool_threshold=config.spool_threshold_bytes,
+            ocr_max_concurrent=config.ocr_max_concurrent
+        )
+
+        self.near_duplicates = create_near_duplicate_index(
+            config.near_duplicate_backend,
+            config.near_duplicate_path,
+            config.near_duplicate_bands,
+            config.near_duplicate_threshold,
+            # Forgotten along with the exact-match hashes
+            config.dedup_retention_days * 24 * 3600
+        )
+
+        # Admission into the expensive stages by estimated priority, with aging
+        self.scheduler = None
+        if config.scheduler_max_concurrent > 0:
+            self.priority_estimator = PriorityEstimator(self.fast_path or FastPathClassifier())
+            self.scheduler = PriorityScheduler(
+                config.scheduler_max_concurrent, config.scheduler_aging_seconds, config.scheduler_max_queue
+            )
+        self.memory_budget = None
+        if config.memory_budget_mb > 0:
+            # The OCR slots are shared, so their rasters are set aside once rather than charged per email
+            ocr_rasters = max(config.ocr_max_concurrent, 0) * ocr_raster_bytes(config.ocr_dpi)
+            self.memory_budget = MemoryBudget(
+                int(config.memory_budget_mb * 2 ** 20), config.admission_retry_after, ocr_rasters
+            )
+
+        # Submissions currently being processed, keyed by their raw fingerprints
+        self.in_flight = SingleFlight()
+
+        self.classification_cache = None
+        classification_backend = create_cache_backend(
+            config.classification_cache_backend,
+            config.classification_cache_entries,
+            config.classification_cache_path,
+            table="classifications"
+        )
+        if classification_backend is not None:
+            self.classification_cache = ClassificationCache(classification_backend, config.classification_cache_ttl)
+
+        # Updated from the event loop only
+        self._stats = {
+            "attachments_total": 0, "attachments_extracted": 0,
+            "prompts": 0, "prompt_tokens": 0, "prompt_tokens_max": 0, "prompts_truncated": 0,
+            "dedup_checked": 0, "dedup_raw": 0, "dedup_content": 0, "dedup_similar": 0, "dedup_thread": 0
+        }
+
+    def stats(self) -> Dict:
+        """Runtime metrics for the shared components"""
+        stats = {
+            "extraction_cache": self.extraction_cache.stats(),
+            "dedup_store": {"entries": len(self.processed_hashes)},
+            "single_flight": self.in_flight.stats(),
+            # Duplicates short-circuited at each stage: raw bytes/Message-ID before parsing,
+            # headers+body before attachments, then similarity/thread after
+            "dedup": {
+                "checked": self._stats["dedup_checked"],
+                "raw": self._stats["dedup_raw"],
+                "content": self._stats["dedup_content"],
+                "similar": self._stats["dedup_similar"],
+                "thread": self._stats["dedup_thread"]
+            },
+            "attachments": {
+                "mode": self.config.attachment_extraction_mode,
+                "total": self._stats["attachments_total"],
+                "extracted": self._stats["attachments_extracted"]
+            },
+            "prompts": {
+                "budget": self.prompt_builder.max_tokens,
+                "sent": self._stats["prompts"],
+                "truncated": self._stats["prompts_truncated"],
+                "avg_tokens": self._stats["prompt_tokens"] / self._stats["prompts"] if self._stats["prompts"] else 0.0,
+                "max_tokens": self._stats["prompt_tokens_max"]
+            }
+        }
+        if self.near_duplicates is not None:
+            stats["near_duplicate_index"] = {"entries": len(self.near_duplicates)}
+        if self.classification_cache is not None:
+            stats["classification_cache"] = self.classification_cache.stats()
+        if self.batcher is not None:
+            stats["classifier_batching"] = self.batcher.stats()
+        if self.config.fast_path_enabled:
+            stats["fast_path"] = self.fast_path.stats()
+        if self.scheduler is not None:
+            stats["scheduler"] = self.scheduler.stats()
+        if self.memory_budget is not None:
+            stats["memory_budget"] = self.memory_budget.stats()
+        stats["llm_client"] = self.llm_client.stats()
+        stats["response_parser"] = self.classifier.stats()
+        return stats
+
+    async def process_file(self, file_path: str) -> Dict:
+        """Process an email stored on disk"""
+        data = await self.execution.run_io(Path(file_path).read_bytes)
+        return await self.process_bytes(Path(file_path).name, data)
+
+    async def process_bytes(self, filename: str, data: bytes) -> Dict:
+        """Process an email received as raw bytes and return classification + routing"""
+        raw_keys, raw_match = await self.execution.run_io(self._check_raw, filename, data)
+
+        # The same message is already being processed (relay retries, multi-recipient copies):
+        # share that run's result instead of parsing, OCR'ing and classifying it again
+        running = self.in_flight.find(raw_keys)
+        if running is not None:
+            return dict(await self.in_flight.join(running))
+
+        self._stats["dedup_checked"] += 1
+        # Dedup stage 1: the same upload seen before (identical bytes or Message-ID), checked before parsing
+        if raw_match is not None:
+            self._stats["dedup_raw"] += 1
+            return {
+                "status": "duplicate",
+                "reason": "Identical message already processed (same raw bytes or Message-ID)",
+                "hash": raw_match
+            }
+        return dict(await self.in_flight.run(raw_keys, self._process_new(filename, data, raw_keys)))
+
+    async def _process_new(self, filename: str, data: bytes, raw_keys: List[str]) -> Dict:
+        """Everything after the raw-fingerprint check, for an upload not seen before"""
+        # Parse in memory; attachments travel as bytes rather than temp files
+        email_data = await self.execution.run_io(EmailParser.parse_email, filename, data)
+
+        # Dedup stage 2: same headers and key body content, checked before any attachment is read
+        content_hash, seen = await self.execution.run_io(self._check_content, email_data)
+        if seen:
+            self._stats["dedup_content"] += 1
+            await self.execution.run_io(self._remember, {"hash": content_hash}, raw_keys)
+            return {
+                "status": "duplicate",
+                "reason": "Exact content match (excluding signatures/timestamps)",
+                "hash": content_hash
+            }
+
+        if self.memory_budget is None:
+            return await self._schedule(email_data, raw_keys, 0)
+        # Refuse the email now, before any attachment is read, if it could never fit the memory budget
+        estimate = await self.execution.run_io(
+            estimate_memory, email_data['attachments'], self.config.ocr_dpi, self.config.ocr_max_concurrent
+        )
+        self.memory_budget.check(estimate)
+        # While queued an email only holds its payload; the extraction memory is reserved once it runs
+        payload = payload_memory(email_data['attachments'])
+        with self.memory_budget.reserve(payload):
+            return await self._schedule(email_data, raw_keys, estimate - payload)
+
+    async def _schedule(self, email_data: Dict, raw_keys: List[str], working_memory: int) -> Dict:
+        if self.scheduler is None:
+            return await self._run(email_data, raw_keys, working_memory)
+        # Urgent emails (payments) get through the expensive stages first
+        priority = await self.execution.run_io(
+            self.priority_estimator.estimate, email_data['headers']['subject'], email_data['body']
+        )
+        async with self.scheduler.slot(priority):
+            return await self._run(email_data, raw_keys, working_memory)
+
+    async def _run(self, email_data: Dict, raw_keys: List[str], working_memory: int) -> Dict:
+        if self.memory_budget is None:
+            return await self._process_parsed(email_data, raw_keys)
+        with self.memory_budget.reserve(working_memory):
+            return await self._process_parsed(email_data, raw_keys)
+
+    async def _process_parsed(self, email_data: Dict, raw_keys: List[str]) -> Dict:
+        """Attachment extraction, similarity dedup, classification, field extraction and routing"""
+        staged = self.config.attachment_extraction_mode == "staged"
+        attachments_data = [
+            {
+                'filename': attachment['filename'],
+                'content_type': attachment['content_type'],
+                'text': None
+            }
+            for attachment in email_data['attachments']
+        ]
+        if not staged:
+            await self._extract_attachments(email_data['attachments'], attachments_data)
+        print(f"Parsed headers: {email_data['headers']}")  # Debug print
+        print(email_data['headers']['subject'])
+
+        # Detect duplicates with the new signature. With attachments still unread (staged mode)
+        # there is no similarity check: the cover note alone does not make two emails the same
+        unread = any(a['text'] is None for a in attachments_data)
+        duplicate_info = await self.execution.run_io(
+            self.classifier.detect_duplicates,
+            subject=email_data['headers']['subject'],
+            sender=email_data['headers']['from'],
+            sent_date=email_data['headers']['date'],
+            email_body=email_data['body'],
+            previous_hashes=self.processed_hashes,
+            near_duplicates=self.near_duplicates,
+            attachment_texts=None if staged and unread else [a['text'] for a in attachments_data]
+        )
+
+        if duplicate_info['is_duplicate']:
+            await self.execution.run_io(self._remember, duplicate_info, raw_keys)
+            # Stage 3: similar content, or (without a near-duplicate index) part of a thread
+            self._stats["dedup_similar" if 'similarity' in duplicate_info else "dedup_thread"] += 1
+            response = {
+                "status": "duplicate",
+                "reason": duplicate_info['reason'],
+                "hash": duplicate_info['hash']
+            }
+            if 'similarity' in duplicate_info:
+                response['duplicate_of'] = duplicate_info['duplicate_of']
+                response['similarity'] = duplicate_info['similarity']
+            return response
+
+        # Perform classification, reusing the result for identical content classified recently
+        result, prompt_usage = await self._classify(email_data, attachments_data)
+
+        if staged and attachments_data:
+            # The fast path and the degraded-mode best guess ignore attachments, so reading them
+            # all and classifying again would only reproduce the same answer
+            from_llm = prompt_usage is not None and not prompt_usage.get("degraded")
+            if from_llm and result.primary_request.confidence_score < self.config.attachment_confidence_threshold:
+                # The body alone was not conclusive: read every attachment and classify again
+                await self._extract_attachments(email_data['attachments'], attachments_data)
+                result, prompt_usage = await self._classify(email_data, attachments_data)
+            else:
+                # Only read the attachments field extraction has rules for
+                request_types = [result.primary_request.request_type] + [
+                    req.request_type for req in result.secondary_requests
+                ]
+                needed = [
+                    i for i, a in enumerate(attachments_data)
+                    if any(attachment_has_rules(request_type, a['filename']) for request_type in request_types)
+                ]
+                await self._extract_attachments(email_data['attachments'], attachments_data, needed)
+        self._stats["attachments_total"] += len(attachments_data)
+        self._stats["attachments_extracted"] += sum(a['text'] is not None for a in attachments_data)
+
+        if staged and unread and self.near_duplicates is not None:
+            # Not signed above: index the email on the attachments that were actually read
+            duplicate_info['signature'] = await self.execution.run_io(
+                self.classifier.near_duplicate_signature,
+                email_data['headers']['subject'], email_data['body'], self.near_duplicates,
+                [a['text'] for a in attachments_data]
+            )
+
+        result.raw_content = {
+            'headers': email_data['headers'],
+            'body': email_data['body'],
+            'attachments': attachments_data
+        }
+
+        # Enhanced field extraction
+        await self.execution.run_io(
+            enhance_with_field_extraction, result, email_data['body'], attachments_data,
+            [attachment['data'] for attachment in email_data['attachments']]
+        )
+
+        # Route requests
+        routing_decisions = {
+            "primary": self.router.route_request(result.primary_request),
+            "secondary": [self.router.route_request(req) for req in result.secondary_requests]
+        }
+
+        response = {
+            "classification": result.model_dump(mode="json"),
+            "routing": routing_decisions,
+            "prompt_usage": prompt_usage
+        }
+        if prompt_usage is not None and prompt_usage.get("degraded"):
+            # Classified by rules while the LLM was unavailable; worth re-running later
+            response["degraded"] = True
+        else:
+            # Only a completed classification marks the email as seen: after a failure (or a
+            # degraded answer) resubmitting the same message must run it again
+            await self.execution.run_io(self._remember, duplicate_info, raw_keys)
+        return response
+
+    def _check_raw(self, filename: str, data: bytes) -> Tuple[List[str], Optional[str]]:
+        """Raw fingerprints of an upload and the first one already in the dedup store, if any"""
+        keys = self.classifier.raw_fingerprints(filename, data)
+        return keys, next((key for key in keys if key in self.processed_hashes), None)
+
+    def _check_content(self, email_data: Dict) -> Tuple[str, bool]:
+        """Header+body hash of a parsed email and whether it is already in the dedup store"""
+        headers = email_data['headers']
+        content_hash = self.classifier.compute_hash(headers['subject'], headers['from'], headers['date'], email_data['body'])
+        return content_hash, content_hash in self.processed_hashes
+
+    def _remember(self, duplicate_info: Dict, raw_keys: List[str] = ()):
+        """Record a processed email for exact and near-duplicate detection"""
+        self.processed_hashes.add(duplicate_info['hash'])
+        for key in raw_keys:
+            self.processed_hashes.add(key)
+        if self.near_duplicates is not None and duplicate_info.get('signature') is not None:
+            self.near_duplicates.add(duplicate_info['hash'], duplicate_info['signature'])
+
+    async def _extract_attachments(self, attachments: List[Dict], attachments_data: List[Dict],
+                                   indexes: Optional[List[int]] = None):
+        """Extract the text of the selected attachments (all by default) concurrently into attachments_data"""
+        if indexes is None:
+            indexes = range(len(attachments))
+        indexes = [i for i in indexes if attachments_data[i]['text'] is None]
+        texts = await asyncio.gather(*[
+            self.processor.extract_text_async(attachments[i]['filename'], attachments[i]['data'])
+            for i in indexes
+        ])
+        for i, text in zip(indexes, texts):
+            attachments_data[i]['text'] = text
+
+    async def _classify(self, email_data: Dict, attachments_data: List[Dict]) -> Tuple[MultiRequestData, Optional[Dict]]:
+        """
+        Classify within the prompt token budget; returns the result and the prompt's token usage
+        (None when the rule-based fast path answered without a prompt)
+        """
+        if self.config.fast_path_enabled:
+            result = await self.execution.run_io(
+                self.fast_path.classify, email_data['headers']['subject'], email_data['body']
+            )
+            if result is not None:
+                return result, None
+
+        content_str, usage = await self.execution.run_io(self.prompt_builder.build, email_data, attachments_data)
+
+        result = None
+        fingerprint = None
+        if self.classification_cache is not None:
+            fingerprint = self.classifier.content_fingerprint(
+                email_data['headers']['subject'],
+                email_data['body'],
+                [a['text'] for a in attachments_data]
+            )
+            result = await self.execution.run_io(self.classification_cache.get, fingerprint)
+
+        usage["cached"] = result is not None
+        if result is None:
+            llm = self.batcher if self.batcher is not None else self.classifier
+            try:
+                result = await llm.classify_async(content_str)
+            except LLMUnavailable:
+                if self.config.llm_degraded_mode != "rules":
+                    raise
+                # Degraded mode: the rule-based best guess, flagged and never cached
+                usage["degraded"] = True
+                result = await self.execution.run_io(
+                    self.fast_path.best_guess, email_data['headers']['subject'], email_data['body']
+                )
+                return result, usage
+            self._record_prompt(usage)
+            if fingerprint is not None:
+                await self.execution.run_io(self.classification_cache.put, fingerprint, result)
+        return result, usage
+
+    def _record_prompt(self, usage: Dict):
+        self._stats["prompts"] += 1
+        self._stats["prompt_tokens"] += usage["total"]
+        self._stats["prompt_tokens_max"] = max(self._stats["prompt_tokens_max"], usage["total"])
+        self._stats["prompts_truncated"] += usage["truncated"]
+
+
+def enhance_with_field_extraction(result: MultiRequestData, body: str, attachments: List[Dict],
+                                  attachment_bytes: Optional[List[bytes]] = None):
+    """Enhance results with rule-based field extraction; attachment_bytes parallels attachments"""
+    # One scan of the body and of each attachment covers every detected request type
+    request_types = [result.primary_request.request_type] + [req.request_type for req in result.secondary_requests]
+    body_fields = extract_fields_for_types(request_types, body)
+    attachment_bytes = attachment_bytes or [None] * len(attachments)
+    attachment_fields = [
+        extract_fields_for_types(request_types, attachment['text'], attachment['filename'], data)
+        for attachment, data in zip(attachments, attachment_bytes)
+        if attachment['text']
+    ]
+
+    # Process primary request: attachment values are accumulated across attachments
+    primary_type = result.primary_request.request_type
+    primary_attachment_fields = {}
+    for fields in attachment_fields:
+        for k, v in fields[primary_type].items():
+            primary_attachment_fields.setdefault(k, []).extend(v)
+
+    # Update extracted fields
+    result.primary_request.extracted_fields.update({
+        **body_fields[primary_type],
+        **primary_attachment_fields
+    })
+
+    # Process secondary requests
+    for req in result.secondary_requests:
+        req.extracted_fields.update(body_fields[req.request_type])
+        for fields in attachment_fields:
+            req.extracted_fields.update(fields[req.request_type])
@@ -0,0 +1,153 @@
+import json
+import re
+from typing import Dict, List, Tuple
+
+from .field_extraction_rules import FIELD_EXTRACTION_RULES
+from .rule_engine import iter_scan_windows
+from ..models.request_type_mapping import REQUEST_TYPES
+
+# Rough chars-per-token ratio for English/financial text; avoids a tokenizer round trip per email
+CHARS_PER_TOKEN = 4
+
+# Request types and sub-types as single-line JSON (indent=2 roughly doubles its token count)
+COMPACT_SCHEMA = json.dumps(REQUEST_TYPES, separators=(",", ":"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of text"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _vocabulary() -> List[str]:
+    """Words that make an attachment chunk relevant: request types, sub-types and extracted field names"""
+    words = set()
+    names = list(REQUEST_TYPES) + [sub for subs in REQUEST_TYPES.values() for sub in subs]
+    names += [field for rules in FIELD_EXTRACTION_RULES.values() for field in rules.get("priority_fields", [])]
+    for name in names:
+        words.update(w for w in re.split(r"[^a-z]+", name.lower()) if len(w) > 2)
+    return sorted(words)
+
+
+KEYWORD_PATTERN = re.compile(r"\b(?:" + "|".join(_vocabulary()) + r")\b", re.IGNORECASE)
+AMOUNT_PATTERN = re.compile(r"\d[\d,]*\.\d{2}\b")
+DATE_PATTERN = re.compile(r"\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b")
+
+
+def score_chunk(text: str) -> int:
+    """Relevance of an attachment chunk: request vocabulary, amounts and dates it contains"""
+    return (len(KEYWORD_PATTERN.findall(text))
+            + 2 * len(AMOUNT_PATTERN.findall(text))
+            + len(DATE_PATTERN.findall(text)))
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit("\n", 1)[0] + "\n[... truncated]"
+
+
+class PromptBuilder:
+    """
+    Assembles the email content sent to the classifier within a token budget.
+
+    Sections are filled in rank order: headers, then the body (truncated if it alone
+    exceeds the budget), then the highest scoring attachment chunks up to max_chunks.
+    Each attachment's first line is repeated ahead of its chunks so tables keep their
+    column headers, and omitted parts are summarized instead of silently dropped.
+    """
+
+    def __init__(self, max_tokens: int = 8000, chunk_tokens: int = 400, max_chunks: int = 8,
+                 reserved_tokens: int = 0):
+        self.max_tokens = max_tokens
+        self.chunk_tokens = chunk_tokens
+        self.max_chunks = max_chunks
+        # Taken by the instructions and schema the classifier wraps the content in
+        self.reserved_tokens = reserved_tokens
+
+    def build(self, email_data: Dict, attachments_data: List[Dict]) -> Tuple[str, Dict]:
+        """Return (content, usage) where usage reports estimated tokens per section"""
+        headers = email_data['headers']
+        header_str = (
+            f"From: {headers['from']}\n"
+            f"To: {headers['to']}\n"
+            f"CC: {headers['cc']}\n"
+            f"Subject: {headers['subject']}\n"
+            f"Date: {headers['date']}"
+        )
+        budget = self.max_tokens - self.reserved_tokens - estimate_tokens(header_str)
+        body = _truncate(email_data['body'], max(budget, 0))
+        budget -= estimate_tokens(body)
+
+        attachments_str, used_chunks, total_chunks = self._attachments_section(attachments_data, budget)
+
+        content = f"EMAIL HEADERS:\n{header_str}\n\nBODY:\n{body}\n\nATTACHMENTS:\n{attachments_str}"
+        usage = {
+            "budget": self.max_tokens,
+            "instructions": self.reserved_tokens,
+            "headers": estimate_tokens(header_str),
+            "body": estimate_tokens(body),
+            "attachments": estimate_tokens(attachments_str),
+            "attachment_chunks": used_chunks,
+            "attachment_chunks_total": total_chunks,
+            "truncated": body != email_data['body'] or used_chunks < total_chunks
+        }
+        usage["total"] = self.reserved_tokens + estimate_tokens(content)
+        return content, usage
+
+    def _attachments_section(self, attachments_data: List[Dict], budget: int) -> Tuple[str, int, int]:
+        # (score, attachment index, chunk index, text) for every chunk of every read attachment
+        candidates = []
+        titles = {}
+        for a_index, attachment in enumerate(attachments_data):
+            text = attachment['text']
+            if text is None:
+                continue
+            title, chunks = self._chunk(text)
+            titles[a_index] = title
+            for c_index, chunk in enumerate(chunks):
+                candidates.append((score_chunk(chunk), a_index, c_index, chunk))
+
+        # Highest scoring first; earlier chunks win ties
+        candidates.sort(key=lambda c: (-c[0], c[1], c[2]))
+        selected: Dict[int, List[Tuple[int, str]]] = {}
+        for _, a_index, c_index, chunk in candidates:
+            if sum(len(chunks) for chunks in selected.values()) >= self.max_chunks:
+                break
+            cost = estimate_tokens(chunk) + (0 if a_index in selected else estimate_tokens(titles[a_index]))
+            if cost > budget:
+                continue
+            selected.setdefault(a_index, []).append((c_index, chunk))
+            budget -= cost
+
+        chunk_counts = {}
+        for _, a_index, _, _ in candidates:
+            chunk_counts[a_index] = chunk_counts.get(a_index, 0) + 1
+
+        sections = []
+        for a_index, attachment in enumerate(attachments_data):
+            if attachment['text'] is None:
+                sections.append(f"{attachment['filename']} (not read)")
+                continue
+            chunks = sorted(selected.get(a_index, []))
+            total = chunk_counts.get(a_index, 0)
+            parts = [titles[a_index]] if chunks and titles[a_index] else []
+            parts += [chunk for _, chunk in chunks]
+            if len(chunks) < total:
+                parts.append(f"[... {total - len(chunks)} of {total} sections omitted]")
+            sections.append(f"{attachment['filename']}:\n" + "\n".join(parts))
+        return "\n\n".join(sections), sum(len(c) for c in selected.values()), len(candidates)
+
+    def _chunk(self, text: str) -> Tuple[str, List[str]]:
+        """
+        Split text into chunks of about chunk_tokens, at line and then sentence boundaries, so
+        long unbroken text (typical OCR output) still yields several chunks; returns (first line, chunks)
+        """
+        max_chars = self.chunk_tokens * CHARS_PER_TOKEN
+        text = text.strip()
+        title, _, rest = text.partition("\n")
+        if not rest or len(title) > max_chars:
+            # No header line worth repeating ahead of every chunk
+            title, rest = "", text
+        chunks = (chunk.strip() for chunk in iter_scan_windows(rest, max_chars))
+        return title, [chunk for chunk in chunks if chunk]
@@ -0,0 +1,161 @@
+import json
+from typing import Any, List, Tuple
+
+CLOSERS = {"{": "}", "[": "]"}
+
+
+class ResponseParseError(ValueError):
+    """The model response contains no JSON value that could be recovered"""
+
+
+def _scan(text: str) -> Tuple[str, List[str], bool]:
+    """
+    Walk JSON text tracking strings and nesting. Returns the text with trailing commas
+    before a closing bracket removed, the stack of unclosed openers and whether the
+    text ends inside a string.
+    """
+    out, stack = [], []
+    in_string = escaped = False
+    pending_comma = None
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == ",":
+            pending_comma = len(out)
+        elif ch in "}]":
+            if pending_comma is not None:
+                del out[pending_comma]
+                pending_comma = None
+            if stack:
+                stack.pop()
+        elif not ch.isspace():
+            if ch in "{[":
+                stack.append(ch)
+            elif ch == '"':
+                in_string = True
+            pending_comma = None
+        out.append(ch)
+    return "".join(out), stack, in_string
+
+
+class JSONStreamParser:
+    """
+    Incrementally extracts the first top-level JSON object or array from a model response.
+
+    Text before the value (code fences, "Here is the JSON:", a bracketed "[note]") is skipped:
+    a balanced bracket span that is not JSON is passed over and the search resumes after its
+    opening bracket. feed() reports completion as soon as a value's brackets balance, so the
+    caller can stop reading the stream and ignore any trailing prose. result() repairs the
+    defects models commonly produce instead of failing the request: trailing commas, raw
+    control characters in strings, and a response cut off mid-value (open brackets are closed
+    and an incomplete last member, including one cut off inside a string, is dropped).
+    """
+
+    def __init__(self):
+        # Response text from the current candidate opener on (all of it before one is found)
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self.started = False
+        self.complete = False
+        self.repaired = False
+
+    def feed(self, chunk: str) -> bool:
+        """Consume the next piece of the response; True once the first value is complete"""
+        if self.complete:
+            return True
+        self._text += chunk
+        text = self._text
+        i = self._pos
+        while i < len(text):
+            if not self.started:
+                starts = [j for j in (text.find("{", i), text.find("[", i)) if j >= 0]
+                if not starts:
+                    # Nothing to keep until an opener arrives
+                    self._text, self._pos = "", 0
+                    return False
+                text = self._text = text[min(starts):]
+                i = 0
+                self.started = True
+                self._depth = 0
+                self._in_string = self._escaped = False
+
+            ch = text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    if _is_json(text[:i + 1]):
+                        self._text = text[:i + 1]
+                        self.complete = True
+                        return True
+                    # Prose in brackets, e.g. "[the]": look for the value after its opener
+                    self.started = False
+                    i = 1
+                    continue
+            i += 1
+        self._pos = i
+        return False
+
+    def result(self) -> Any:
+        """The parsed value, repaired if necessary; raises ResponseParseError if nothing is recoverable"""
+        if not self.started:
+            raise ResponseParseError("No JSON object or array in the response")
+        text = self._text
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            pass
+
+        self.repaired = True
+        candidate = text
+        while candidate:
+            value = _try_repair(candidate)
+            if value is not None:
+                return value
+            # Drop the last (incomplete) member and try again
+            search = candidate[:-1] if candidate[-1] in "{[" else candidate
+            cut = max(search.rfind(","), search.rfind("{"), search.rfind("["))
+            if cut <= 0:
+                break
+            candidate = candidate[:cut + 1] if candidate[cut] in "{[" else candidate[:cut]
+        raise ResponseParseError(f"Unrecoverable JSON in the response: {text[:200]!r}")
+
+
+def _try_repair(text: str) -> Any:
+    cleaned, stack, in_string = _scan(text)
+    if in_string:
+        # A value cut off inside a string ("USD 1" of "USD 1,250.00") must not pass for a real one
+        return None
+    cleaned += "".join(CLOSERS[opener] for opener in reversed(stack))
+    try:
+        # strict=False accepts raw newlines and tabs inside strings
+        return json.loads(_scan(cleaned)[0], strict=False)
+    except json.JSONDecodeError:
+        return None
+
+
+def _is_json(text: str) -> bool:
+    """Whether a balanced bracket span is JSON, possibly with the defects result() repairs"""
+    try:
+        json.loads(text)
+        return True
+    except json.JSONDecodeError:
+        return _try_repair(text) is not None
@@ -0,0 +1,263 @@
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Pattern, Tuple, Union
+
+# Sources a rule set can be applied to: the email body or a text attachment type
+BODY_SOURCE = "body"
+
+# Patterns like "deal.*?name.*?(...)" cost O(n^2) on a single long line, so a line longer
+# than this many characters (typically OCR output with no line breaks) is scanned in windows
+MAX_SCAN_WINDOW = 512
+# Consecutive windows of a long line overlap by this much, more than any field value
+# (e.g. "USD 12,345,678.90") plus its keyword, so a match is not lost at a window edge
+SCAN_OVERLAP = 128
+
+_SENTENCE_END = re.compile(r"(?<=[.!?;])\s+")
+
+
+def iter_scan_windows(text: str, max_window: int = MAX_SCAN_WINDOW) -> Iterator[str]:
+    """
+    Split text into consecutive windows no longer than max_window.
+    Whole lines are packed together; a line that is itself too long (typically OCR output
+    with no line breaks) is split at sentence boundaries, and as a last resort at max_window.
+    """
+    if len(text) <= max_window:
+        yield text
+        return
+
+    window = []
+    window_len = 0
+    for piece in _iter_pieces(text, max_window):
+        if window and window_len + len(piece) > max_window:
+            yield "".join(window)
+            window = []
+            window_len = 0
+        window.append(piece)
+        window_len += len(piece)
+    if window:
+        yield "".join(window)
+
+
+def _iter_pieces(text: str, max_window: int) -> Iterator[str]:
+    """Yield lines (keeping their line break), breaking up any line longer than max_window"""
+    for line in text.splitlines(keepends=True):
+        if len(line) <= max_window:
+            yield line
+            continue
+        start = 0
+        for match in _SENTENCE_END.finditer(line):
+            yield from _hard_split(line[start:match.end()], max_window)
+            start = match.end()
+        yield from _hard_split(line[start:], max_window)
+
+
+def _hard_split(piece: str, max_window: int) -> Iterator[str]:
+    for i in range(0, len(piece), max_window):
+        yield piece[i:i + max_window]
+
+
+def iter_scan_segments(text: str, max_window: int = MAX_SCAN_WINDOW,
+                       overlap: int = SCAN_OVERLAP) -> Iterator[Tuple[int, str, int]]:
+    """
+    Split text for regex scanning into (offset, segment, keep) triples. No rule's "." crosses
+    a line break, so runs of ordinary lines are scanned whole, in a single pass. A line longer
+    than max_window is cut into windows of max_window overlapping by overlap; matches starting
+    at or after keep in such a window are left to the next one, which sees them in full.
+    """
+    run_start = 0
+    position = 0
+    for line in text.splitlines(keepends=True):
+        line_start = position
+        position += len(line)
+        if len(line) <= max_window:
+            continue
+        if line_start > run_start:
+            yield run_start, text[run_start:line_start], line_start - run_start
+        step = max_window - overlap
+        for start in range(line_start, position, step):
+            end = min(start + max_window, position)
+            yield start, text[start:end], end - start if end == position else step
+            if end == position:
+                break
+        run_start = position
+    if position > run_start:
+        yield run_start, text[run_start:position], position - run_start
+
+
+def scan_findall(pattern: Pattern, segments: List[Tuple[int, str, int]], keyword: Optional[str] = None,
+                 lowered: Optional[str] = None) -> List:
+    """
+    re.findall over the segments of iter_scan_segments: matches never overlap or repeat.
+    With the lowercase keyword every match starts with and the lowercased text (same length),
+    the pattern is only tried where the keyword occurs instead of at every position.
+    """
+    if len(segments) == 1 and keyword is None:
+        # Text without over-long lines: a plain findall
+        return pattern.findall(segments[0][1])
+    matches = []
+    last_end = 0
+    for offset, segment, keep in segments:
+        if keyword is None:
+            found = pattern.finditer(segment)
+        else:
+            found = _iter_anchored(pattern, segment, lowered[offset:offset + len(segment)], keyword)
+        for match in found:
+            if match.start() >= keep:
+                break
+            if offset + match.start() < last_end:
+                continue
+            last_end = offset + match.end()
+            matches.append(_findall_item(match))
+    return matches
+
+
+def _iter_anchored(pattern: Pattern, text: str, lowered: str, keyword: str) -> Iterator:
+    """pattern.finditer(text) for a pattern whose matches all start with keyword, found with str.find"""
+    position = lowered.find(keyword)
+    while position != -1:
+        # match() at a position still sees the text before it, so \b and lookbehinds behave as in finditer
+        match = pattern.match(text, position)
+        if match:
+            yield match
+            position = match.end()
+        else:
+            position += 1
+        position = lowered.find(keyword, position)
+
+
+def _findall_item(match) -> Union[str, Tuple[str, ...]]:
+    """What re.findall reports for a match: the whole match, its only group, or all groups"""
+    groups = match.groups("")
+    if not groups:
+        return match.group(0)
+    return groups[0] if len(groups) == 1 else groups
+
+
+def _leading_literal(pattern: str) -> Optional[str]:
+    """
+    Return a word every match of `pattern` must start with, or None if there is no such word.
+    Used to skip patterns whose keyword does not occur anywhere in the text.
+    """
+    source = re.sub(r"^\(\?[aiLmsux]+\)", "", pattern)
+    source = re.sub(r"^\\b", "", source)
+
+    # A top-level alternation means there is no single required prefix
+    depth = 0
+    escaped = False
+    in_class = False
+    for char in source:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif in_class:
+            in_class = char != "]"
+        elif char == "[":
+            in_class = True
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            return None
+
+    match = re.match(r"[A-Za-z]+", source)
+    if not match:
+        return None
+    literal = match.group(0)
+    # A quantifier right after the run makes its last letter optional
+    if source[len(literal):len(literal) + 1] in ("?", "*", "{"):
+        literal = literal[:-1]
+    return literal if len(literal) >= 3 else None
+
+
+class RuleEngine:
+    """
+    Precompiled field extraction rules.
+
+    Every pattern is compiled once when the engine is built and identical patterns shared
+    by several request types/fields are scanned only once per text. Patterns are not merged
+    into one alternation: that changes findall's non-overlapping semantics, and a combined
+    pattern measured about twice as slow as the separate scans (the regex engine loses its
+    first-character shortcuts and tries every alternative at every position).
+
+    Instead most patterns start with a keyword (see _leading_literal), and sre tries them at
+    every position of the text. The engine finds the keyword's occurrences with str.find on
+    one lowercased copy of the text and tries the pattern only there; a pattern whose
+    keyword is absent is skipped entirely. Patterns without a keyword are scanned as usual.
+
+    Ordinary text is scanned in one pass per pattern; only lines longer than max_window are
+    scanned in overlapping windows (see iter_scan_segments), so lazy ".*?" gaps and
+    lookaheads can never look further than max_window characters and extraction time stays
+    linear in the size of the text.
+    """
+
+    def __init__(self, rules: Dict, max_window: int = MAX_SCAN_WINDOW, overlap: int = SCAN_OVERLAP):
+        self.max_window = max_window
+        self.overlap = overlap
+        self._patterns: List[Pattern] = []
+        self._anchors: List[Optional[str]] = []
+        pattern_ids: Dict[str, int] = {}
+
+        # request_type -> source -> [(field, pattern_id), ...] in rule order
+        self._rules: Dict[str, Dict[str, List[Tuple[str, int]]]] = {}
+        for request_type, config in rules.items():
+            sources = config.get("sources", {})
+            compiled_sources = {}
+            source_items = [(BODY_SOURCE, sources.get("body", {}))]
+            source_items += list(sources.get("attachments", {}).items())
+            for source, fields in source_items:
+                entries = []
+                for field, patterns in fields.items():
+                    # Non-regex settings (e.g. Excel column names) are handled by FieldExtractor
+                    if not isinstance(patterns, list) or field.endswith("_columns"):
+                        continue
+                    for pattern in patterns:
+                        if pattern not in pattern_ids:
+                            pattern_ids[pattern] = len(self._patterns)
+                            self._patterns.append(re.compile(pattern))
+                            anchor = _leading_literal(pattern)
+                            self._anchors.append(anchor.lower() if anchor else None)
+                        entries.append((field, pattern_ids[pattern]))
+                if entries:
+                    compiled_sources[source] = entries
+            self._rules[request_type] = compiled_sources
+
+        self._keywords = sorted({anchor for anchor in self._anchors if anchor})
+
+    def extract(self, text: str, request_types: Iterable[str], source: str = BODY_SOURCE) -> Dict[str, Dict[str, List[str]]]:
+        """Extract fields for several request types from one text, returning {request_type: {field: values}}"""
+        request_types = list(dict.fromkeys(request_types))
+        results: Dict[str, Dict[str, List[str]]] = {request_type: {} for request_type in request_types}
+        if not text:
+            return results
+
+        lowered = text.lower()
+        present_keywords = {keyword for keyword in self._keywords if keyword in lowered}
+        if len(lowered) != len(text):
+            # Lowercasing changed the length (rare non-ASCII letters): offsets would not line up
+            lowered = None
+        segments = list(iter_scan_segments(text, self.max_window, self.overlap))
+        matches_cache: Dict[int, List] = {}
+
+        for request_type in request_types:
+            for field, pattern_id in self._rules.get(request_type, {}).get(source, []):
+                if pattern_id not in matches_cache:
+                    keyword = self._anchors[pattern_id]
+                    if keyword and keyword not in present_keywords:
+                        matches_cache[pattern_id] = []
+                    else:
+                        matches_cache[pattern_id] = scan_findall(
+                            self._patterns[pattern_id], segments, keyword if lowered else None, lowered
+                        )
+
+                matches = matches_cache[pattern_id]
+                if matches:
+                    # Handle multiple capture groups
+                    if isinstance(matches[0], tuple):
+                        # For patterns with multiple groups, flatten the results
+                        flat_matches = [item for match in matches for item in match if item]
+                        if flat_matches:
+                            results[request_type].setdefault(field, []).extend(flat_matches)
+                    else:
+                        results[request_type].setdefault(field, []).extend(matches)
+        return results
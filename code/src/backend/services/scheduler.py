@@ -0,0 +1,143 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Tuple
+
+from .admission import Overloaded
+from .fast_path_classifier import FastPathClassifier
+from ..models.extracted_data import PriorityLevel
+from ..models.request_type_mapping import REQUEST_PRIORITY
+
+
+class PriorityEstimator:
+    """
+    Cheap pre-classification priority from the subject and body: the REQUEST_PRIORITY of the
+    request type with the most keyword and rule-pattern evidence. Emails without any evidence
+    are treated as MEDIUM so they are neither starved nor allowed to jump the queue.
+    """
+
+    def __init__(self, scorer: FastPathClassifier):
+        self.scorer = scorer
+
+    def estimate(self, subject: str, body: str) -> PriorityLevel:
+        scores = self.scorer.score(subject, body)
+        best_type = max(scores, key=scores.get, default=None)
+        if best_type is None or not scores[best_type]:
+            return PriorityLevel.MEDIUM
+        return PriorityLevel(REQUEST_PRIORITY.get(best_type, PriorityLevel.MEDIUM.value))
+
+
+class PriorityScheduler:
+    """
+    Admits at most max_concurrent emails into the expensive stages (attachment extraction,
+    OCR, LLM) and lets the most urgent waiting email in first when a slot frees up.
+
+    Aging keeps LOW work from starving: every aging_seconds of waiting counts as one
+    priority level. Since every waiter ages at the same rate, the order is fixed when an
+    email is queued (level * aging_seconds + enqueue time) and a heap is enough.
+
+    At most max_queued emails wait (0 = no limit); beyond that slot() raises Overloaded
+    (429) with a Retry-After estimated from the queue length and the recent time each
+    email holds a slot. Used from the event loop only.
+    """
+
+    LEVELS = [PriorityLevel.CRITICAL, PriorityLevel.HIGH, PriorityLevel.MEDIUM, PriorityLevel.LOW]
+
+    def __init__(self, max_concurrent: int = 16, aging_seconds: float = 30, max_queued: int = 0):
+        self.max_concurrent = max_concurrent
+        self.aging_seconds = aging_seconds
+        self.max_queued = max_queued
+        self._running = 0
+        # Moving average of how long an email holds a slot, for Retry-After
+        self._service_seconds = 0.0
+        self._rejected = 0
+        self._waiters: List[Tuple[float, int, asyncio.Future, PriorityLevel]] = []
+        self._order = itertools.count()
+        self._queued = {level: 0 for level in self.LEVELS}
+        self._stats = {level: {"scheduled": 0, "waited": 0, "wait_total": 0.0, "wait_max": 0.0} for level in self.LEVELS}
+
+    @asynccontextmanager
+    async def slot(self, priority: PriorityLevel):
+        """Hold one of the concurrent slots for the duration of the block"""
+        priority = self._level(priority)
+        await self._acquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self._service_seconds = elapsed if not self._service_seconds else 0.9 * self._service_seconds + 0.1 * elapsed
+            self._release()
+
+    def stats(self) -> Dict:
+        by_priority = {}
+        for level in self.LEVELS:
+            stats = self._stats[level]
+            by_priority[level.name] = {
+                "queued": self._queued[level],
+                "scheduled": stats["scheduled"],
+                "waited": stats["waited"],
+                "avg_wait_ms": stats["wait_total"] / stats["scheduled"] * 1000 if stats["scheduled"] else 0.0,
+                "max_wait_ms": stats["wait_max"] * 1000
+            }
+        return {
+            "running": self._running,
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "rejected": self._rejected,
+            "by_priority": by_priority
+        }
+
+    def _level(self, priority: PriorityLevel) -> PriorityLevel:
+        # UNKNOWN and anything unexpected is scheduled as LOW
+        return priority if priority in self._queued else PriorityLevel.LOW
+
+    async def _acquire(self, priority: PriorityLevel):
+        queued_at = time.monotonic()
+        # A free slot means nobody is waiting: _release hands slots straight to waiters
+        if self._running < self.max_concurrent:
+            self._running += 1
+            self._record(priority, queued_at, waited=False)
+            return
+
+        queued = sum(self._queued.values())
+        if self.max_queued and queued >= self.max_queued:
+            self._rejected += 1
+            retry_after = min(60, max(1, (queued + 1) / self.max_concurrent * (self._service_seconds or 5)))
+            raise Overloaded(429, "Too many emails waiting to be processed, retry later", retry_after)
+
+        future = asyncio.get_running_loop().create_future()
+        rank = (priority.value - 1) * self.aging_seconds + queued_at
+        heapq.heappush(self._waiters, (rank, next(self._order), future, priority))
+        self._queued[priority] += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                # Still queued; the entry is skipped when it reaches the top of the heap
+                self._queued[priority] -= 1
+            else:
+                # The slot was handed over just as the caller gave up: pass it on
+                self._release()
+            raise
+        self._record(priority, queued_at, waited=True)
+
+    def _release(self):
+        while self._waiters:
+            _, _, future, priority = heapq.heappop(self._waiters)
+            if not future.cancelled():
+                self._queued[priority] -= 1
+                # The slot goes straight to the waiter, so _running stays the same
+                future.set_result(None)
+                return
+        self._running -= 1
+
+    def _record(self, priority: PriorityLevel, queued_at: float, waited: bool):
+        wait = time.monotonic() - queued_at
+        stats = self._stats[priority]
+        stats["scheduled"] += 1
+        stats["waited"] += waited
+        stats["wait_total"] += wait
+        stats["wait_max"] = max(stats["wait_max"], wait)
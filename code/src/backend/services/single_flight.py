@@ -0,0 +1,49 @@
+import asyncio
+from typing import Any, Awaitable, Dict, Iterable, Optional
+
+
+class SingleFlight:
+    """
+    Registry of in-progress computations keyed by fingerprint. A call whose key matches a
+    computation still running awaits that computation instead of starting its own, so
+    concurrent identical submissions share one parse/OCR/LLM pass and get the same result.
+
+    The shared work runs as its own task: a caller that disconnects is cancelled without
+    cancelling the computation the others are waiting for. Used from the event loop only.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._stats = {"started": 0, "coalesced": 0}
+
+    def find(self, keys: Iterable[str]) -> Optional[asyncio.Task]:
+        """The running computation registered under any of keys, if there is one"""
+        return next((self._tasks[key] for key in keys if key in self._tasks), None)
+
+    async def join(self, task: asyncio.Task) -> Any:
+        """Wait for a computation started by another caller"""
+        self._stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    async def run(self, keys: Iterable[str], computation: Awaitable) -> Any:
+        """Start computation under keys (all of them identify it) and wait for its result"""
+        keys = list(keys)
+        task = asyncio.ensure_future(computation)
+        for key in keys:
+            self._tasks[key] = task
+        self._stats["started"] += 1
+        task.add_done_callback(lambda done: self._finished(done, keys))
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict:
+        stats = dict(self._stats)
+        stats["in_flight"] = len(set(self._tasks.values()))
+        return stats
+
+    def _finished(self, task: asyncio.Task, keys):
+        for key in keys:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+        # Retrieve the outcome so a failure nobody is waiting for anymore is not reported as unhandled
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,159 @@
+import json
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+# Leading bytes of each binary format; text formats are only checked for NUL bytes
+OLE_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+ZIP_MAGIC = b'PK\x03\x04'
+MAGIC_BYTES = {
+    '.msg': OLE_MAGIC,
+    '.xls': OLE_MAGIC,
+    '.xlsx': ZIP_MAGIC,
+    '.zip': ZIP_MAGIC,
+    '.pdf': b'%PDF',
+    '.png': b'\x89PNG\r\n\x1a\n',
+    '.jpg': b'\xff\xd8\xff',
+    '.jpeg': b'\xff\xd8\xff',
+}
+TEXT_SUFFIXES = ('.eml', '.txt', '.csv', '.mbox')
+
+# Bytes sniffed from the start of an upload to identify its type
+SNIFF_SIZE = 8192
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Room for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadRejected(Exception):
+    """An upload that fails validation; status_code is the HTTP status to answer with"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def check_upload_type(filename: str, head: bytes, allowed_suffixes: Iterable[str]):
+    """Reject files whose extension is not allowed or whose leading bytes do not match it"""
+    suffix = Path(filename or "").suffix.lower()
+    if suffix not in allowed_suffixes:
+        raise UploadRejected(415, f"File type '{suffix or filename}' is not allowed")
+
+    magic = MAGIC_BYTES.get(suffix)
+    if magic is not None and not head.startswith(magic):
+        raise UploadRejected(415, f"File content does not match its '{suffix}' extension")
+    if suffix in TEXT_SUFFIXES and b'\x00' in head:
+        raise UploadRejected(415, f"File content does not match its '{suffix}' extension")
+
+
+def check_callback_url(url: str, allowed_hosts: Iterable[str] = ()):
+    """Reject callback URLs that are not http(s) or, when allowed_hosts is set, point at another host"""
+    parts = urlsplit(url or "")
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise UploadRejected(400, "callback_url must be an http or https URL")
+    allowed_hosts = list(allowed_hosts)
+    if allowed_hosts and parts.hostname.lower() not in allowed_hosts:
+        raise UploadRejected(400, f"callback_url host '{parts.hostname}' is not allowed")
+
+
+def read_upload(fileobj: BinaryIO, filename: str, max_bytes: int, allowed_suffixes: Iterable[str]) -> bytes:
+    """
+    Read an upload in chunks, checking its type from the first chunk and stopping
+    as soon as it grows past max_bytes.
+    """
+    head = fileobj.read(SNIFF_SIZE)
+    check_upload_type(filename, head, allowed_suffixes)
+
+    chunks = [head]
+    size = len(head)
+    while size <= max_bytes:
+        chunk = fileobj.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+
+    if size > max_bytes:
+        raise UploadRejected(413, f"File exceeds the {max_bytes} byte limit")
+    return b''.join(chunks)
+
+
+def check_upload(fileobj: BinaryIO, filename: str, allowed_suffixes: Iterable[str]):
+    """Check an upload's type without reading it all, leaving the stream at its start"""
+    head = fileobj.read(SNIFF_SIZE)
+    fileobj.seek(0)
+    check_upload_type(filename, head, allowed_suffixes)
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware capping request body size per path.
+
+    Requests announcing a larger Content-Length are refused before any of the body is
+    read; chunked or mislabelled bodies are cut off with a 413 as soon as the running
+    total crosses the limit, so an oversized upload is never fully received.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self._limit_for(scope)
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            await _send_too_large(send, limit)
+            return
+
+        state = {"received": 0, "exceeded": False, "responded": False}
+
+        async def limited_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                state["received"] += len(message.get("body", b""))
+                if state["received"] > limit:
+                    state["exceeded"] = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            # Whatever the app answers once the body was cut off is replaced by the 413
+            if state["exceeded"]:
+                if not state["responded"]:
+                    state["responded"] = True
+                    await _send_too_large(send, limit)
+                return
+            state["responded"] = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            if not state["responded"]:
+                await _send_too_large(send, limit)
+
+    def _limit_for(self, scope) -> Optional[int]:
+        if scope["type"] != "http" or scope.get("method") != "POST":
+            return None
+        return self.limits.get(scope.get("path", "").rstrip("/"))
+
+
+async def _send_too_large(send, limit: int):
+    body = json.dumps({"detail": f"Request body exceeds the {limit} byte limit"}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 413,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,62 @@
+"""
+Job worker: processes the emails queued through POST /jobs.
+
+Run any number of these next to the API, with the same environment (JOB_QUEUE_PATH in
+particular; use the sqlite dedup store so duplicates are detected across processes):
+    python -m backend.worker [--processes 2]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import signal
+
+
+def run_worker():
+    # Built inside the worker process: every process gets its own pipeline and pools
+    from backend.main import config, execution, job_queue, pipeline
+    from backend.services.job_worker import JobWorker
+
+    worker = JobWorker(
+        pipeline,
+        job_queue,
+        execution,
+        concurrency=config.job_worker_concurrency,
+        poll_interval=config.job_poll_interval,
+        retry_delay=config.job_retry_delay,
+        webhook_timeout=config.webhook_timeout,
+        webhook_allowed_hosts=config.webhook_allowed_hosts
+    )
+
+    async def main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:  # Windows
+                pass
+        print(f"Worker {worker.worker_id} processing jobs from {config.job_queue_path}")
+        await worker.run(stop)
+
+    try:
+        asyncio.run(main())
+    finally:
+        execution.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process emails queued through POST /jobs")
+    parser.add_argument("--processes", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.processes == 1:
+        run_worker()
+    else:
+        context = multiprocessing.get_context("spawn")
+        processes = [context.Process(target=run_worker) for _ in range(args.processes)]
+        for process in processes:
+            process.start()
+        # Pass a stop request on to the workers; each finishes its running jobs before exiting
+        signal.signal(signal.SIGTERM, lambda *_: [process.terminate() for process in processes])
+        for process in processes:
+            process.join()
@@ -0,0 +1,427 @@
+"""
+End-to-end benchmark on a synthetic email corpus.
+
+Generates a reproducible corpus of .eml files whose body sizes, attachment counts and
+attachment types (text PDFs, scanned PDFs, CSV, XLSX, nested emails) and share of exact
+resends and reply threads are configurable, then measures each stage on its own and the
+whole pipeline through the FastAPI app:
+  parse        EmailParser.parse_email
+  attachments  AttachmentProcessor.extract_text (no cache) for every attachment
+  classify     Classifier with the offline stub backend (--stub-latency-ms per call)
+  fields       rule-based field extraction (FieldExtractor rules via the shared RuleEngine)
+  route        RequestRouter.route_request
+  end_to_end   POST /process through the ASGI app with --concurrency requests in flight
+
+For every stage the report has throughput, p50/p95/p99/mean latency per email and the
+process peak RSS after the stage (a high-water mark, so it only grows). --output writes
+the same numbers as JSON to diff between releases.
+
+The standard library cannot write Outlook .msg files, so the generated nested messages
+are .eml attachments; pass --msg-dir with real .msg samples to also submit those as
+top-level emails and attach them as nested MSGs. Scanned PDFs need Tesseract and poppler
+(without them OCR fails fast and the numbers only cover the text-layer check).
+
+Run from the repository root:
+    python code/test/benchmarks/bench_end_to_end.py [--emails 300] [--concurrency 16] [--output bench.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from email.utils import format_datetime, make_msgid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src"))
+
+# The app reads its configuration at import: use the offline classifier unless told otherwise
+os.environ.setdefault("CLASSIFIER_BACKEND", "stub")
+
+import pandas as pd  # noqa: E402
+
+from backend.config import Config  # noqa: E402
+from backend.services.attachment_processor import AttachmentProcessor  # noqa: E402
+from backend.services.classification import Classifier  # noqa: E402
+from backend.services.classifier_backends import StubBackend  # noqa: E402
+from backend.services.email_parser import EmailParser  # noqa: E402
+from backend.services.pipeline import enhance_with_field_extraction  # noqa: E402
+from backend.services.prompt_builder import PromptBuilder  # noqa: E402
+from backend.services.routing import RequestRouter  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TEMPLATE_LINES = {
+    "Money Movement - Inbound": [
+        "Your share of the USD {big} payment is USD {amount} for account {account}.",
+        "Principal repayment received, effective {date}, deal name {deal}.",
+    ],
+    "Fee Payment": [
+        "The ongoing fee amount ${amount} is due on due date {date}.",
+        "Letter of credit fee for deal {deal} has been charged to account {account}.",
+    ],
+    "Adjustment": [
+        "Adjustment of ${amount} applies to the previous balance ${big}.",
+    ],
+    "Commitment Change": [
+        "New commitment ${big} replaces previous commitment ${amount}, effective {date}.",
+    ],
+    "AU Transfer": [
+        "Please process the assignment of ${big} under deal {deal}, effective {date}.",
+    ],
+}
+FILLER_LINES = [
+    "Please do not hesitate to contact the agency desk with any questions.",
+    "This notice is provided for information purposes and requires no reply.",
+    "All amounts are stated in the facility currency unless noted otherwise.",
+    "Kindly confirm receipt of this notice to the servicing team.",
+]
+ATTACHMENT_KINDS = ["text_pdf", "scanned_pdf", "csv", "xlsx", "nested_email"]
+
+
+def _pdf(objects: list) -> bytes:
+    """Assemble numbered PDF objects (object 1 is the catalog) with a valid xref table"""
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def _stream(data: bytes, extra: bytes = b"") -> bytes:
+    return b"<< /Length %d %s>>\nstream\n" % (len(data), extra) + data + b"\nendstream"
+
+
+def text_pdf(lines: list) -> bytes:
+    escaped = [line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in lines]
+    content = "BT /F1 10 Tf 50 760 Td 14 TL " + " ".join(f"({line}) '" for line in escaped) + " ET"
+    return _pdf([
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        _stream(content.encode("latin-1", errors="replace")),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ])
+
+
+def scanned_pdf(rng: random.Random, width: int = 850, height: int = 1100) -> bytes:
+    """A page holding only a grayscale image (no text layer), like a scanner produces"""
+    rows = []
+    for _ in range(height):
+        if rng.random() < 0.3:
+            rows.append(bytes(rng.choice((0, 255)) for _ in range(width)))
+        else:
+            rows.append(b"\xff" * width)
+    image = zlib.compress(b"".join(rows))
+    return _pdf([
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /XObject << /Im1 5 0 R >> >> >>",
+        _stream(b"q 612 0 0 792 0 0 cm /Im1 Do Q"),
+        _stream(image, b"/Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+                       b"/BitsPerComponent 8 /Filter /FlateDecode " % (width, height)),
+    ])
+
+
+class CorpusGenerator:
+    """Reproducible synthetic emails; every random choice comes from one seeded generator"""
+
+    def __init__(self, seed: int, body_sizes: list, max_attachments: int, attachment_kinds: list,
+                 duplicate_rate: float, thread_rate: float, msg_samples: list):
+        self.rng = random.Random(seed)
+        self.body_sizes = body_sizes
+        self.max_attachments = max_attachments
+        self.attachment_kinds = attachment_kinds
+        self.duplicate_rate = duplicate_rate
+        self.thread_rate = thread_rate
+        self.msg_samples = msg_samples
+        self.start = datetime(2024, 1, 2, 9, 0, tzinfo=timezone.utc)
+
+    def generate(self, count: int) -> list:
+        """[(filename, bytes, kind)] where kind is 'new', 'thread', 'duplicate' or 'msg'"""
+        corpus, sent = [], []
+        for i in range(count):
+            roll = self.rng.random()
+            if sent and roll < self.duplicate_rate:
+                filename, data, _ = self.rng.choice(sent)
+                corpus.append((f"resend_{i}_{filename}", data, "duplicate"))
+                continue
+            if self.msg_samples and roll < self.duplicate_rate + 0.05:
+                sample = self.rng.choice(self.msg_samples)
+                corpus.append((f"{i}_{sample.name}", sample.read_bytes(), "msg"))
+                continue
+            thread = bool(sent) and self.rng.random() < self.thread_rate
+            quoted = self.rng.choice(sent) if thread else None
+            item = (f"email_{i}.eml", self._email(i, quoted), "thread" if thread else "new")
+            sent.append(item)
+            corpus.append(item)
+        return corpus
+
+    def _values(self) -> dict:
+        rng = self.rng
+        return {
+            "amount": f"{rng.randint(1, 999)},{rng.randint(0, 999):03d}.{rng.randint(0, 99):02d}",
+            "big": f"{rng.randint(1, 99)},{rng.randint(0, 999):03d},000.00",
+            "account": str(rng.randint(10 ** 7, 10 ** 10)),
+            "date": f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/2024",
+            "deal": f"{rng.choice(['ACME', 'GLOBEX', 'INITECH', 'UMBRELLA'])} TERM LOAN {rng.choice('ABC')}",
+        }
+
+    def _body(self, request_type: str, size: int) -> str:
+        lines = ["Dear Lender,", ""]
+        total = 0
+        while total < size:
+            templated = self.rng.random() < 0.4
+            line = self.rng.choice(TEMPLATE_LINES[request_type] if templated else FILLER_LINES)
+            line = line.format(**self._values())
+            lines.append(line)
+            total += len(line) + 1
+        return "\n".join(lines + ["", "Best regards", "Agency Services"])
+
+    def _email(self, i: int, quoted) -> bytes:
+        request_type = self.rng.choice(list(TEMPLATE_LINES))
+        message = EmailMessage()
+        message["Subject"] = f"{request_type} notice {i}"
+        message["From"] = f"agent{self.rng.randint(1, 50)}@agentbank.example"
+        message["To"] = "loanops@bank.example"
+        message["Date"] = format_datetime(self.start + timedelta(minutes=7 * i))
+        message["Message-ID"] = make_msgid(idstring=str(i), domain="agentbank.example")
+        body = self._body(request_type, self.rng.choice(self.body_sizes))
+        if quoted is not None:
+            message.replace_header("Subject", f"RE: {request_type} notice {i}")
+            previous = EmailParser.parse_email(quoted[0], quoted[1])["body"]
+            body += "\n\n-----Original Message-----\n" + previous
+        message.set_content(body)
+
+        for n in range(self.rng.randint(0, self.max_attachments)):
+            kind = self.rng.choice(self.attachment_kinds)
+            name, data = self._attachment(kind, request_type, n)
+            message.add_attachment(data, maintype="application", subtype="octet-stream", filename=name)
+        return message.as_bytes()
+
+    def _attachment(self, kind: str, request_type: str, n: int):
+        if kind == "text_pdf":
+            lines = [self.rng.choice(TEMPLATE_LINES[request_type]).format(**self._values()) for _ in range(30)]
+            return f"notice_{n}.pdf", text_pdf(lines)
+        if kind == "scanned_pdf":
+            return f"scan_{n}.pdf", scanned_pdf(self.rng)
+        if kind in ("csv", "xlsx"):
+            rows = [
+                {"Deal Name": v["deal"], "Amount": v["amount"].replace(",", ""), "Effective Date": v["date"]}
+                for v in (self._values() for _ in range(self.rng.randint(5, 200)))
+            ]
+            frame = pd.DataFrame(rows)
+            if kind == "csv":
+                return f"schedule_{n}.csv", frame.to_csv(index=False).encode()
+            buffer = io.BytesIO()
+            frame.to_excel(buffer, index=False)
+            return f"schedule_{n}.xlsx", buffer.getvalue()
+        if self.msg_samples:
+            sample = self.rng.choice(self.msg_samples)
+            return f"forwarded_{n}.msg", sample.read_bytes()
+        return f"forwarded_{n}.eml", self._email(10 ** 6 + n, None)
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize(latencies: list, wall: float) -> dict:
+    ordered = sorted(latencies)
+    pct = lambda p: ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000 if ordered else 0.0  # noqa: E731
+    return {
+        "items": len(ordered),
+        "wall_s": round(wall, 3),
+        "throughput_per_s": round(len(ordered) / wall, 2) if wall else 0.0,
+        "p50_ms": round(pct(0.50), 3),
+        "p95_ms": round(pct(0.95), 3),
+        "p99_ms": round(pct(0.99), 3),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 3) if ordered else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def timed_each(func, items: list) -> dict:
+    latencies = []
+    start = time.perf_counter()
+    for item in items:
+        t0 = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def timed_concurrently(func, items: list, concurrency: int) -> dict:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(item):
+        async with semaphore:
+            t0 = time.perf_counter()
+            await func(item)
+            latencies.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(item) for item in items])
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def run_stages(corpus: list, config: Config, args) -> dict:
+    results = {}
+    parsed = []
+    results["parse"] = timed_each(lambda item: parsed.append(EmailParser.parse_email(item[0], item[1])), corpus)
+
+    processor = AttachmentProcessor(config.tesseract_path)
+    attachments = []
+
+    def extract(email_data):
+        attachments.append([
+            {"filename": a["filename"], "content_type": a["content_type"],
+             "text": processor.extract_text(a["filename"], a["data"])}
+            for a in email_data["attachments"]
+        ])
+    results["attachments"] = timed_each(extract, parsed)
+
+    builder = PromptBuilder(config.prompt_token_budget, config.prompt_chunk_tokens, config.prompt_max_attachment_chunks)
+    prompts = [builder.build(email_data, texts)[0] for email_data, texts in zip(parsed, attachments)]
+    classifier = Classifier(StubBackend(args.stub_latency_ms))
+    classified = {}
+
+    async def classify(i):
+        classified[i] = await classifier.classify_async(prompts[i])
+    results["classify"] = asyncio.run(timed_concurrently(classify, list(range(len(prompts))), args.concurrency))
+
+    items = [(classified[i], parsed[i]["body"], attachments[i]) for i in range(len(parsed))]
+    results["fields"] = timed_each(lambda item: enhance_with_field_extraction(*item), items)
+
+    router = RequestRouter({
+        "Payments Processing": ["payment_verification", "fraud_detection", "compliance_check"],
+        "Account Management": ["account_reconciliation", "customer_service"],
+        "Loan Services": ["loan_processing", "document_verification"],
+    })
+    results["route"] = timed_each(lambda result: router.route_request(result.primary_request),
+                                  [classified[i] for i in range(len(parsed))])
+    return results
+
+
+async def run_end_to_end(corpus: list, concurrency: int) -> dict:
+    import httpx
+    from backend.main import app, execution, pipeline
+
+    statuses = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def post(item):
+            filename, data, _ = item
+            response = await client.post("/process", files={"file": (filename, data)})
+            status = response.status_code
+            if status == 200 and response.json().get("status") == "duplicate":
+                status = "duplicate"
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+        result = await timed_concurrently(post, corpus, concurrency)
+    result["responses"] = statuses
+    result["pipeline_stats"] = pipeline.stats()
+    execution.shutdown()
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=300)
+    parser.add_argument("--body-sizes", type=int, nargs="+", default=[500, 2_000, 10_000, 50_000])
+    parser.add_argument("--max-attachments", type=int, default=3)
+    parser.add_argument("--attachment-kinds", nargs="+", choices=ATTACHMENT_KINDS,
+                        default=["text_pdf", "text_pdf", "csv", "xlsx", "nested_email", "scanned_pdf"],
+                        help="drawn uniformly, so repeat a kind to weight it")
+    parser.add_argument("--duplicate-rate", type=float, default=0.1)
+    parser.add_argument("--thread-rate", type=float, default=0.2)
+    parser.add_argument("--msg-dir", type=Path, help="directory of real .msg samples to mix in")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--stub-latency-ms", type=float, default=float(os.getenv("STUB_LATENCY_MS", "50")))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--skip-stages", action="store_true", help="only run the end-to-end benchmark")
+    parser.add_argument("--output", type=Path, help="write the results as JSON here")
+    args = parser.parse_args()
+    os.environ["STUB_LATENCY_MS"] = str(args.stub_latency_ms)
+
+    msg_samples = sorted(args.msg_dir.glob("*.msg")) if args.msg_dir else []
+    generator = CorpusGenerator(args.seed, args.body_sizes, args.max_attachments, args.attachment_kinds,
+                                args.duplicate_rate, args.thread_rate, msg_samples)
+    start = time.perf_counter()
+    corpus = generator.generate(args.emails)
+    kinds = {}
+    for _, _, kind in corpus:
+        kinds[kind] = kinds.get(kind, 0) + 1
+    corpus_info = {
+        "emails": len(corpus),
+        "bytes": sum(len(data) for _, data, _ in corpus),
+        "kinds": kinds,
+        "generated_s": round(time.perf_counter() - start, 2),
+    }
+
+    # The pipeline logs every email with print(); keep the report readable
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        stages = {} if args.skip_stages else run_stages(corpus, Config(), args)
+        stages["end_to_end"] = asyncio.run(run_end_to_end(corpus, args.concurrency))
+
+    print(f"corpus: {corpus_info['emails']} emails, {corpus_info['bytes'] / 1e6:.1f} MB, {kinds}")
+    print(f"{'stage':12} {'items':>6} {'per s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'mean ms':>9} {'rss MB':>8}")
+    for name, result in stages.items():
+        print(f"{name:12} {result['items']:>6} {result['throughput_per_s']:>9.1f} {result['p50_ms']:>9.2f} "
+              f"{result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['mean_ms']:>9.2f} "
+              f"{result['peak_rss_mb'] or 0:>8.1f}")
+    print(f"end_to_end responses: {stages['end_to_end']['responses']}")
+
+    if args.output:
+        report = {
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "git_revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+            },
+            "parameters": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+            "corpus": corpus_info,
+            "stages": stages,
+        }
+        args.output.write_text(json.dumps(report, indent=2, sort_keys=True, default=str))
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+LLM client benchmark against a local stub model that injects latency and errors.
+
+The stub answers after a log-normal delay, fails a fraction of calls, stalls a small
+fraction far beyond the normal latency (the tail hedging targets) and can simulate a
+full outage for part of the run. Each client configuration is driven with the same
+concurrent load; the report shows success rate, latency percentiles, retries, hedges
+and how often the circuit breaker failed fast instead of waiting on a dead model.
+
+Run from the repository root:
+    python code/test/benchmarks/bench_llm_client.py [--requests 400] [--concurrency 32]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src"))
+
+from backend.services.llm_client import CircuitBreaker, LLMUnavailable, ResilientLLMClient  # noqa: E402
+
+
+class StubModelServer:
+    """In-process stand-in for the model endpoint with configurable latency and failures"""
+
+    def __init__(self, median_latency: float = 0.05, error_rate: float = 0.05, stall_rate: float = 0.02,
+                 stall_latency: float = 1.0, outage: tuple = (), seed: int = 7):
+        self.median_latency = median_latency
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall_latency = stall_latency
+        # (start, end) seconds after the first call during which every call fails
+        self.outage = outage
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._started = None
+
+    async def generate_content_async(self, prompt: str) -> str:
+        if self._started is None:
+            self._started = time.monotonic()
+        self.calls += 1
+        elapsed = time.monotonic() - self._started
+        if self.outage and self.outage[0] <= elapsed < self.outage[1]:
+            await asyncio.sleep(0.005)
+            raise ConnectionError("503 model unavailable")
+
+        roll = self._rng.random()
+        if roll < self.stall_rate:
+            await asyncio.sleep(self.stall_latency)
+        else:
+            await asyncio.sleep(self.median_latency * self._rng.lognormvariate(0, 0.4))
+        if self._rng.random() < self.error_rate:
+            raise ConnectionError("500 internal error")
+        return '{"primary_request": {"type": "Adjustment", "confidence_score": 0.9, "extracted_fields": {}}}'
+
+
+async def drive(client, server: StubModelServer, requests: int, concurrency: int) -> dict:
+    latencies, outcomes = [], {"ok": 0, "error": 0, "unavailable": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                if client is None:
+                    await server.generate_content_async(f"email {i}")
+                else:
+                    await client.call(server.generate_content_async, f"email {i}")
+                outcomes["ok"] += 1
+            except LLMUnavailable as e:
+                # Rejected by the open breaker (no cause) vs. every retry failing
+                outcomes["unavailable" if e.__cause__ is None else "error"] += 1
+            except Exception:
+                outcomes["error"] += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(requests)])
+    wall = time.perf_counter() - start
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000  # noqa: E731
+    return {
+        "wall_s": wall,
+        "success": outcomes["ok"] / requests,
+        "errors": outcomes["error"],
+        "failed_fast": outcomes["unavailable"],
+        "p50_ms": pct(0.50), "p95_ms": pct(0.95), "p99_ms": pct(0.99),
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "model_calls": server.calls,
+        "client": client.stats() if client is not None else {},
+    }
+
+
+def make_client(hedge_after=None, breaker_failures=5, timeout=2.0):
+    return ResilientLLMClient(
+        max_concurrency=16, requests_per_minute=60000, timeout=timeout, max_retries=3,
+        backoff_base=0.02, backoff_max=0.2, hedge_after=hedge_after,
+        breaker=CircuitBreaker(failure_threshold=breaker_failures, reset_seconds=0.5)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    scenarios = [
+        ("flaky, no client", lambda: None, dict()),
+        ("flaky, retries", lambda: make_client(), dict()),
+        ("flaky, retries + hedging", lambda: make_client(hedge_after=0.15), dict()),
+        ("outage, retries only", lambda: make_client(breaker_failures=10 ** 9), dict(outage=(0.2, 1.2))),
+        ("outage, circuit breaker", lambda: make_client(), dict(outage=(0.2, 1.2))),
+    ]
+    print(f"{'scenario':28} {'success':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'calls':>6} {'retries':>8} {'hedges':>7} {'fastfail':>8} {'wall s':>7}")
+    for name, client_factory, server_options in scenarios:
+        server = StubModelServer(**server_options)
+        result = asyncio.run(drive(client_factory(), server, args.requests, args.concurrency))
+        stats = result["client"]
+        print(f"{name:28} {result['success']:>8.1%} {result['p50_ms']:>8.0f} {result['p95_ms']:>8.0f} "
+              f"{result['p99_ms']:>8.0f} {result['model_calls']:>6} {stats.get('retries', 0):>8} "
+              f"{stats.get('hedges', 0):>7} {result['failed_fast']:>8} {result['wall_s']:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
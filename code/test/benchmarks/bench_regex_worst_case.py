@@ -0,0 +1,72 @@
+"""
+Worst-case regex benchmark: extraction and cleaning on long OCR-style text with no line breaks.
+
+Each corpus entry repeats a fragment that triggers heavy backtracking in the unbounded
+patterns (a keyword whose lazy ".*?" gap never finds its continuation, or a negative
+lookahead that rescans to the end of the line). Time per KB should stay flat as input
+grows; the unbounded baseline grows linearly per KB (quadratic overall).
+
+Run from the repository root:
+    python code/test/benchmarks/bench_regex_worst_case.py [--sizes 8000 32000 128000] [--baseline-limit 8000]
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src"))
+
+from backend.preprocessing.text_cleaning import EmailCleaner  # noqa: E402
+from backend.services.field_extraction_rules import FIELD_EXTRACTION_RULES, extract_fields_for_types  # noqa: E402
+
+# Fragments repeated without line breaks, one per pathological pattern family
+CORPUS = {
+    "deal-without-name": "deal terms for the facility were agreed ",           # deal.*?name.*?(...)
+    "usd-lookahead": "USD 1,000.00 ",                                           # \bUSD...(?!.*(?:total|global))
+    "account-no-digits": "account holder acct owner reference ",                # account.*?(\d{4,20})
+    "ocr-sentences": "Effective date pending. Previous balance unknown. ",       # sentence-splittable OCR text
+}
+
+REQUEST_TYPES = list(FIELD_EXTRACTION_RULES.keys())
+
+
+def baseline_extract(text: str) -> None:
+    """Unbounded scan: every body pattern over the whole text, as before windowing"""
+    for request_type in REQUEST_TYPES:
+        for patterns in FIELD_EXTRACTION_RULES[request_type]["sources"].get("body", {}).values():
+            for pattern in patterns:
+                re.findall(pattern, text)
+
+
+def timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[8_000, 32_000, 128_000, 512_000])
+    parser.add_argument("--baseline-limit", type=int, default=8_000,
+                        help="skip the quadratic baseline above this size")
+    args = parser.parse_args()
+
+    cleaner = EmailCleaner()
+    print(f"{'corpus':<20} {'size':>8} {'extract us/KB':>14} {'clean us/KB':>12} {'baseline us/KB':>15}")
+    for name, fragment in CORPUS.items():
+        for size in args.sizes:
+            text = (fragment * (size // len(fragment) + 1))[:size]
+            kb = size / 1024
+
+            extract_time = timed(lambda: extract_fields_for_types(REQUEST_TYPES, text))
+            clean_time = timed(lambda: cleaner.clean_email_content(text))
+            baseline = "skipped"
+            if size <= args.baseline_limit:
+                baseline = f"{timed(lambda: baseline_extract(text)) / kb * 1e6:.0f}"
+
+            print(f"{name:<20} {size:>8} {extract_time / kb * 1e6:>14.0f} {clean_time / kb * 1e6:>12.0f} {baseline:>15}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import sys
+from email.message import EmailMessage
+from pathlib import Path
+
+import pytest
+
+# Tests import the backend package from code/src, like the benchmarks do
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+
+def _make_email(subject: str, body: str, message_id: str, attachments=()) -> bytes:
+    message = EmailMessage()
+    message["Subject"] = subject
+    message["From"] = "agent@bank.example"
+    message["To"] = "ops@bank.example"
+    message["Date"] = "Mon, 1 Jan 2024 10:00:00 +0000"
+    message["Message-ID"] = message_id
+    message.set_content(body)
+    for filename, data in attachments:
+        message.add_attachment(data, maintype="application", subtype="octet-stream", filename=filename)
+    return message.as_bytes()
+
+
+@pytest.fixture
+def make_email():
+    """Builds an .eml upload; attachments are (filename, bytes) pairs"""
+    return _make_email
+
+
+@pytest.fixture
+def execution():
+    from backend.services.execution import ExecutionLayer
+
+    execution = ExecutionLayer(io_workers=4, cpu_workers=1, use_processes=False)
+    yield execution
+    execution.shutdown()
+
+
+@pytest.fixture
+def pipeline(monkeypatch, tmp_path, execution):
+    """A pipeline on the offline stub classifier with in-memory stores"""
+    from backend.config import Config
+    from backend.services.dedup_store import create_duplicate_store
+    from backend.services.pipeline import EmailPipeline
+    from backend.services.routing import RequestRouter
+
+    monkeypatch.setenv("CLASSIFIER_BACKEND", "stub")
+    monkeypatch.setenv("STUB_LATENCY_MS", "0")
+    monkeypatch.setenv("UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setenv("CLASSIFICATION_CACHE_BACKEND", "none")
+    config = Config()
+    router = RequestRouter({"Payments Processing": [], "Loan Services": []})
+    return EmailPipeline(config, router, create_duplicate_store("memory"), execution)
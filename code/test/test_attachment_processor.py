@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import time
+
+from backend.services import attachment_processor
+from backend.services.attachment_processor import AttachmentProcessor
+from backend.services.execution import ExecutionLayer
+
+
+def test_ocr_does_not_hold_io_threads(monkeypatch):
+    running = []
+    peak = []
+    threads = []
+
+    def slow_ocr(source, tesseract_cmd):
+        threads.append(threading.current_thread().name)
+        running.append(threads[-1])
+        peak.append(len(running))
+        time.sleep(0.2)
+        running.pop()
+        return "scanned text"
+
+    monkeypatch.setattr(attachment_processor, "ocr_image", slow_ocr)
+    execution = ExecutionLayer(io_workers=1, cpu_workers=4, use_processes=False)
+    processor = AttachmentProcessor("tesseract", execution, ocr_max_concurrent=2)
+
+    async def run():
+        ocr = asyncio.gather(*[processor.extract_text_async(f"scan{i}.png", b"image %d" % i) for i in range(4)])
+        await asyncio.sleep(0.05)
+        # The only I/O thread stays free for other requests while the scans are OCR'd
+        started = time.monotonic()
+        await execution.run_io(lambda: None)
+        io_wait = time.monotonic() - started
+        return await ocr, io_wait
+
+    try:
+        texts, io_wait = asyncio.run(run())
+    finally:
+        execution.shutdown()
+    assert texts == ["scanned text"] * 4
+    assert io_wait < 0.1
+    assert max(peak) == 2
+    assert all(name.startswith("cpu") for name in threads)
+
+
+def test_failed_ocr_page_keeps_the_rest_of_the_pdf(monkeypatch):
+    # Pages 2 and 3 are scanned; OCR of page 2 fails
+    def text_layer(self, data):
+        return ["cover page text", "x", ""], [1, 2]
+
+    def ocr_page(path, page, tesseract_cmd, dpi):
+        if page == 2:
+            raise RuntimeError("pdftoppm crashed")
+        return f"scanned page {page}"
+
+    monkeypatch.setattr(AttachmentProcessor, "_pdf_text_layer", text_layer)
+    monkeypatch.setattr(attachment_processor, "ocr_pdf_page", ocr_page)
+    execution = ExecutionLayer(io_workers=2, cpu_workers=2, use_processes=False)
+    processor = AttachmentProcessor("tesseract", execution)
+    expected = "cover page text\nx\nscanned page 3"
+    try:
+        assert asyncio.run(processor.extract_text_async("statement.pdf", b"%PDF-1.4")) == expected
+        assert processor.extract_text("statement.pdf", b"%PDF-1.4") == expected
+    finally:
+        execution.shutdown()
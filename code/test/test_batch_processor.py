@@ -0,0 +1,68 @@
+import asyncio
+import io
+import json
+import threading
+import zipfile
+
+from backend.services.batch_processor import BatchProcessor, iter_batch_items
+from backend.services.upload_validation import UploadRejected
+
+
+def collect(processor, items):
+    async def run():
+        return [result async for result in processor.process(items)]
+
+    return asyncio.run(run())
+
+
+def test_items_are_read_off_the_event_loop(pipeline, make_email):
+    threads = []
+
+    def items():
+        for i in range(3):
+            threads.append(threading.current_thread())
+            yield f"{i}.eml", make_email(f"Payment notice {i}", f"Please wire USD {i},250.00 today.", f"<{i}@bank>")
+
+    results = collect(BatchProcessor(pipeline, max_workers=2), items())
+    assert sorted(result["index"] for result in results) == [0, 1, 2]
+    assert all(result["status"] == "processed" for result in results)
+    assert threading.main_thread() not in threads
+
+
+def test_archive_members_over_the_size_limit_are_refused():
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("small.eml", b"Subject: hi\n\nsmall")
+        z.writestr("huge.eml", b"x" * 10_000)
+    archive.seek(0)
+    items = dict(iter_batch_items("batch.zip", archive, max_item_size=1000))
+    assert items["batch.zip/small.eml"] == b"Subject: hi\n\nsmall"
+    assert isinstance(items["batch.zip/huge.eml"], UploadRejected)
+    assert items["batch.zip/huge.eml"].status_code == 413
+
+
+def test_mbox_messages_over_the_size_limit_are_refused():
+    mbox = io.BytesIO(
+        b"From a@x Mon Jan  1 10:00:00 2024\nSubject: one\n\n>From the desk\n\n"
+        b"From b@x Mon Jan  1 10:00:00 2024\nSubject: two\n\n" + b"y" * 5000 + b"\n\n"
+        b"From c@x Mon Jan  1 10:00:00 2024\nSubject: three\n\nshort\n"
+    )
+    items = list(iter_batch_items("box.mbox", mbox, max_item_size=1000))
+    assert [name for name, _ in items] == ["box.mbox#0.eml", "box.mbox#1.eml", "box.mbox#2.eml"]
+    assert items[0][1] == b"Subject: one\n\nFrom the desk\n\n"
+    assert isinstance(items[1][1], UploadRejected)
+    assert items[2][1] == b"Subject: three\n\nshort\n"
+
+
+def test_refused_items_become_error_lines(pipeline):
+    items = [("huge.eml", UploadRejected(413, "Email exceeds the 10 byte limit"))]
+    assert collect(BatchProcessor(pipeline, max_workers=2), items) == [
+        {"index": 0, "filename": "huge.eml", "status": "error", "error": "Email exceeds the 10 byte limit"}
+    ]
+
+
+def test_batch_lines_serialize_like_process(pipeline, make_email):
+    data = make_email("Payment notice", "Please wire USD 1,250.00 to account 12345678.", "<p@bank>")
+    [line] = collect(BatchProcessor(pipeline, max_workers=2), [("p.eml", data)])
+    classification = json.loads(json.dumps(line))["result"]["classification"]
+    assert isinstance(classification["primary_request"]["priority"], int)
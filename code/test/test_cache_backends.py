@@ -0,0 +1,25 @@
+import pytest
+
+from backend.services.cache_backends import CacheBackend, create_cache_backend
+
+
+def test_incomplete_backend_fails_at_instantiation():
+    class NoSet(CacheBackend):
+        def get(self, key):
+            return None
+
+        def __len__(self):
+            return 0
+
+    with pytest.raises(TypeError):
+        CacheBackend()
+    with pytest.raises(TypeError):
+        NoSet()
+
+
+def test_backends_store_values(tmp_path):
+    for backend in (create_cache_backend("memory", 10), create_cache_backend("sqlite", 10, str(tmp_path / "c.db"))):
+        backend.set("key", "value", 60)
+        assert backend.get("key") == "value"
+        assert backend.get("missing") is None
+        assert len(backend) == 1
@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+from backend.services.classifier_backends import ClassifierBackend, create_classifier_backend
+
+
+def test_incomplete_backend_fails_at_instantiation():
+    class SyncOnly(ClassifierBackend):
+        def generate(self, prompt):
+            return "{}"
+
+    with pytest.raises(TypeError):
+        ClassifierBackend()
+    with pytest.raises(TypeError):
+        SyncOnly()
+
+
+def test_backend_streams_whole_answer_by_default():
+    class Echo(ClassifierBackend):
+        def generate(self, prompt):
+            return prompt
+
+        async def generate_async(self, prompt):
+            return prompt
+
+    async def collect():
+        return [piece async for piece in Echo().stream_async("answer")]
+
+    assert asyncio.run(collect()) == ["answer"]
+
+
+def test_stub_backend_is_a_complete_backend():
+    backend = create_classifier_backend("stub", stub_latency_ms=0)
+    assert isinstance(backend, ClassifierBackend)
+    assert backend.generate("Email Content: Please wire USD 1,250.00 to account 12345678.")
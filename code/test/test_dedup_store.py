@@ -0,0 +1,25 @@
+import pytest
+
+from backend.services.dedup_store import DuplicateStore, create_duplicate_store
+
+
+def test_incomplete_store_fails_at_instantiation():
+    class NoLen(DuplicateStore):
+        def __contains__(self, email_hash):
+            return False
+
+        def add(self, email_hash):
+            pass
+
+    with pytest.raises(TypeError):
+        DuplicateStore()
+    with pytest.raises(TypeError):
+        NoLen()
+
+
+def test_stores_remember_hashes(tmp_path):
+    for store in (create_duplicate_store("memory"), create_duplicate_store("sqlite", str(tmp_path / "dedup.db"))):
+        store.add("abc")
+        assert "abc" in store
+        assert "xyz" not in store
+        assert len(store) == 1
@@ -0,0 +1,21 @@
+import os
+
+from backend.services.extraction_cache import ExtractionCache
+
+
+def test_disk_total_tracks_inserts_replacements_and_evictions(tmp_path):
+    path = str(tmp_path / "extractions.db")
+    cache = ExtractionCache(max_entries=1, disk_path=path, disk_max_bytes=2000)
+    for i in range(10):
+        cache.put(f"key{i}", os.urandom(300).hex())
+    cache.put("key9", "short")
+
+    stats = cache.stats()
+    assert 0 < stats["disk_bytes"] <= 2000
+    assert stats["evictions"] > 0
+    rows = cache._db.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+    assert stats["disk_bytes"] == rows
+    assert cache.get("key9") == "short"
+
+    # Reopening keeps the total, and a second process sees the same one
+    assert ExtractionCache(disk_path=path).stats()["disk_bytes"] == rows
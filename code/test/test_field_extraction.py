@@ -0,0 +1,90 @@
+import io
+
+import pandas as pd
+
+from backend.services.field_extraction_rules import extract_fields_for_types
+
+INBOUND = "Money Movement - Inbound"
+
+
+def excel_bytes(frame: pd.DataFrame) -> bytes:
+    buffer = io.BytesIO()
+    frame.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def test_excel_fields_come_from_the_attachment_bytes_not_a_local_file(tmp_path, monkeypatch):
+    # A file on the server named like the attachment must never be opened
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "local_secret.xlsx").write_bytes(excel_bytes(pd.DataFrame({"Amount": ["USD 999.99"]})))
+    data = excel_bytes(pd.DataFrame({"Amount": ["USD 1250.00"]}))
+
+    fields = extract_fields_for_types([INBOUND], "Amount\n1250.00", "local_secret.xlsx", data)
+    assert fields[INBOUND]["amount"] == ["1250.00"]
+    assert extract_fields_for_types([INBOUND], "Amount\n1250.00", "local_secret.xlsx")[INBOUND] == {}
+
+
+def test_excel_columns_are_extracted_in_the_body_rule_formats():
+    frame = pd.DataFrame({
+        "Amount": [1250, 1250.5, "USD 1,250.00"],
+        "Effective Date": [pd.Timestamp(2024, 1, 5), pd.Timestamp(2024, 2, 1), "next Monday"],
+    })
+    fields = extract_fields_for_types([INBOUND], "Amount", "payments.xlsx", excel_bytes(frame))[INBOUND]
+    assert fields["amount"] == ["1250.00", "1250.50", "1,250.00"]
+    assert fields["effective_date"] == ["01/05/2024", "02/01/2024", "next Monday"]
+
+
+def test_staged_pipeline_reads_excel_fields(pipeline, monkeypatch, make_email):
+    import asyncio
+
+    # Confident from the body alone: only attachments with field rules (Excel, here) are read
+    monkeypatch.setattr(pipeline.config, "attachment_extraction_mode", "staged")
+    monkeypatch.setattr(pipeline.config, "attachment_confidence_threshold", 0)
+    attachment = excel_bytes(pd.DataFrame({"Amount": [980.5]}))
+    data = make_email("Payment notice", "Please wire USD 1,250.00 to account 12345678.", "<x@bank>",
+                      [("payments.xlsx", attachment)])
+
+    result = asyncio.run(pipeline.process_bytes("a.eml", data))
+    primary = result["classification"]["primary_request"]
+    assert primary["request_type"] == INBOUND
+    assert primary["extracted_fields"]["amount"] == ["980.50"]
+
+
+def test_scan_reads_ordinary_text_in_one_pass_and_long_lines_in_overlapping_windows():
+    import re
+
+    from backend.services.rule_engine import iter_scan_segments, scan_findall
+
+    text = "Total due\nUSD 1,250.00 today\nshort line\n"
+    assert [segment for _, segment, _ in iter_scan_segments(text, max_window=64)] == [text]
+
+    # Amounts every 50 characters on one line: some straddle the 64-character window edges
+    line = "".join(f"pay USD {i:>5},345.67 now. ".ljust(50) for i in range(40))
+    usd = re.compile(r"\bUSD\s*([\d,]+\.\d{2})\b")
+    text = "header\n" + line + "\nfooter"
+    segments = list(iter_scan_segments(text, max_window=64, overlap=24))
+    assert all(len(segment) <= 64 for _, segment, _ in segments[1:-1])
+    assert scan_findall(usd, segments) == usd.findall(line)
+    assert scan_findall(usd, segments, "usd", text.lower()) == usd.findall(line)
+
+
+def test_keyword_anchored_scan_matches_findall():
+    import re
+
+    from backend.services.field_extraction_rules import FIELD_EXTRACTION_RULES, RULE_ENGINE
+
+    text = (
+        "ACCOUNT 12345678 and Acct 87654321; routing 021000021, ABA 011000015\n"
+        "xUSD 5.00 is not an amount but USD 1,250.00 is. Effective date 03/15/2024, date 4/1/24\n"
+        "Deal name: ACME TLB reference TLB-77. Previous balance $1,000.00 new balance $900.00\n"
+    )
+    # "İ" lowercases to two characters, so that text is scanned without keyword positions
+    for text in (text, text + "İstanbul office: total USD 2,000.00\n"):
+        for request_type, config in FIELD_EXTRACTION_RULES.items():
+            expected = {}
+            for field, patterns in config["sources"]["body"].items():
+                for pattern in patterns:
+                    for match in re.findall(pattern, text):
+                        values = [item for item in match if item] if isinstance(match, tuple) else [match]
+                        expected.setdefault(field, []).extend(values)
+            assert RULE_ENGINE.extract(text, [request_type])[request_type] == expected
@@ -0,0 +1,165 @@
+import asyncio
+import time
+
+from backend.services.job_queue import JobQueue
+from backend.services.job_worker import JobWorker
+
+
+def make_queue(tmp_path, **kwargs):
+    return JobQueue(str(tmp_path / "jobs.db"), **kwargs)
+
+
+def test_claim_leases_the_oldest_job_once(tmp_path):
+    queue = make_queue(tmp_path)
+    first = queue.submit("a.eml", b"first")
+    second = queue.submit("b.eml", b"second")
+
+    job = queue.claim("w1")
+    assert job["id"] == first
+    assert job["data"] == b"first"
+    assert job["attempts"] == 1
+    assert queue.claim("w2")["id"] == second
+    assert queue.claim("w3") is None
+    assert queue.get(first)["status"] == "running"
+
+
+def test_expired_lease_is_claimed_by_another_worker(tmp_path):
+    queue = make_queue(tmp_path, visibility_timeout=0.05)
+    job_id = queue.submit("a.eml", b"data")
+    assert queue.claim("w1")["id"] == job_id
+    assert queue.claim("w2") is None
+
+    time.sleep(0.1)
+    job = queue.claim("w2")
+    assert job["id"] == job_id
+    assert job["attempts"] == 2
+    # The first worker lost the lease: its late result is ignored
+    assert not queue.extend(job_id, "w1")
+    assert not queue.complete(job_id, "w1", {"late": True})
+    assert queue.complete(job_id, "w2", {"ok": True})
+    assert queue.get(job_id)["result"] == {"ok": True}
+
+
+def test_abandoned_job_fails_after_max_attempts(tmp_path):
+    queue = make_queue(tmp_path, visibility_timeout=0.05, max_attempts=2)
+    job_id = queue.submit("a.eml", b"data")
+    for worker in ("w1", "w2"):
+        assert queue.claim(worker)["id"] == job_id
+        time.sleep(0.1)
+
+    assert queue.claim("w3") is None
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert "Abandoned" in job["error"]
+
+
+def test_fail_requeues_until_attempts_run_out(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=2)
+    job_id = queue.submit("a.eml", b"data")
+
+    queue.claim("w1")
+    assert queue.fail(job_id, "w1", "boom", retry_after=0.05) == "queued"
+    assert queue.claim("w1") is None  # not visible before retry_after
+    time.sleep(0.1)
+    queue.claim("w1")
+    assert queue.fail(job_id, "w1", "boom again") == "failed"
+    assert queue.get(job_id)["error"] == "boom again"
+
+
+def test_final_failure_and_release(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=3)
+    final = queue.submit("a.eml", b"data")
+    queue.claim("w1")
+    assert queue.fail(final, "w1", "too large", final=True) == "failed"
+
+    released = queue.submit("b.eml", b"data")
+    queue.claim("w1")
+    assert queue.release(released, "w1")
+    job = queue.get(released)
+    assert job["status"] == "queued"
+    assert job["attempts"] == 0
+
+
+def run_until_finished(worker, queue, job_id):
+    async def run():
+        stop = asyncio.Event()
+        task = asyncio.ensure_future(worker.run(stop))
+        for _ in range(500):
+            if queue.get(job_id)["status"] in ("done", "failed"):
+                break
+            await asyncio.sleep(0.01)
+        stop.set()
+        await task
+
+    asyncio.run(run())
+    return queue.get(job_id)
+
+
+def test_retried_job_is_classified_not_reported_as_duplicate(tmp_path, monkeypatch, pipeline, execution, make_email):
+    # The first classification fails; the retry must classify the email, not find it in the dedup store
+    from backend.services.llm_client import LLMUnavailable
+
+    monkeypatch.setattr(pipeline.config, "llm_degraded_mode", "fail")
+    classify = pipeline.classifier.classify_async
+    calls = []
+
+    async def flaky(content):
+        calls.append(content)
+        if len(calls) == 1:
+            raise LLMUnavailable("Model call failed")
+        return await classify(content)
+
+    monkeypatch.setattr(pipeline.classifier, "classify_async", flaky)
+    queue = make_queue(tmp_path)
+    data = make_email("Payment notice", "Please wire USD 1,250.00 to account 12345678.", "<a@bank>")
+    job_id = queue.submit("a.eml", data)
+    worker = JobWorker(pipeline, queue, execution, concurrency=1, poll_interval=0.01, retry_delay=0)
+
+    job = run_until_finished(worker, queue, job_id)
+    assert job["status"] == "done"
+    assert job["attempts"] == 2
+    assert "classification" in job["result"]
+
+
+def test_callback_url_must_be_http_and_allowed():
+    import pytest
+    from backend.services.upload_validation import UploadRejected, check_callback_url
+
+    check_callback_url("https://hooks.example.com/done")
+    check_callback_url("http://hooks.example.com:8080/done", ["hooks.example.com"])
+    for url in ("file:///etc/passwd", "gopher://hooks.example.com/", "https:///no-host", "hooks.example.com"):
+        with pytest.raises(UploadRejected):
+            check_callback_url(url)
+    with pytest.raises(UploadRejected):
+        check_callback_url("http://169.254.169.254/latest/meta-data", ["hooks.example.com"])
+
+
+def test_webhook_posts_plain_json_to_allowed_hosts_only(tmp_path, monkeypatch, pipeline, execution, make_email):
+    import json
+    from backend.services import job_worker
+
+    posts = []
+
+    class Response:
+        status_code = 200
+
+    def post(url, data=None, **kwargs):
+        posts.append((url, json.loads(data), kwargs))
+        return Response()
+
+    monkeypatch.setattr(job_worker.requests, "post", post)
+    queue = make_queue(tmp_path)
+    data = make_email("Payment notice", "Please wire USD 1,250.00 to account 12345678.", "<a@bank>")
+    allowed = queue.submit("a.eml", data, "https://hooks.example.com/done")
+    blocked = queue.submit("b.eml", data.replace(b"<a@bank>", b"<b@bank>"), "http://10.0.0.1/internal")
+    worker = JobWorker(pipeline, queue, execution, concurrency=1, poll_interval=0.01,
+                       webhook_allowed_hosts=["hooks.example.com"])
+
+    assert run_until_finished(worker, queue, allowed)["status"] == "done"
+    assert run_until_finished(worker, queue, blocked)["status"] == "done"
+    assert [url for url, _, _ in posts] == ["https://hooks.example.com/done"]
+    url, payload, kwargs = posts[0]
+    assert kwargs["allow_redirects"] is False
+    # Enums are sent as their JSON values, the same as GET /jobs/{id} and /process return
+    assert payload["result"] == queue.get(allowed)["result"]
+    assert isinstance(payload["result"]["classification"]["primary_request"]["priority"], int)
@@ -0,0 +1,36 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.services.llm_client import CircuitBreaker, LLMUnavailable, ResilientLLMClient
+
+
+def test_cancelled_half_open_trial_does_not_wedge_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    client = ResilientLLMClient(max_retries=0, breaker=breaker)
+
+    async def fail():
+        raise RuntimeError("boom")
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def ok():
+        return "ok"
+
+    async def run():
+        with pytest.raises(LLMUnavailable):
+            await client.call(fail)
+        assert breaker.state == "open"
+        time.sleep(0.06)
+
+        trial = asyncio.ensure_future(client.call(hang))
+        await asyncio.sleep(0.01)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        return await client.call(ok)
+
+    assert asyncio.run(run()) == "ok"
+    assert breaker.state == "closed"
@@ -0,0 +1,15 @@
+import pytest
+
+from backend.services.attachment_processor import AttachmentProcessor
+from backend.services.email_parser import EmailParser
+
+
+def test_msg_bytes_are_never_opened_as_a_path(tmp_path):
+    # Short bytes used to be taken by olefile as a filename: a missing one gave FileNotFoundError
+    missing = str(tmp_path / "missing.msg").encode()
+    with pytest.raises(Exception) as error:
+        EmailParser.parse_msg(missing)
+    assert not isinstance(error.value, OSError)
+
+    processor = AttachmentProcessor(tesseract_path="tesseract")
+    assert processor._extract_from_msg(missing) is None
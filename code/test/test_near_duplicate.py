@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+from backend.services.near_duplicate import MemoryLSHStorage, NearDuplicateIndex, SqliteLSHStorage
+
+COVER = ("Please find attached the details of the payment for the facility. Kindly process it "
+         "at your earliest convenience and confirm once the funds have been applied to the loan.")
+
+
+def test_different_subjects_and_attachments_are_not_near_duplicates(pipeline, make_email):
+    first = make_email("Deal ABC principal payment", COVER, "<1@bank>", [("abc.csv", b"deal,amount\nABC,1000000\n")])
+    second = make_email("Deal XYZ fee payment", COVER, "<2@bank>", [("xyz.csv", b"deal,fee\nXYZ,2500\n")])
+
+    async def run():
+        return [await pipeline.process_bytes("1.eml", first), await pipeline.process_bytes("2.eml", second)]
+
+    results = asyncio.run(run())
+    assert all("classification" in result for result in results)
+
+
+def test_resend_with_a_new_date_line_is_a_near_duplicate(pipeline, make_email):
+    body = COVER + " The amount due is USD 1,250,000.00 for account 12345678.\nGenerated on {}"
+    first = make_email("Deal ABC principal payment", body.format("01/02/2024"), "<1@bank>")
+    second = make_email("Deal ABC principal payment", body.format("02/02/2024") + " ", "<2@bank>")
+
+    async def run():
+        return [await pipeline.process_bytes("1.eml", first), await pipeline.process_bytes("2.eml", second)]
+
+    first_result, second_result = asyncio.run(run())
+    assert "classification" in first_result
+    assert second_result["status"] == "duplicate"
+
+
+def test_subject_is_part_of_the_signature(pipeline):
+    index = pipeline.near_duplicates
+    first = pipeline.classifier.detect_duplicates("Deal ABC principal payment", "a@x", "", COVER, set(), index, [])
+    index.add(first["hash"], first["signature"])
+    second = pipeline.classifier.detect_duplicates("Deal XYZ fee payment", "a@x", "", COVER, set(), index, [])
+    assert not second["is_duplicate"]
+    unread = pipeline.classifier.detect_duplicates("Deal ABC principal payment", "b@x", "", COVER, set(), index, None)
+    assert not unread["is_duplicate"]
+    assert unread["signature"] is None
+
+
+def test_storages_forget_entries_after_retention(tmp_path):
+    for storage in (MemoryLSHStorage(retention_seconds=0.05), SqliteLSHStorage(str(tmp_path / "lsh.db"), 0.05)):
+        index = NearDuplicateIndex(storage)
+        signature = index.signature(COVER)
+        index.add("first", signature)
+        assert index.query(signature)[0] == "first"
+        time.sleep(0.1)
+        assert index.query(signature) is None
+        assert len(index) == 0
+        index.add("second", signature)
+        assert index.query(signature)[0] == "second"
+
+
+def test_staged_email_is_indexed_on_the_attachments_it_read(pipeline, monkeypatch, make_email):
+    statement = "Statement for deal ABC: principal repayment of USD 1,250,000.00 due on the next payment date."
+
+    async def extract(filename, payload):
+        return statement
+
+    monkeypatch.setattr(pipeline.config, "attachment_extraction_mode", "staged")
+    monkeypatch.setattr(pipeline.config, "attachment_confidence_threshold", 1.1)
+    monkeypatch.setattr(pipeline.processor, "extract_text_async", extract)
+    data = make_email("Deal ABC principal payment", COVER, "<1@bank>", [("statement.pdf", b"%PDF-1.4")])
+
+    assert "classification" in asyncio.run(pipeline.process_bytes("1.eml", data))
+    assert len(pipeline.near_duplicates) == 1
+    resend = pipeline.classifier.detect_duplicates(
+        "Deal ABC principal payment", "b@x", "", COVER, set(), pipeline.near_duplicates, [statement]
+    )
+    assert resend["is_duplicate"]
+
+
+def test_templated_notices_with_different_amounts_are_not_near_duplicates(pipeline, make_email):
+    # Only the amount differs: these score about 0.9, two separate payments
+    notice = ("Please be advised that a principal repayment of USD {} for facility ACME TERM LOAN B will be "
+              "made to your account as agreed under the credit agreement dated 01/15/2020. The payment "
+              "covers the scheduled amortisation for the current period and no further action is required "
+              "from the lenders. Interest accrued to the payment date will be settled separately in the next "
+              "interest notice. Contact the agency desk with any questions regarding this notice or the "
+              "allocation of the repayment among the lenders of record.")
+    first = make_email("Principal repayment notice", notice.format("125,000.00"), "<1@bank>")
+    second = make_email("Principal repayment notice", notice.format("98,250.00"), "<2@bank>")
+
+    async def run():
+        return [await pipeline.process_bytes("1.eml", first), await pipeline.process_bytes("2.eml", second)]
+
+    assert all("classification" in result for result in asyncio.run(run()))
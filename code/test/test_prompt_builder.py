@@ -0,0 +1,24 @@
+from backend.services.prompt_builder import PromptBuilder
+
+EMAIL = {"headers": {"from": "a@x", "to": "b@x", "cc": "", "subject": "Payment", "date": ""}, "body": "See attached."}
+
+
+def test_unbroken_ocr_text_is_chunked_and_truncation_reported():
+    ocr = " ".join(f"Sentence {i} about the principal payment of USD {i},000.00 due." for i in range(200))
+    builder = PromptBuilder(max_tokens=4000, chunk_tokens=100, max_chunks=3)
+
+    content, usage = builder.build(EMAIL, [{"filename": "scan.pdf", "text": ocr}])
+    assert usage["attachment_chunks"] == 3
+    assert usage["attachment_chunks_total"] > 3
+    assert usage["truncated"]
+    assert "sections omitted]" in content
+
+
+def test_table_keeps_its_header_line_and_every_row_fits():
+    table = "deal,amount\n" + "\n".join(f"D{i},{i}000.00" for i in range(20))
+    builder = PromptBuilder(max_tokens=4000, chunk_tokens=100, max_chunks=8)
+
+    content, usage = builder.build(EMAIL, [{"filename": "rates.csv", "text": table}])
+    assert not usage["truncated"]
+    assert content.count("deal,amount") == 1
+    assert "D19,19000.00" in content
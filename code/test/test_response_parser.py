@@ -0,0 +1,40 @@
+import pytest
+
+from backend.services.response_parser import JSONStreamParser, ResponseParseError
+
+
+def parse(*chunks):
+    parser = JSONStreamParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.result(), parser.repaired
+
+
+def test_stops_at_the_end_of_the_first_value():
+    parser = JSONStreamParser()
+    assert not parser.feed('```json\n{"a": [1, ')
+    assert parser.feed('2]} and some trailing prose {')
+    assert parser.result() == {"a": [1, 2]}
+    assert not parser.repaired
+
+
+def test_skips_bracketed_prose_before_the_value():
+    assert parse('Here is [the] result: {"a": 1}') == ({"a": 1}, False)
+    assert parse("Here is [th", 'e] result: {"a"', ": 1}") == ({"a": 1}, False)
+
+
+def test_repairs_trailing_commas_and_control_characters():
+    assert parse('{"a": [1, 2,], "b": "two\nlines",}') == ({"a": [1, 2], "b": "two\nlines"}, True)
+
+
+def test_truncated_string_member_is_dropped_not_closed():
+    value, repaired = parse('{"extracted_fields": {"currency": "USD", "amount": "USD 1')
+    assert value == {"extracted_fields": {"currency": "USD"}}
+    assert repaired
+    assert parse('{"a": 1, "b": "x, y", "c": "z') == ({"a": 1, "b": "x, y"}, True)
+    assert parse('["a", "b') == (["a"], True)
+
+
+def test_no_json_raises():
+    with pytest.raises(ResponseParseError):
+        parse("The model declined to answer [sorry]")
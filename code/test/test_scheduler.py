@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+
+from backend.models.extracted_data import PriorityLevel
+from backend.services.admission import Overloaded
+from backend.services.scheduler import PriorityScheduler
+
+
+async def hold(scheduler, priority, order, name, seconds=0.02):
+    async with scheduler.slot(priority):
+        order.append(name)
+        await asyncio.sleep(seconds)
+
+
+def test_most_urgent_waiter_goes_first():
+    scheduler = PriorityScheduler(max_concurrent=1, aging_seconds=30)
+    order = []
+
+    async def run():
+        first = asyncio.ensure_future(hold(scheduler, PriorityLevel.LOW, order, "running"))
+        await asyncio.sleep(0)
+        waiters = [asyncio.ensure_future(hold(scheduler, level, order, level.name))
+                   for level in (PriorityLevel.LOW, PriorityLevel.MEDIUM, PriorityLevel.CRITICAL)]
+        await asyncio.gather(first, *waiters)
+
+    asyncio.run(run())
+    assert order == ["running", "CRITICAL", "MEDIUM", "LOW"]
+    assert scheduler.stats()["running"] == 0
+
+
+def test_aging_lets_old_low_priority_work_through():
+    scheduler = PriorityScheduler(max_concurrent=1, aging_seconds=0.01)
+    order = []
+
+    async def run():
+        first = asyncio.ensure_future(hold(scheduler, PriorityLevel.LOW, order, "running", 0.1))
+        await asyncio.sleep(0)
+        old = asyncio.ensure_future(hold(scheduler, PriorityLevel.LOW, order, "old low"))
+        # Queued over 3 aging periods later, CRITICAL now ranks behind the old LOW email
+        await asyncio.sleep(0.05)
+        urgent = asyncio.ensure_future(hold(scheduler, PriorityLevel.CRITICAL, order, "new critical"))
+        await asyncio.gather(first, old, urgent)
+
+    asyncio.run(run())
+    assert order == ["running", "old low", "new critical"]
+
+
+def test_cancelled_waiter_is_skipped_and_full_queue_is_refused():
+    scheduler = PriorityScheduler(max_concurrent=1, aging_seconds=30, max_queued=1)
+    order = []
+
+    async def run():
+        first = asyncio.ensure_future(hold(scheduler, PriorityLevel.LOW, order, "running", 0.05))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(hold(scheduler, PriorityLevel.HIGH, order, "cancelled"))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as refused:
+            await hold(scheduler, PriorityLevel.CRITICAL, order, "refused")
+        assert refused.value.status_code == 429
+        waiter.cancel()
+        await asyncio.sleep(0)
+        after = asyncio.ensure_future(hold(scheduler, PriorityLevel.MEDIUM, order, "after"))
+        await asyncio.gather(first, after)
+
+    asyncio.run(run())
+    assert order == ["running", "after"]
+    stats = scheduler.stats()
+    assert stats["running"] == 0
+    assert stats["rejected"] == 1
+    assert all(level["queued"] == 0 for level in stats["by_priority"].values())
+
+
+def make_pipeline(monkeypatch, tmp_path, execution, **env):
+    from backend.config import Config
+    from backend.services.dedup_store import create_duplicate_store
+    from backend.services.pipeline import EmailPipeline
+    from backend.services.routing import RequestRouter
+
+    for name, value in {"CLASSIFIER_BACKEND": "stub", "STUB_LATENCY_MS": "0", "UPLOAD_DIR": str(tmp_path),
+                        "CLASSIFICATION_CACHE_BACKEND": "none", **env}.items():
+        monkeypatch.setenv(name, value)
+    return EmailPipeline(Config(), RequestRouter({}), create_duplicate_store("memory"), execution)
+
+
+def test_queued_backlog_does_not_hold_extraction_memory(monkeypatch, tmp_path, execution, make_email):
+    # Each email: 0.2 MB of payload, 1 MB more while its CSV is extracted; the budget fits
+    # one running email plus the payloads of the queued ones, not two full estimates
+    pipeline = make_pipeline(monkeypatch, tmp_path, execution, SCHEDULER_MAX_CONCURRENT="1",
+                             MEMORY_BUDGET_MB="2.5", OCR_MAX_CONCURRENT="0")
+    order = []
+    gate = asyncio.Event()
+
+    async def process(email_data, raw_keys):
+        order.append(email_data['headers']['subject'])
+        await gate.wait()
+        return {"status": "ok"}
+
+    monkeypatch.setattr(pipeline, "_process_parsed", process)
+
+    def email(subject, body):
+        csv = subject.encode().ljust(16) + b"a,b\n" * 25596
+        return make_email(subject, body, "<%s@x>" % subject.replace(" ", "."), [("rows.csv", csv)])
+
+    async def run():
+        async def until(condition):
+            while not condition():
+                await asyncio.sleep(0.001)
+
+        def queued():
+            return sum(level["queued"] for level in pipeline.scheduler.stats()["by_priority"].values())
+
+        backlog = [asyncio.ensure_future(pipeline.process_bytes("a.eml", email("Team note 0", "See rows for team 0.")))]
+        await until(lambda: order)
+        backlog.append(asyncio.ensure_future(pipeline.process_bytes("a.eml", email("Team note 1", "See rows for team 1."))))
+        await until(lambda: queued() == 1)
+        urgent = asyncio.ensure_future(pipeline.process_bytes(
+            "b.eml", email("Payment notice", "Please wire USD 1,250.00 to account 12345678.")
+        ))
+        # Both waiting while the first runs: the budget holds one full estimate and two payloads
+        await until(lambda: queued() == 2 or urgent.done())
+        gate.set()
+        return await urgent, await asyncio.gather(*backlog)
+
+    urgent, backlog = asyncio.run(run())
+    assert urgent == {"status": "ok"}
+    assert backlog == [{"status": "ok"}] * 2
+    assert order == ["Team note 0", "Payment notice", "Team note 1"]
+    assert pipeline.memory_budget.stats()["in_use_bytes"] == 0
+
+
+def test_pdf_rasters_are_charged_once_against_the_shared_ocr_slots():
+    from backend.services.admission import MemoryBudget, estimate_memory, ocr_raster_bytes
+
+    pdf = b"%PDF-1.4" + b"<< /Type /Page >>" * 50
+    attachments = [{"filename": "scan.pdf", "data": pdf}]
+    assert estimate_memory(attachments, ocr_dpi=200, ocr_max_concurrent=4) == 2 * len(pdf)
+    assert estimate_memory(attachments, ocr_dpi=200, ocr_max_concurrent=0) == 2 * len(pdf) + 50 * ocr_raster_bytes(200)
+
+    budget = MemoryBudget(10 * ocr_raster_bytes(200), reserved_bytes=4 * ocr_raster_bytes(200))
+    with pytest.raises(Overloaded) as refused:
+        budget.check(7 * ocr_raster_bytes(200))
+    assert refused.value.status_code == 413
+    with budget.reserve(6 * ocr_raster_bytes(200)):
+        with pytest.raises(Overloaded) as refused:
+            with budget.reserve(1):
+                pass
+        assert refused.value.status_code == 503
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from backend.services.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_computation():
+    flight = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"result": 1}
+
+    async def submit(keys):
+        running = flight.find(keys)
+        if running is not None:
+            return await flight.join(running)
+        return await flight.run(keys, compute())
+
+    async def run():
+        results = await asyncio.gather(submit(["raw:a"]), submit(["raw:a"]), submit(["msgid:x", "raw:a"]))
+        # Finished computations are forgotten: the next submission starts a new one
+        assert flight.find(["raw:a"]) is None
+        return results
+
+    results = asyncio.run(run())
+    assert results == [{"result": 1}] * 3
+    assert len(calls) == 1
+    assert flight.stats() == {"started": 1, "coalesced": 2, "in_flight": 0}
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_work():
+    flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        first = asyncio.ensure_future(flight.run(["k"], compute()))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(flight.join(flight.find(["k"])))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "done"
+
+
+def test_failure_reaches_every_caller():
+    flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("parse failed")
+
+    async def run():
+        first = asyncio.ensure_future(flight.run(["k"], compute()))
+        await asyncio.sleep(0)
+        second = flight.join(flight.find(["k"]))
+        return await asyncio.gather(first, second, return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
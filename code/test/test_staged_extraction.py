@@ -0,0 +1,49 @@
+import asyncio
+
+from backend.services.llm_client import LLMUnavailable
+
+
+def run_with_counted_extraction(pipeline, monkeypatch, data):
+    extracted = []
+
+    async def extract(filename, payload):
+        extracted.append(filename)
+        return "scanned page text"
+
+    monkeypatch.setattr(pipeline.processor, "extract_text_async", extract)
+    result = asyncio.run(pipeline.process_bytes("a.eml", data))
+    return result, extracted
+
+
+def test_degraded_answer_does_not_trigger_full_extraction(pipeline, monkeypatch, make_email):
+    async def unavailable(content):
+        raise LLMUnavailable("Model call failed")
+
+    monkeypatch.setattr(pipeline.classifier, "classify_async", unavailable)
+    monkeypatch.setattr(pipeline.config, "attachment_confidence_threshold", 1.1)
+    data = make_email("Question", "Please see the attached scan.", "<1@bank>", [("scan.png", b"\x89PNG scan")])
+
+    result, extracted = run_with_counted_extraction(pipeline, monkeypatch, data)
+    assert result["degraded"]
+    assert extracted == []
+
+
+def test_fast_path_answer_does_not_trigger_full_extraction(pipeline, monkeypatch, make_email):
+    best_guess = pipeline.fast_path.best_guess
+    monkeypatch.setattr(pipeline.config, "fast_path_enabled", True)
+    monkeypatch.setattr(pipeline.config, "attachment_confidence_threshold", 1.1)
+    monkeypatch.setattr(pipeline.fast_path, "classify", best_guess)
+    data = make_email("Question", "Please see the attached scan.", "<1@bank>", [("scan.png", b"\x89PNG scan")])
+
+    result, extracted = run_with_counted_extraction(pipeline, monkeypatch, data)
+    assert result["prompt_usage"] is None
+    assert extracted == []
+
+
+def test_inconclusive_llm_answer_reads_every_attachment(pipeline, monkeypatch, make_email):
+    monkeypatch.setattr(pipeline.config, "attachment_confidence_threshold", 1.1)
+    data = make_email("Question", "Please see the attached scan.", "<1@bank>", [("scan.png", b"\x89PNG scan")])
+
+    result, extracted = run_with_counted_extraction(pipeline, monkeypatch, data)
+    assert extracted == ["scan.png"]
+    assert result["classification"]["raw_content"]["attachments"][0]["text"] == "scanned page text"